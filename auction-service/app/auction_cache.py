@@ -0,0 +1,104 @@
+# In-process read-through cache for single auctions
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from .settings import AUCTION_CACHE_SIZE, AUCTION_CACHE_TTL
+
+
+class CachedAuction:
+    __slots__ = ("body", "etag", "last_modified", "expires_at")
+
+    def __init__(self, body: bytes, last_modified, expires_at: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+
+class AuctionCache:
+    """
+    Bounded LRU of serialized auctions with a TTL. Writes in this process
+    invalidate their entry; the TTL bounds staleness from writes made by
+    other replicas.
+
+    A read that started before an invalidation must not repopulate the entry
+    with what it read, so loaders take a token first and `put` drops values
+    whose key was invalidated after the token was issued.
+    """
+
+    def __init__(self, max_size: int = AUCTION_CACHE_SIZE, ttl: float = AUCTION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._invalidated = {}
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def token(self) -> int:
+        with self._lock:
+            return self._seq
+
+    def put(self, key, body: bytes, last_modified, token: int):
+        entry = CachedAuction(body, last_modified, time.monotonic() + self.ttl)
+        with self._lock:
+            if token < self._floor or self._invalidated.get(key, -1) > token:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, key):
+        with self._lock:
+            self._seq += 1
+            self.invalidations += 1
+            self._entries.pop(key, None)
+            self._invalidated[key] = self._seq
+            if len(self._invalidated) > self.max_size:
+                # Forget old tombstones; loads that began before now are rejected instead
+                self._invalidated.clear()
+                self._seq += 1
+                self._floor = self._seq
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+auction_cache = AuctionCache()
@@ -0,0 +1,233 @@
+# Closes auctions when their end_date passes
+import asyncio
+import datetime
+import heapq
+import logging
+import math
+import threading
+import time
+from sqlalchemy import select, update, text
+from starlette.concurrency import run_in_threadpool
+from .models.auction import Auction, AuctionStatus
+from .sqlalchemy_conn import engine, SessionLocal
+from .settlement import enqueue_settlements
+from .settings import (
+    CLOSE_TICK_SECONDS, CLOSE_HORIZON_SECONDS, CLOSE_RELOAD_SECONDS, CLOSE_BATCH_SIZE, CLOSE_LOCK_KEY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """
+    Session-level PostgreSQL advisory lock held on a dedicated connection, so
+    that only one replica closes auctions. Other databases have no replicas to
+    coordinate and always lead.
+    """
+
+    def __init__(self, engine, key: int):
+        self._engine = engine
+        self._key = key
+        self._conn = None
+
+    def acquire(self) -> bool:
+        if self._engine.dialect.name != "postgresql":
+            return True
+        try:
+            if self._conn is not None:
+                # Still leading as long as the connection holding the lock is alive
+                self._conn.execute(text("SELECT 1"))
+                self._conn.commit()
+                return True
+            conn = self._engine.connect()
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self._key}).scalar()
+            conn.commit()
+            if not acquired:
+                conn.close()
+                return False
+            self._conn = conn
+            logger.info("Acquired auction close leadership")
+            return True
+        except Exception:
+            logger.exception("Lost auction close leadership")
+            self.release()
+            return False
+
+    def release(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+
+class AuctionCloseScheduler:
+    """
+    Min-heap of upcoming end_dates. Deadlines are rounded up to the next tick
+    so that every auction ending within one tick is closed by a single UPDATE;
+    an auction closes at most one tick after its end_date.
+
+    The heap only holds auctions ending within the horizon and is reloaded
+    from the (status, end_date) index every reload interval, which also picks
+    up auctions created or moved on other replicas. Each close re-checks the
+    database, so stale heap entries are harmless.
+    """
+
+    def __init__(self, on_closed=None, session_factory=SessionLocal, lock: LeaderLock = None):
+        self._on_closed = on_closed
+        self._session_factory = session_factory
+        self._lock = lock or LeaderLock(engine, CLOSE_LOCK_KEY)
+        self._heap = []
+        self._deadlines = {}
+        self._guard = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self.is_leader = False
+        self.closed_total = 0
+        self.max_lag_seconds = 0.0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await run_in_threadpool(self._lock.release)
+        self.is_leader = False
+
+    def schedule(self, auction_id: int, end_date: datetime.datetime):
+        """Track a created, started or rescheduled Active auction; safe from any thread."""
+        horizon = datetime.datetime.utcnow() + datetime.timedelta(seconds=CLOSE_HORIZON_SECONDS)
+        if end_date > horizon:
+            self.forget(auction_id)
+            return
+        with self._guard:
+            if self._deadlines.get(auction_id) == end_date:
+                return
+            self._deadlines[auction_id] = end_date
+            heapq.heappush(self._heap, (end_date, auction_id))
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def forget(self, auction_id: int):
+        # The heap entry is skipped lazily once it no longer matches
+        with self._guard:
+            self._deadlines.pop(auction_id, None)
+
+    def _next_deadline(self):
+        with self._guard:
+            while self._heap:
+                end_date, auction_id = self._heap[0]
+                if self._deadlines.get(auction_id) == end_date:
+                    return end_date
+                heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now: datetime.datetime):
+        with self._guard:
+            while self._heap and self._heap[0][0] <= now:
+                end_date, auction_id = heapq.heappop(self._heap)
+                if self._deadlines.get(auction_id) == end_date:
+                    del self._deadlines[auction_id]
+
+    def load(self):
+        """Rebuild the heap from the auctions ending within the horizon."""
+        horizon = datetime.datetime.utcnow() + datetime.timedelta(seconds=CLOSE_HORIZON_SECONDS)
+        with self._session_factory() as db:
+            rows = db.execute(
+                select(Auction.auction_id, Auction.end_date)
+                .where(Auction.status == AuctionStatus.Active, Auction.end_date <= horizon)
+                .order_by(Auction.end_date)
+            ).all()
+        deadlines = {auction_id: end_date for auction_id, end_date in rows}
+        heap = [(end_date, auction_id) for auction_id, end_date in rows]
+        with self._guard:
+            self._deadlines = deadlines
+            self._heap = heap
+
+    def close_due(self, now: datetime.datetime = None):
+        """Close every Active auction whose end_date has passed, in batches of CLOSE_BATCH_SIZE."""
+        now = now or datetime.datetime.utcnow()
+        closed = []
+        with self._session_factory() as db:
+            while True:
+                due = (
+                    select(Auction.auction_id)
+                    .where(Auction.status == AuctionStatus.Active, Auction.end_date <= now)
+                    .order_by(Auction.end_date)
+                    .limit(CLOSE_BATCH_SIZE)
+                    .scalar_subquery()
+                )
+                rows = db.execute(
+                    update(Auction)
+                    .where(Auction.auction_id.in_(due), Auction.status == AuctionStatus.Active)
+                    .values(status=AuctionStatus.Closed)
+                    .returning(Auction.auction_id, Auction.end_date)
+                    .execution_options(synchronize_session=False)
+                ).all()
+                enqueue_settlements(db, [auction_id for auction_id, _ in rows])
+                db.commit()
+                closed.extend(rows)
+                if len(rows) < CLOSE_BATCH_SIZE:
+                    break
+        self._pop_due(now)
+        if closed:
+            self.closed_total += len(closed)
+            lag = max((now - end_date).total_seconds() for _, end_date in closed)
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+        return [auction_id for auction_id, _ in closed]
+
+    def _wait_seconds(self, next_reload: float) -> float:
+        wait = next_reload - time.monotonic()
+        deadline = self._next_deadline()
+        if deadline is not None:
+            # Round up to the tick boundary so neighbouring deadlines share a close
+            epoch = deadline.replace(tzinfo=datetime.timezone.utc).timestamp()
+            fire_at = math.ceil(epoch / CLOSE_TICK_SECONDS) * CLOSE_TICK_SECONDS
+            wait = min(wait, fire_at - time.time())
+        return max(wait, 0)
+
+    async def _run(self):
+        next_reload = 0.0
+        while True:
+            try:
+                leading = await run_in_threadpool(self._lock.acquire)
+                reloading = leading and (not self.is_leader or time.monotonic() >= next_reload)
+                if reloading:
+                    await run_in_threadpool(self.load)
+                    next_reload = time.monotonic() + CLOSE_RELOAD_SECONDS
+                self.is_leader = leading
+                deadline = self._next_deadline()
+                if reloading or (leading and deadline is not None and deadline <= datetime.datetime.utcnow()):
+                    closed = await run_in_threadpool(self.close_due)
+                    if closed and self._on_closed is not None:
+                        await self._on_closed(closed)
+                wait = self._wait_seconds(next_reload) if leading else CLOSE_RELOAD_SECONDS
+            except Exception:
+                logger.exception("Auction close tick failed")
+                wait = CLOSE_TICK_SECONDS
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stats(self):
+        return {
+            "leader": self.is_leader,
+            "scheduled": len(self._deadlines),
+            "next_close": self._next_deadline(),
+            "closed_total": self.closed_total,
+            "max_lag_seconds": self.max_lag_seconds,
+        }
@@ -0,0 +1,131 @@
+# Cached "ending soon" view of Active auctions
+import datetime
+import threading
+import time
+from sqlalchemy import select
+from .models.auction import Auction, AuctionStatus
+from .schemas.auction import Auction as AuctionSchema
+from .sqlalchemy_conn import SessionLocal
+from .settings import (
+    ENDING_SOON_WINDOW_SECONDS, ENDING_SOON_MAX, ENDING_SOON_REFRESH_SECONDS, ENDING_SOON_REBUILD_SECONDS,
+)
+
+
+class EndingSoonView:
+    """
+    Active auctions ending between now and `covered_until`, soonest first.
+
+    Refreshes are incremental: expired entries fall off the front and only
+    the slice of time that has entered the window since the last refresh is
+    queried. This process's writes are applied as they happen; a periodic
+    rebuild bounds staleness from writes on other replicas.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._entries = {}
+        self._sorted = None
+        self._covered_until = None
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+        self.refreshes = 0
+        self.rebuilds = 0
+
+    def _load_slice(self, start: datetime.datetime, end: datetime.datetime, room: int):
+        if room <= 0 or start >= end:
+            return [], start
+        with self._session_factory() as db:
+            rows = db.execute(
+                select(Auction)
+                .where(Auction.status == AuctionStatus.Active, Auction.end_date > start, Auction.end_date <= end)
+                .order_by(Auction.end_date, Auction.auction_id)
+                .limit(room)
+            ).scalars().all()
+            if len(rows) == room:
+                # Truncated: only cover up to just before the last end_date,
+                # so auctions tied with it are not half-included
+                boundary = rows[-1].end_date
+                rows = [row for row in rows if row.end_date < boundary]
+                end = boundary - datetime.timedelta(microseconds=1)
+                if not rows:
+                    # Everything ties: take the whole group, past the cap, or the window never advances
+                    rows = db.execute(
+                        select(Auction)
+                        .where(Auction.status == AuctionStatus.Active, Auction.end_date == boundary)
+                        .order_by(Auction.auction_id)
+                    ).scalars().all()
+                    end = boundary
+            return [AuctionSchema.model_validate(row).model_dump() for row in rows], end
+
+    def refresh(self):
+        # Single-flight: while one caller refreshes, others serve what is there
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            now = datetime.datetime.utcnow()
+            with self._lock:
+                if self._covered_until is None or time.monotonic() - self._rebuilt_at >= ENDING_SOON_REBUILD_SECONDS:
+                    self._entries = {}
+                    self._covered_until = now
+                    self._rebuilt_at = time.monotonic()
+                    self.rebuilds += 1
+                else:
+                    for auction_id in [i for i, entry in self._entries.items() if entry["end_date"] <= now]:
+                        del self._entries[auction_id]
+                self._sorted = None
+                start, room = self._covered_until, ENDING_SOON_MAX - len(self._entries)
+            rows, covered_until = self._load_slice(
+                start, now + datetime.timedelta(seconds=ENDING_SOON_WINDOW_SECONDS), room
+            )
+            with self._lock:
+                for row in rows:
+                    # A write applied while the slice was loading is newer
+                    self._entries.setdefault(row["auction_id"], row)
+                self._covered_until = max(self._covered_until, covered_until)
+                self._sorted = None
+            self._refreshed_at = time.monotonic()
+            self.refreshes += 1
+        finally:
+            self._refresh_lock.release()
+
+    def apply(self, auction: dict):
+        """Reflect a committed write to one auction (a schema-shaped dict)."""
+        with self._lock:
+            if self._covered_until is None:
+                return
+            auction_id = auction["auction_id"]
+            belongs = auction["status"] == AuctionStatus.Active and auction["end_date"] <= self._covered_until
+            if belongs:
+                self._entries[auction_id] = auction
+            elif self._entries.pop(auction_id, None) is None:
+                return
+            self._sorted = None
+
+    def discard(self, auction_ids):
+        with self._lock:
+            for auction_id in auction_ids:
+                if self._entries.pop(auction_id, None) is not None:
+                    self._sorted = None
+
+    def get(self, limit: int):
+        if time.monotonic() - self._refreshed_at >= ENDING_SOON_REFRESH_SECONDS:
+            self.refresh()
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._entries.values(), key=lambda entry: (entry["end_date"], entry["auction_id"]))
+            ordered = self._sorted
+        return [entry for entry in ordered if entry["end_date"] > now][:limit]
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "covered_until": self._covered_until,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds,
+        }
+
+
+ending_soon = EndingSoonView()
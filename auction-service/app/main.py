@@ -1,84 +1,248 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Body
+from fastapi import FastAPI, Depends, HTTPException, status, Body, BackgroundTasks, Query, Request, Response
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from typing import List
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Optional
+from sqlalchemy import update
 from sqlalchemy.sql import func
-from .models.auction import Base, Auction as AuctionModel, AuctionStatus
-from .schemas.auction import Auction as AuctionSchema, AuctionStatus as AuctionStatusSchema, AuctionCreate
-from .sqlalchemy_conn import engine, get_db
-from .workers.process_auction import process_auction
-import time
-import requests
+from .models.auction import Auction as AuctionModel, AuctionStatus
+from .schemas.auction import Auction as AuctionSchema, AuctionStatus as AuctionStatusSchema, AuctionCreate, AuctionSort, CurrentPriceUpdate
+from .sqlalchemy_conn import get_db, get_primary_db, run_db, pool_metrics, DbRoute, ReadYourWrites
+from .lifecycle import prepare_database, health
+from .settings import (
+    BIDDING_SERVICE_URL, ITEMS_SERVICE_URL, NOTIFICATIONS_SERVICE_URL, CLOSE_SCHEDULER_ENABLED, SETTLEMENT_ENABLED,
+)
+from . import http_client
+from .metrics_cache import metrics_cache
+from .close_scheduler import AuctionCloseScheduler
+from .auction_cache import auction_cache
+from .ending_soon import ending_soon
+from .settlement import enqueue_settlements, settlement_pipeline
+from .pagination import keyset, page, stream_ndjson, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-time.sleep(5)
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(prepare_database)
+    health.started = True
+    if SETTLEMENT_ENABLED:
+        settlement_pipeline.start()
+    if CLOSE_SCHEDULER_ENABLED:
+        close_scheduler.start()
+    yield
+    await close_scheduler.stop()
+    await settlement_pipeline.stop()
+    health.started = False
+    await http_client.close_clients()
 
-logger.info("Creating database tables...")
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
-logger.info("Database tables created successfully")
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = DbRoute
+app.add_middleware(ReadYourWrites)
+
+@app.get("/health/live")
+def liveness():
+    return health.live()
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    ready, body = health.ready()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return body
+
+async def invalidate_bidding_state(auction_id: int):
+    # bidding-service keeps an in-memory copy of each auction; drop it on change
+    await http_client.send_quietly(BIDDING_SERVICE_URL, "POST", f"/bids/auction/{auction_id}/invalidate")
+
+async def on_auctions_closed(auction_ids: List[int]):
+    for auction_id in auction_ids:
+        auction_cache.invalidate(auction_id)
+    ending_soon.discard(auction_ids)
+    # Settlements were queued with the close; just pick them up now
+    settlement_pipeline.wake()
+    await asyncio.gather(*(invalidate_bidding_state(auction_id) for auction_id in auction_ids))
+
+close_scheduler = AuctionCloseScheduler(on_closed=on_auctions_closed)
+
+def auction_changed(auction):
+    """Bring this process's cache, views and close schedule in line with a committed write."""
+    view = AuctionSchema.model_validate(auction).model_dump()
+    auction_cache.invalidate(view["auction_id"])
+    ending_soon.apply(view)
+    if view["status"] == AuctionStatus.Active:
+        close_scheduler.schedule(view["auction_id"], view["end_date"])
+    else:
+        close_scheduler.forget(view["auction_id"])
+
+def find_auction(db: Session, auction_id: int):
+    return db.query(AuctionModel).filter(AuctionModel.auction_id == auction_id).first()
 
 # CRUD Operations
-@app.post("/auctions", response_model=AuctionSchema, status_code=status.HTTP_201_CREATED)
-def create_auction(payload: AuctionCreate, db: Session = Depends(get_db)):
+async def find_item_owner(item_id: int) -> Optional[int]:
+    try:
+        response = await http_client.request(ITEMS_SERVICE_URL, "GET", f"/items/{item_id}")
+    except Exception as e:
+        logger.warning("Could not look up the owner of item %s: %s", item_id, e)
+        return None
+    if response.status_code != 200:
+        return None
+    return response.json().get("owner_id")
+
+def insert_auction(db: Session, payload: AuctionCreate, seller_id: Optional[int]):
     new_auc = AuctionModel(
         item_id=payload.item_id,
         start_time=payload.start_time,
         end_date=payload.end_date,
         starting_price=payload.starting_price,
         current_price=payload.current_price,
-        status=payload.status
+        status=payload.status,
+        seller_id=seller_id
     )
     db.add(new_auc)
     db.commit()
     db.refresh(new_auc)
+    auction_changed(new_auc)
     return new_auc
 
-@app.get("/auctions/{auction_id}", response_model=AuctionSchema)
-def get_auction(auction_id: int, db: Session = Depends(get_db)):
-    auction = db.query(AuctionModel).filter(AuctionModel.auction_id == auction_id).first()
-    if not auction:
-        raise HTTPException(status_code=404, detail="Auction not found")
-    return auction
+@app.post("/auctions", response_model=AuctionSchema, status_code=status.HTTP_201_CREATED)
+async def create_auction(payload: AuctionCreate, db: Session = Depends(get_db)):
+    # The seller is resolved once here so that reads by seller stay local
+    seller_id = payload.seller_id
+    if seller_id is None:
+        seller_id = await find_item_owner(payload.item_id)
+    return await run_db(insert_auction, db, payload, seller_id)
 
 @app.get("/auctions", response_model=List[AuctionSchema])
-def list_auctions(db: Session = Depends(get_db)):
-    auctions = db.query(AuctionModel).all()
-    return auctions
+def list_auctions(
+    response: Response,
+    status: Optional[List[AuctionStatusSchema]] = Query(None),
+    ends_after: Optional[datetime] = None,
+    ends_before: Optional[datetime] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: AuctionSort = AuctionSort.auction_id,
+    desc: bool = False,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    # `after` is the auction_id of the last row already seen; for other sorts
+    # the keyset resumes from that row's sort value
+    sort_column = getattr(AuctionModel, sort.value)
+    cursor = None
+    if after is not None and sort != AuctionSort.auction_id:
+        cursor = db.query(sort_column).filter(AuctionModel.auction_id == after).first()
+        if cursor is None:
+            raise HTTPException(status_code=400, detail="Unknown cursor")
+    statuses = [AuctionStatus(s.value) for s in status or []]
+
+    def build(db: Session):
+        query = db.query(AuctionModel)
+        if len(statuses) == 1:
+            # Equality (not IN) so the planner can use the partial Active indexes
+            query = query.filter(AuctionModel.status == statuses[0])
+        elif statuses:
+            query = query.filter(AuctionModel.status.in_(statuses))
+        if ends_after is not None:
+            query = query.filter(AuctionModel.end_date >= ends_after)
+        if ends_before is not None:
+            query = query.filter(AuctionModel.end_date < ends_before)
+        if min_price is not None:
+            query = query.filter(AuctionModel.current_price >= min_price)
+        if max_price is not None:
+            query = query.filter(AuctionModel.current_price <= max_price)
+        if sort == AuctionSort.auction_id:
+            return keyset(query, AuctionModel.auction_id, after=after, descending=desc)
+        return keyset(
+            query, sort_column, AuctionModel.auction_id,
+            after=(cursor[0], after) if cursor else None, descending=desc
+        )
+    if stream:
+        return stream_ndjson(build, AuctionSchema, db=db)
+    return page(build(db), limit, response, lambda auction: auction.auction_id)
+
+@app.get("/auctions/ending-soon", response_model=List[AuctionSchema])
+def get_ending_soon(limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)):
+    # Served from an incrementally refreshed in-process view, not a query per request
+    return ending_soon.get(limit)
+
+def load_cached_auction(db: Session, auction_id: int):
+    entry = auction_cache.get(auction_id)
+    if entry is not None:
+        return entry
+    token = auction_cache.token()
+    auction = find_auction(db, auction_id)
+    if not auction:
+        return None
+    body = AuctionSchema.model_validate(auction).model_dump_json().encode()
+    return auction_cache.put(auction_id, body, auction.updated_at, token)
+
+def not_modified(request: Request, entry) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and entry.last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return entry.last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+@app.get("/auctions/{auction_id}", response_model=AuctionSchema)
+def get_auction(auction_id: int, request: Request, db: Session = Depends(get_primary_db)):
+    # Hot path for bidding-service: served from the cache, revalidated with ETags
+    entry = load_cached_auction(db, auction_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Auction not found")
+    headers = {"ETag": entry.etag}
+    if entry.last_modified:
+        headers["Last-Modified"] = format_datetime(entry.last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    if not_modified(request, entry):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 @app.put("/auctions/{auction_id}", response_model=AuctionSchema)
-def update_auction(auction_id: int, payload: AuctionSchema, db: Session = Depends(get_db)):
+def update_auction(auction_id: int, payload: AuctionSchema, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     auction = db.query(AuctionModel).filter(AuctionModel.auction_id == auction_id).first()
     if not auction:
         raise HTTPException(status_code=404, detail="Auction not found")
     
-    # Update auction attributes
-    for key, value in payload.dict().items():
+    # Update auction attributes; seller_id is kept unless given
+    for key, value in payload.dict(exclude_unset=True).items():
         setattr(auction, key, value)
     
     db.commit()
     db.refresh(auction)
+    auction_changed(auction)
+    background_tasks.add_task(invalidate_bidding_state, auction_id)
     return auction
 
 @app.delete("/auctions/{auction_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_auction(auction_id: int, db: Session = Depends(get_db)):
+def delete_auction(auction_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     auction = db.query(AuctionModel).filter(AuctionModel.auction_id == auction_id).first()
     if not auction:
         raise HTTPException(status_code=404, detail="Auction not found")
     
     auction.status = AuctionStatus.Cancelled
     db.commit()
+    auction_changed(auction)
+    background_tasks.add_task(invalidate_bidding_state, auction_id)
     return
 
 
-@app.put("/auctions/{auction_id}/start", response_model=AuctionSchema)
-def start_auction(auction_id: int, db: Session = Depends(get_db)):
-    auction = db.query(AuctionModel).filter(AuctionModel.auction_id == auction_id).first()
+def mark_started(db: Session, auction_id: int):
+    auction = find_auction(db, auction_id)
     if not auction:
         raise HTTPException(status_code=404, detail="Auction not found")
     
@@ -86,104 +250,164 @@ def start_auction(auction_id: int, db: Session = Depends(get_db)):
     auction.start_time = datetime.utcnow()
     db.commit()
     db.refresh(auction)
+    auction_changed(auction)
+    return auction
+
+@app.put("/auctions/{auction_id}/start", response_model=AuctionSchema)
+async def start_auction(auction_id: int, db: Session = Depends(get_db)):
+    auction = await run_db(mark_started, db, auction_id)
     
     # Notify relevant services about auction start
-    try:
-        requests.post(f"http://notifications-service:8000/notifications/auction/{auction_id}/started")
-    except:
-        # Log error but continue
-        pass
+    await asyncio.gather(
+        invalidate_bidding_state(auction_id),
+        http_client.send_quietly(NOTIFICATIONS_SERVICE_URL, "POST", f"/notifications/auction/{auction_id}/started"),
+    )
     
     return auction
 
 @app.put("/auctions/{auction_id}/end", response_model=AuctionSchema)
-def end_auction(auction_id: int, db: Session = Depends(get_db)):
+def end_auction(auction_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     auction = db.query(AuctionModel).filter(AuctionModel.auction_id == auction_id).first()
     if not auction:
         raise HTTPException(status_code=404, detail="Auction not found")
     
     auction.status = AuctionStatus.Closed
+    # Settle the winner in the background; queued in the same commit as the close
+    enqueue_settlements(db, [auction_id])
     db.commit()
     db.refresh(auction)
-    
-    # Process auction end (notify winner, etc.)
-    try:
-        process_auction(auction_id)
-    except Exception as e:
-        # Log error but continue
-        pass
-    
+    auction_changed(auction)
+    settlement_pipeline.wake()
+    background_tasks.add_task(invalidate_bidding_state, auction_id)
     return auction
 
 @app.get("/auctions/{auction_id}/bids")
-def get_auction_bids(auction_id: int):
+async def get_auction_bids(auction_id: int, request: Request):
+    # Pagination parameters are passed through to bidding-service untouched
     try:
-        response = requests.get(f"http://bidding-service:8000/bids/auction/{auction_id}")
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Error fetching bids")
-        return response.json()
+        response = await http_client.request(
+            BIDDING_SERVICE_URL, "GET", f"/bids/auction/{auction_id}", params=request.query_params
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error communicating with bidding service: {str(e)}")
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Error fetching bids")
+    headers = {}
+    if NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    return Response(content=response.content, media_type=response.headers.get("content-type"), headers=headers)
 
 @app.get("/auctions/user/{user_id}", response_model=List[AuctionSchema])
-def get_user_auctions(user_id: int, db: Session = Depends(get_db)):
-    # In this implementation, we assume the auction service knows about auction creators
-    # In a real implementation, you might need to check with items service or user service
-    try:
-        # Get user items first
-        response = requests.get(f"http://items-service:8000/items/user/{user_id}")
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Error fetching user items")
-        
-        user_item_ids = [item["item_id"] for item in response.json()]
-        auctions = db.query(AuctionModel).filter(AuctionModel.item_id.in_(user_item_ids)).all()
-        return auctions
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+def get_user_auctions(
+    user_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    # Auctions the user is selling, from the denormalized seller_id index
+    def build(db: Session):
+        return keyset(db.query(AuctionModel).filter(AuctionModel.seller_id == user_id), AuctionModel.auction_id, after=after)
+    if stream:
+        return stream_ndjson(build, AuctionSchema, db=db)
+    return page(build(db), limit, response, lambda auction: auction.auction_id)
+
+@app.put("/auctions/item/{item_id}/seller", status_code=status.HTTP_204_NO_CONTENT)
+def update_item_seller(item_id: int, data: dict = Body(...), db: Session = Depends(get_db)):
+    # Called by items-service when an item changes owner
+    if "seller_id" not in data:
+        raise HTTPException(status_code=400, detail="Missing 'seller_id' in request body")
+    changed = db.execute(
+        update(AuctionModel)
+        .where(AuctionModel.item_id == item_id)
+        .values(seller_id=data["seller_id"])
+        .returning(AuctionModel.auction_id)
+    ).scalars().all()
+    db.commit()
+    for auction_id in changed:
+        auction_cache.invalidate(auction_id)
+    return
 
-@app.put("/auctions/{auction_id}/current_price", response_model=AuctionSchema)
+@app.put("/auctions/{auction_id}/current_price", response_model=CurrentPriceUpdate)
 def update_current_price(auction_id: int, data: dict = Body(...), db: Session = Depends(get_db)):
-    auction = db.query(AuctionModel).filter(AuctionModel.auction_id == auction_id).first()
-    if not auction:
-        raise HTTPException(status_code=404, detail="Auction not found")
     if "current_price" not in data:
         raise HTTPException(status_code=400, detail="Missing 'current_price' in request body")
-    auction.current_price = data["current_price"]
+    price = data["current_price"]
+    # One conditional statement: only raises the price of an Active auction, so
+    # concurrent or reordered bids can never lower it
+    auction = db.execute(
+        update(AuctionModel)
+        .where(
+            AuctionModel.auction_id == auction_id,
+            AuctionModel.status == AuctionStatus.Active,
+            AuctionModel.current_price < price,
+        )
+        .values(current_price=price)
+        .returning(*AuctionModel.__table__.columns)
+    ).first()
     db.commit()
-    db.refresh(auction)
-    return auction
+    if auction is not None:
+        auction_changed(dict(auction._mapping))
+        return {**auction._mapping, "updated": True}
 
-@app.get("/metrics")
-def get_auction_metrics(db: Session = Depends(get_db)):
+    auction = find_auction(db, auction_id)
+    if not auction:
+        raise HTTPException(status_code=404, detail="Auction not found")
+    return {**AuctionSchema.model_validate(auction).model_dump(), "updated": False}
+
+def compute_auction_metrics(db: Session):
+    # One scan with conditional aggregates instead of a query per figure
     now = datetime.utcnow()
-    one_day_ago = now - timedelta(days=1)
-    one_week_ago = now - timedelta(weeks=1)
-    one_month_ago = now - timedelta(days=30)
-    one_year_ago = now - timedelta(days=365)
-
-    total_auctions = db.query(AuctionModel).count()
-    by_status = db.query(AuctionModel.status, func.count()).group_by(AuctionModel.status).all()
-    avg_starting_price = db.query(func.coalesce(func.avg(AuctionModel.starting_price), 0)).scalar()
-    avg_current_price = db.query(func.coalesce(func.avg(AuctionModel.current_price), 0)).scalar()
-    started_day = db.query(AuctionModel).filter(AuctionModel.start_time >= one_day_ago and AuctionModel.status == AuctionStatus.Active).count()
-    started_week = db.query(AuctionModel).filter(AuctionModel.start_time >= one_week_ago and AuctionModel.status == AuctionStatus.Active).count()
-    started_month = db.query(AuctionModel).filter(AuctionModel.start_time >= one_month_ago and AuctionModel.status == AuctionStatus.Active).count()
-    started_year = db.query(AuctionModel).filter(AuctionModel.start_time >= one_year_ago and AuctionModel.status == AuctionStatus.Active).count()
-    ended_day = db.query(AuctionModel).filter(AuctionModel.end_date >= one_day_ago and AuctionModel.status == AuctionStatus.Closed).count()
-    ended_week = db.query(AuctionModel).filter(AuctionModel.end_date >= one_week_ago and AuctionModel.status == AuctionStatus.Closed).count()
-    ended_month = db.query(AuctionModel).filter(AuctionModel.end_date >= one_month_ago and AuctionModel.status == AuctionStatus.Closed).count()
-    ended_year = db.query(AuctionModel).filter(AuctionModel.end_date >= one_year_ago and AuctionModel.status == AuctionStatus.Closed).count()
+    windows = {
+        "today": now - timedelta(days=1),
+        "last_week": now - timedelta(weeks=1),
+        "last_month": now - timedelta(days=30),
+        "last_year": now - timedelta(days=365),
+    }
+    active = AuctionModel.status == AuctionStatus.Active
+    closed = AuctionModel.status == AuctionStatus.Closed
+    row = db.query(
+        func.count(AuctionModel.auction_id),
+        func.coalesce(func.avg(AuctionModel.starting_price), 0),
+        func.coalesce(func.avg(AuctionModel.current_price), 0),
+        *(func.count(AuctionModel.auction_id).filter(AuctionModel.status == s) for s in AuctionStatus),
+        *(func.count(AuctionModel.auction_id).filter(active, AuctionModel.start_time >= since) for since in windows.values()),
+        *(func.count(AuctionModel.auction_id).filter(closed, AuctionModel.end_date >= since) for since in windows.values()),
+    ).one()
+    total_auctions, avg_starting_price, avg_current_price = row[:3]
+    by_status = row[3:3 + len(AuctionStatus)]
+    started = row[3 + len(AuctionStatus):3 + len(AuctionStatus) + len(windows)]
+    ended = row[3 + len(AuctionStatus) + len(windows):]
     return {
         "total_auctions": total_auctions,
-        "status_distribution": {status.value: count for status, count in by_status},
+        "status_distribution": {s.value: count for s, count in zip(AuctionStatus, by_status) if count},
         "avg_starting_price": avg_starting_price,
         "avg_current_price": avg_current_price,
-        "auctions_started_today": started_day,
-        "auctions_started_last_week": started_week,
-        "auctions_started_last_month": started_month,
-        "auctions_started_last_year": started_year,
-        "auctions_ended_today": ended_day,
-        "auctions_ended_last_week": ended_week,
-        "auctions_ended_last_month": ended_month,
-        "auctions_ended_last_year": ended_year,
+        **{f"auctions_started_{window}": count for window, count in zip(windows, started)},
+        **{f"auctions_ended_{window}": count for window, count in zip(windows, ended)},
     }
+
+@app.get("/metrics")
+async def get_auction_metrics(db: Session = Depends(get_db)):
+    return await metrics_cache.get("auctions", lambda: run_db(compute_auction_metrics, db))
+
+@app.get("/metrics/close-scheduler")
+def get_close_scheduler_metrics():
+    return close_scheduler.stats()
+
+@app.get("/metrics/settlement")
+def get_settlement_metrics():
+    return settlement_pipeline.stats()
+
+@app.get("/metrics/auction-cache")
+def get_auction_cache_metrics():
+    return auction_cache.stats()
+
+@app.get("/metrics/ending-soon")
+def get_ending_soon_metrics():
+    return ending_soon.stats()
+
+@app.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
@@ -0,0 +1,55 @@
+# Short-lived cache for /metrics aggregates
+import asyncio
+import time
+from .settings import METRICS_CACHE_TTL
+
+
+class SingleFlightCache:
+    """
+    Caches computed values for `ttl` seconds. When an entry expires only one
+    caller recomputes it; concurrent callers get the stale value meanwhile
+    (or wait for the first computation if there is none yet).
+
+    Callers run on the event loop and wait on a future rather than a thread
+    lock: with DB_ASYNC the computation's I/O is awaited on the loop, so a
+    waiter blocking the loop thread would never let it finish.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._pending = {}
+
+    async def get(self, key, compute):
+        """`compute` returns an awaitable (e.g. `lambda: run_db(fn, db)`)."""
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            if entry is not None:
+                # Someone else is already refreshing; serve the stale value
+                return entry[1]
+            # Wait for the first computation; if it failed, try ourselves
+            await asyncio.shield(pending)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._pending[key] = pending
+        try:
+            value = await compute()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            return value
+        finally:
+            del self._pending[key]
+            pending.set_result(None)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+metrics_cache = SingleFlightCache(METRICS_CACHE_TTL)
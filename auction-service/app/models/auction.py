@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Enum, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from enum import Enum as PyEnum
 import datetime
@@ -14,9 +14,25 @@ class Auction(Base):
     __tablename__ = 'auctions'
 
     auction_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    item_id = Column(Integer, nullable=False)
+    item_id = Column(Integer, nullable=False, index=True)
     start_time = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
     end_date = Column(DateTime, nullable=False)
     starting_price = Column(Float, nullable=False)
     current_price = Column(Float, nullable=False)
-    status = Column(Enum(AuctionStatus), nullable=False)
\ No newline at end of file
+    status = Column(Enum(AuctionStatus), nullable=False)
+    # Denormalized from the item's owner in items-service
+    seller_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        # Discovery filters and sorts within a status; auction_id completes the keyset
+        Index("ix_auctions_status_end_date", "status", "end_date", "auction_id"),
+        Index("ix_auctions_status_price", "status", "current_price", "auction_id"),
+        Index("ix_auctions_seller_id", "seller_id", "auction_id"),
+        # Active auctions are what the storefront and the close scheduler read;
+        # partial indexes keep those scans off the much larger closed history
+        Index("ix_auctions_active_end_date", "end_date", "auction_id",
+              postgresql_where=text("status = 'Active'"), sqlite_where=text("status = 'Active'")),
+        Index("ix_auctions_active_price", "current_price", "auction_id",
+              postgresql_where=text("status = 'Active'"), sqlite_where=text("status = 'Active'")),
+    )
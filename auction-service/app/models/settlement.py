@@ -0,0 +1,29 @@
+# Settlement checkpoint model for auction-service
+from sqlalchemy import Column, Integer, Float, String, DateTime, Enum, Index
+from .auction import Base
+from enum import Enum as PyEnum
+import datetime
+
+class SettlementStage(str, PyEnum):
+    Pending = "Pending"      # closed; winner not charged yet
+    Invoiced = "Invoiced"    # transaction created; notifications not sent yet
+    Settled = "Settled"
+    Unsold = "Unsold"        # closed without any bids
+
+class Settlement(Base):
+    """Progress of settling one closed auction, written with the close itself."""
+    __tablename__ = 'settlements'
+    auction_id = Column(Integer, primary_key=True)
+    stage = Column(Enum(SettlementStage), nullable=False, default=SettlementStage.Pending)
+    winner_id = Column(Integer, nullable=True)
+    amount = Column(Float, nullable=True)
+    transaction_id = Column(Integer, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_settlements_stage_next_attempt", "stage", "next_attempt_at"),
+    )
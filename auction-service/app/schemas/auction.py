@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from enum import Enum
 from datetime import datetime
+from typing import Optional
 
 
 class AuctionStatus(str, Enum):
@@ -9,6 +10,13 @@ class AuctionStatus(str, Enum):
     Cancelled = "Cancelled"
 
 
+class AuctionSort(str, Enum):
+    auction_id = "auction_id"
+    end_date = "end_date"
+    start_time = "start_time"
+    current_price = "current_price"
+
+
 class AuctionCreate(BaseModel):
     item_id: int
     start_time: datetime
@@ -16,6 +24,8 @@ class AuctionCreate(BaseModel):
     starting_price: float
     current_price: float
     status: AuctionStatus
+    # Owner of the item; looked up from items-service when not given
+    seller_id: Optional[int] = None
     class Config:
         from_attributes = True 
 
@@ -23,3 +33,8 @@ class Auction(AuctionCreate):
     auction_id: int
     class Config:
         from_attributes = True
+
+
+class CurrentPriceUpdate(Auction):
+    # False when the auction is not Active or already has a price at least as high
+    updated: bool
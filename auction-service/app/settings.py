@@ -3,4 +3,71 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
\ No newline at end of file
+DATABASE_URL = os.getenv("DATABASE_URL")
+BIDDING_SERVICE_URL = os.getenv("BIDDING_SERVICE_URL", "http://bidding-service:8000")
+ITEMS_SERVICE_URL = os.getenv("ITEMS_SERVICE_URL", "http://items-service:8000")
+NOTIFICATIONS_SERVICE_URL = os.getenv("NOTIFICATIONS_SERVICE_URL", "http://notifications-service:8000")
+
+# Outbound HTTP to peer services
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "2.0"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "1.0"))
+
+# /metrics
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "10"))
+
+# Auction close scheduler
+CLOSE_SCHEDULER_ENABLED = os.getenv("CLOSE_SCHEDULER_ENABLED", "true").lower() == "true"
+CLOSE_TICK_SECONDS = float(os.getenv("CLOSE_TICK_SECONDS", "1.0"))
+CLOSE_HORIZON_SECONDS = float(os.getenv("CLOSE_HORIZON_SECONDS", "600"))
+CLOSE_RELOAD_SECONDS = float(os.getenv("CLOSE_RELOAD_SECONDS", "30"))
+CLOSE_BATCH_SIZE = int(os.getenv("CLOSE_BATCH_SIZE", "500"))
+# pg advisory lock key; replicas sharing a database elect one closer with it
+CLOSE_LOCK_KEY = int(os.getenv("CLOSE_LOCK_KEY", "7301"))
+
+# Settlement of closed auctions
+SETTLEMENT_ENABLED = os.getenv("SETTLEMENT_ENABLED", "true").lower() == "true"
+SETTLEMENT_BATCH_SIZE = int(os.getenv("SETTLEMENT_BATCH_SIZE", "200"))
+SETTLEMENT_POLL_INTERVAL = float(os.getenv("SETTLEMENT_POLL_INTERVAL", "2.0"))
+SETTLEMENT_LEASE_SECONDS = float(os.getenv("SETTLEMENT_LEASE_SECONDS", "60"))
+SETTLEMENT_MAX_ATTEMPTS = int(os.getenv("SETTLEMENT_MAX_ATTEMPTS", "10"))
+TRANSACTIONS_SERVICE_URL = os.getenv("TRANSACTIONS_SERVICE_URL", "http://transactions-service:8000")
+
+# Celery runner for settlement; memory:// with eager tasks runs it in-process
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() == "true"
+
+# GET /auctions/{id} cache
+AUCTION_CACHE_SIZE = int(os.getenv("AUCTION_CACHE_SIZE", "10000"))
+AUCTION_CACHE_TTL = float(os.getenv("AUCTION_CACHE_TTL", "5.0"))
+
+# GET /auctions/ending-soon
+ENDING_SOON_WINDOW_SECONDS = float(os.getenv("ENDING_SOON_WINDOW_SECONDS", "3600"))
+ENDING_SOON_MAX = int(os.getenv("ENDING_SOON_MAX", "1000"))
+ENDING_SOON_REFRESH_SECONDS = float(os.getenv("ENDING_SOON_REFRESH_SECONDS", "2"))
+ENDING_SOON_REBUILD_SECONDS = float(os.getenv("ENDING_SOON_REBUILD_SECONDS", "60"))
+
+# Startup: wait for the database with exponential backoff
+DB_WAIT_TIMEOUT = float(os.getenv("DB_WAIT_TIMEOUT", "60"))
+DB_WAIT_INITIAL_DELAY = float(os.getenv("DB_WAIT_INITIAL_DELAY", "0.1"))
+DB_WAIT_MAX_DELAY = float(os.getenv("DB_WAIT_MAX_DELAY", "5"))
+
+# Database connection pool; the defaults cover FastAPI's 40 sync worker threads
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+# Behind PgBouncer (transaction pooling): no local pool and no prepared statements
+# The close scheduler's leader lock is session-level, so point this service at
+# a session-pooled (or direct) endpoint when more than one replica runs
+DB_EXTERNAL_POOLER = os.getenv("DB_EXTERNAL_POOLER", "false").lower() == "true"
+# Serve requests from an asyncpg (aiosqlite for SQLite) engine instead of the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+# Read replicas for GET handlers, comma-separated; empty means the primary serves everything
+DATABASE_REPLICA_URLS = [url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "1"))
+# How long a client's own write keeps its reads off replicas that have not replayed it
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "30"))
@@ -0,0 +1,282 @@
+# Settlement of closed auctions: charge the winner, notify the bidders
+import asyncio
+import datetime
+import logging
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from .models.auction import Auction
+from .models.settlement import Settlement, SettlementStage
+from .sqlalchemy_conn import SessionLocal, upsert
+from .settings import (
+    BIDDING_SERVICE_URL, TRANSACTIONS_SERVICE_URL, NOTIFICATIONS_SERVICE_URL,
+    SETTLEMENT_BATCH_SIZE, SETTLEMENT_POLL_INTERVAL, SETTLEMENT_LEASE_SECONDS, SETTLEMENT_MAX_ATTEMPTS,
+)
+from . import http_client
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_settlements(db: Session, auction_ids):
+    """Queue closed auctions for settlement; call in the transaction that closes them."""
+    if auction_ids:
+        db.execute(
+            upsert(db, Settlement).values([{"auction_id": auction_id} for auction_id in auction_ids])
+            .on_conflict_do_nothing()
+        )
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    return datetime.timedelta(seconds=min(2 ** attempts, 300))
+
+
+async def fetch_json(base_url: str, method: str, path: str, **kwargs):
+    response = await http_client.request(base_url, method, path, **kwargs)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method} {path}: HTTP {response.status_code}")
+    return response.json()
+
+
+def settlement_notifications(settlement: dict, bidder_ids):
+    auction_id = settlement["auction_id"]
+    winner_id = settlement["winner_id"]
+    notifications = [{
+        "user_id": winner_id,
+        "type": "item_purchased",
+        "message": f"You won auction #{auction_id} for ${settlement['amount']:.2f}",
+        "metadata": {"auction_id": auction_id, "transaction_id": settlement["transaction_id"]},
+    }]
+    notifications.extend(
+        {
+            "user_id": bidder_id,
+            "type": "auction_ended",
+            "message": f"Auction #{auction_id} has ended; you were outbid",
+            "metadata": {"auction_id": auction_id},
+        }
+        for bidder_id in bidder_ids if bidder_id != winner_id
+    )
+    return notifications
+
+
+class SettlementPipeline:
+    """
+    Settles closed auctions in batches, checkpointing each stage in the
+    settlements table:
+
+        Pending  -> winners looked up in bulk from bidding-service and charged
+                    with one POST /transactions/batch  -> Invoiced (or Unsold)
+        Invoiced -> winner and loser notifications sent in one
+                    POST /notifications/batch          -> Settled
+
+    transactions-service returns the existing transaction for an auction
+    that already has one, so replaying a batch after a crash does not charge
+    anyone twice. Rows are leased while being worked on, so several runners
+    (this background task, Celery workers) can share the table.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        # Called after a commit that queued settlements; safe from any thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.settle_once()
+            except Exception:
+                logger.exception("Settlement batch failed")
+                claimed = 0
+            if claimed < SETTLEMENT_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), SETTLEMENT_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def _claim(self):
+        now = datetime.datetime.utcnow()
+        with self._session_factory() as db:
+            settlements = (
+                db.query(Settlement)
+                .filter(
+                    Settlement.stage.in_([SettlementStage.Pending, SettlementStage.Invoiced]),
+                    Settlement.next_attempt_at <= now,
+                    Settlement.attempts < SETTLEMENT_MAX_ATTEMPTS,
+                )
+                .order_by(Settlement.next_attempt_at)
+                .limit(SETTLEMENT_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            lease_until = now + datetime.timedelta(seconds=SETTLEMENT_LEASE_SECONDS)
+            sellers = dict(
+                db.query(Auction.auction_id, Auction.seller_id)
+                .filter(Auction.auction_id.in_([settlement.auction_id for settlement in settlements]))
+                .all()
+            ) if settlements else {}
+            claimed = []
+            for settlement in settlements:
+                settlement.next_attempt_at = lease_until
+                claimed.append({
+                    "auction_id": settlement.auction_id,
+                    "stage": settlement.stage,
+                    "winner_id": settlement.winner_id,
+                    "amount": settlement.amount,
+                    "transaction_id": settlement.transaction_id,
+                    "attempts": settlement.attempts,
+                    "seller_id": sellers.get(settlement.auction_id),
+                })
+            db.commit()
+        return claimed
+
+    def _checkpoint(self, settlements, stage: SettlementStage):
+        if not settlements:
+            return
+        now = datetime.datetime.utcnow()
+        with self._session_factory() as db:
+            db.bulk_update_mappings(Settlement, [
+                {
+                    "auction_id": settlement["auction_id"],
+                    "stage": stage,
+                    "winner_id": settlement["winner_id"],
+                    "amount": settlement["amount"],
+                    "transaction_id": settlement["transaction_id"],
+                    # Each stage gets its own retry budget
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "last_error": None,
+                }
+                for settlement in settlements
+            ])
+            db.commit()
+        for settlement in settlements:
+            settlement["attempts"] = 0
+
+    def _fail(self, settlements, error: str):
+        now = datetime.datetime.utcnow()
+        with self._session_factory() as db:
+            for settlement in settlements:
+                attempts = settlement["attempts"] + 1
+                if attempts >= SETTLEMENT_MAX_ATTEMPTS:
+                    logger.error("Giving up settling auction %s after %s attempts: %s",
+                                 settlement["auction_id"], attempts, error)
+                db.query(Settlement).filter(Settlement.auction_id == settlement["auction_id"]).update(
+                    {
+                        Settlement.attempts: attempts,
+                        Settlement.next_attempt_at: now + retry_delay(attempts),
+                        Settlement.last_error: error,
+                    },
+                    synchronize_session=False,
+                )
+            db.commit()
+
+    async def _invoice(self, pending):
+        """Pending -> Invoiced/Unsold; returns the newly invoiced settlements."""
+        summaries = await fetch_json(
+            BIDDING_SERVICE_URL, "GET", "/bids/auctions/summary",
+            params={"auction_ids": [settlement["auction_id"] for settlement in pending]},
+        )
+        winners = {summary["auction_id"]: summary["highest_bid"] for summary in summaries if summary["highest_bid"]}
+        sold = [settlement for settlement in pending if settlement["auction_id"] in winners]
+        unsold = [settlement for settlement in pending if settlement["auction_id"] not in winners]
+        if sold:
+            transactions = await fetch_json(
+                TRANSACTIONS_SERVICE_URL, "POST", "/transactions/batch",
+                json=[
+                    {
+                        "auction_id": settlement["auction_id"],
+                        "buyer_id": winners[settlement["auction_id"]]["bidder_id"],
+                        "seller_id": settlement["seller_id"],
+                        "amount": winners[settlement["auction_id"]]["bid_amount"],
+                    }
+                    for settlement in sold
+                ],
+            )
+            by_auction = {transaction["auction_id"]: transaction for transaction in transactions}
+            for settlement in sold:
+                transaction = by_auction[settlement["auction_id"]]
+                settlement.update(
+                    winner_id=transaction["buyer_id"],
+                    amount=transaction["amount"],
+                    transaction_id=transaction["transaction_id"],
+                )
+        await run_in_threadpool(self._checkpoint, sold, SettlementStage.Invoiced)
+        await run_in_threadpool(self._checkpoint, unsold, SettlementStage.Unsold)
+        return sold
+
+    async def _notify(self, invoiced):
+        """Invoiced -> Settled."""
+        bidders = await fetch_json(
+            BIDDING_SERVICE_URL, "GET", "/bids/auctions/bidders",
+            params={"auction_ids": [settlement["auction_id"] for settlement in invoiced]},
+        )
+        bidders = {entry["auction_id"]: entry["bidder_ids"] for entry in bidders}
+        notifications = [
+            notification
+            for settlement in invoiced
+            for notification in settlement_notifications(settlement, bidders.get(settlement["auction_id"], []))
+        ]
+        await fetch_json(NOTIFICATIONS_SERVICE_URL, "POST", "/notifications/batch", json=notifications)
+        await run_in_threadpool(self._checkpoint, invoiced, SettlementStage.Settled)
+
+    async def settle_once(self) -> int:
+        claimed = await run_in_threadpool(self._claim)
+        if not claimed:
+            return 0
+        pending = [settlement for settlement in claimed if settlement["stage"] == SettlementStage.Pending]
+        invoiced = [settlement for settlement in claimed if settlement["stage"] == SettlementStage.Invoiced]
+        if pending:
+            try:
+                invoiced += await self._invoice(pending)
+            except Exception as e:
+                await run_in_threadpool(self._fail, pending, str(e) or type(e).__name__)
+        if invoiced:
+            try:
+                await self._notify(invoiced)
+            except Exception as e:
+                await run_in_threadpool(self._fail, invoiced, str(e) or type(e).__name__)
+        return len(claimed)
+
+    async def drain(self) -> int:
+        """Settle until nothing is due; for runners outside the API process."""
+        total = 0
+        while True:
+            claimed = await self.settle_once()
+            total += claimed
+            if claimed < SETTLEMENT_BATCH_SIZE:
+                return total
+
+    def stats(self):
+        with self._session_factory() as db:
+            counts = dict(
+                db.query(Settlement.stage, func.count(Settlement.auction_id)).group_by(Settlement.stage).all()
+            )
+            failing = db.query(func.count(Settlement.auction_id)).filter(Settlement.last_error.is_not(None)).scalar()
+        return {
+            **{stage.value: counts.get(stage, 0) for stage in SettlementStage},
+            "failing": failing,
+        }
+
+
+settlement_pipeline = SettlementPipeline()
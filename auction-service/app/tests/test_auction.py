@@ -1,6 +1,8 @@
 from fastapi.testclient import TestClient
 from app.main import app
+from app.lifecycle import prepare_database
 
+prepare_database(reset=True)
 client = TestClient(app)
 
 def test_create_auction():
@@ -13,4 +15,266 @@ def test_create_auction():
         "status": "Active"
     })
     assert response.status_code == 201
-    assert response.json()["status"] == "Active" 
\ No newline at end of file
+    assert response.json()["status"] == "Active" 
+
+def test_metrics_apply_status_filters():
+    from app.main import compute_auction_metrics
+    from app.sqlalchemy_conn import SessionLocal
+    client.post("/auctions", json={
+        "item_id": 102,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": "2999-01-02T00:00:00",
+        "starting_price": 10.0,
+        "current_price": 10.0,
+        "status": "Cancelled"
+    })
+    with SessionLocal() as db:
+        metrics = compute_auction_metrics(db)
+    assert metrics["status_distribution"]["Cancelled"] >= 1
+    # A cancelled auction ending in the future is not counted as ended
+    assert metrics["auctions_ended_last_year"] == 0
+
+def test_close_scheduler_closes_expired_auctions_in_one_pass():
+    from app.main import close_scheduler
+    def create(end_date):
+        return client.post("/auctions", json={
+            "item_id": 103,
+            "start_time": "2024-01-01T00:00:00",
+            "end_date": end_date,
+            "starting_price": 10.0,
+            "current_price": 10.0,
+            "status": "Active"
+        }).json()["auction_id"]
+    expired = [create("2024-01-02T00:00:00") for _ in range(3)]
+    upcoming = create("2999-01-02T00:00:00")
+    closed = close_scheduler.close_due()
+    assert set(expired) <= set(closed)
+    assert upcoming not in closed
+    assert client.get(f"/auctions/{expired[0]}").json()["status"] == "Closed"
+    assert client.get(f"/auctions/{upcoming}").json()["status"] == "Active"
+
+def test_ending_an_auction_queues_its_settlement():
+    from app.models.settlement import Settlement, SettlementStage
+    from app.sqlalchemy_conn import SessionLocal
+    auction_id = client.post("/auctions", json={
+        "item_id": 104,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": "2999-01-02T00:00:00",
+        "starting_price": 10.0,
+        "current_price": 10.0,
+        "status": "Active"
+    }).json()["auction_id"]
+    assert client.put(f"/auctions/{auction_id}/end").json()["status"] == "Closed"
+    # Ending twice must not queue a second settlement
+    client.put(f"/auctions/{auction_id}/end")
+    with SessionLocal() as db:
+        settlements = db.query(Settlement).filter(Settlement.auction_id == auction_id).all()
+    assert [s.stage for s in settlements] == [SettlementStage.Pending]
+
+def test_current_price_only_moves_up_on_active_auctions():
+    auction_id = client.post("/auctions", json={
+        "item_id": 105,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": "2999-01-02T00:00:00",
+        "starting_price": 10.0,
+        "current_price": 10.0,
+        "status": "Active"
+    }).json()["auction_id"]
+    raised = client.put(f"/auctions/{auction_id}/current_price", json={"current_price": 30.0}).json()
+    assert raised["updated"] and raised["current_price"] == 30.0
+    # A late, lower bid loses the race instead of lowering the price
+    stale = client.put(f"/auctions/{auction_id}/current_price", json={"current_price": 20.0}).json()
+    assert not stale["updated"] and stale["current_price"] == 30.0
+    client.put(f"/auctions/{auction_id}/end")
+    closed = client.put(f"/auctions/{auction_id}/current_price", json={"current_price": 40.0}).json()
+    assert not closed["updated"] and closed["current_price"] == 30.0
+    assert client.put("/auctions/999999/current_price", json={"current_price": 1.0}).status_code == 404
+
+def test_get_auction_is_cached_and_revalidates_with_etag():
+    from app.auction_cache import auction_cache
+    auction_id = client.post("/auctions", json={
+        "item_id": 106,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": "2999-01-02T00:00:00",
+        "starting_price": 10.0,
+        "current_price": 10.0,
+        "status": "Active"
+    }).json()["auction_id"]
+    first = client.get(f"/auctions/{auction_id}")
+    etag = first.headers["etag"]
+    assert "last-modified" in first.headers
+    hits = auction_cache.hits
+    revalidated = client.get(f"/auctions/{auction_id}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert auction_cache.hits == hits + 1
+    # The service's own writes invalidate the entry
+    client.put(f"/auctions/{auction_id}/current_price", json={"current_price": 50.0})
+    changed = client.get(f"/auctions/{auction_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["current_price"] == 50.0
+    assert changed.headers["etag"] != etag
+
+def test_list_auctions_filters_sorts_and_pages_by_end_date():
+    ids = []
+    for day, price, state in [(3, 50.0, "Active"), (1, 20.0, "Active"), (2, 90.0, "Active"), (4, 30.0, "Cancelled")]:
+        ids.append(client.post("/auctions", json={
+            "item_id": 107,
+            "start_time": "2024-01-01T00:00:00",
+            "end_date": f"2998-01-0{day}T00:00:00",
+            "starting_price": price,
+            "current_price": price,
+            "status": state
+        }).json()["auction_id"])
+    params = {"status": "Active", "ends_after": "2998-01-01T00:00:00", "ends_before": "2998-02-01T00:00:00",
+              "max_price": 60.0, "sort": "end_date", "limit": 1}
+    first = client.get("/auctions", params=params)
+    assert [a["auction_id"] for a in first.json()] == [ids[1]]
+    second = client.get("/auctions", params={**params, "after": first.headers["X-Next-Cursor"]})
+    assert [a["auction_id"] for a in second.json()] == [ids[0]]
+
+def test_ending_soon_view_tracks_writes():
+    from datetime import datetime, timedelta
+    soon = (datetime.utcnow() + timedelta(minutes=5)).isoformat()
+    auction_id = client.post("/auctions", json={
+        "item_id": 108,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": soon,
+        "starting_price": 10.0,
+        "current_price": 10.0,
+        "status": "Active"
+    }).json()["auction_id"]
+    assert auction_id in [a["auction_id"] for a in client.get("/auctions/ending-soon").json()]
+    client.put(f"/auctions/{auction_id}/current_price", json={"current_price": 15.0})
+    entry = next(a for a in client.get("/auctions/ending-soon").json() if a["auction_id"] == auction_id)
+    assert entry["current_price"] == 15.0
+    client.delete(f"/auctions/{auction_id}")
+    assert auction_id not in [a["auction_id"] for a in client.get("/auctions/ending-soon").json()]
+
+def test_ending_soon_slice_takes_a_fully_tied_group():
+    from datetime import datetime, timedelta
+    from app.ending_soon import EndingSoonView
+    start = datetime.utcnow() + timedelta(days=3000)
+    tied = start + timedelta(minutes=1)
+    ids = [client.post("/auctions", json={
+        "item_id": 110,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": tied.isoformat(),
+        "starting_price": 10.0,
+        "current_price": 10.0,
+        "status": "Active"
+    }).json()["auction_id"] for _ in range(3)]
+    rows, covered_until = EndingSoonView()._load_slice(start, start + timedelta(hours=1), room=2)
+    # More auctions tie than there is room for: keep them all and move past them
+    assert [row["auction_id"] for row in rows] == ids
+    assert covered_until == tied
+
+def test_user_auctions_are_read_by_seller_id():
+    auction_id = client.post("/auctions", json={
+        "item_id": 109,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": "2999-01-02T00:00:00",
+        "starting_price": 10.0,
+        "current_price": 10.0,
+        "status": "Active",
+        "seller_id": 77
+    }).json()["auction_id"]
+    assert [a["auction_id"] for a in client.get("/auctions/user/77").json()] == [auction_id]
+    # items-service reports a change of owner
+    client.put("/auctions/item/109/seller", json={"seller_id": 78})
+    assert client.get("/auctions/user/77").json() == []
+    assert client.get(f"/auctions/{auction_id}").json()["seller_id"] == 78
+
+def test_replica_router_follows_lag_and_client_writes(tmp_path):
+    import datetime
+    from sqlalchemy import create_engine
+    from app.sqlalchemy_conn import engine, ReplicaRouter, replica_heartbeat, read_heartbeat, write_heartbeat
+    # A second SQLite file stands in for the replica; copying the heartbeat is its replication
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    replica_heartbeat.create(replica)
+    def replicate():
+        with engine.connect() as conn:
+            beat = read_heartbeat(conn)
+        with replica.begin() as conn:
+            write_heartbeat(conn, beat)
+    router = ReplicaRouter(engine, [replica], max_lag=1.0)
+    router.check()
+    replicate()
+    router.check()
+    assert router.pick() == 0
+    # The replica has not replayed this client's latest write
+    assert router.pick(datetime.datetime.utcnow()) is None
+    # The primary moves on while the replica stalls
+    with engine.begin() as conn:
+        write_heartbeat(conn, datetime.datetime.utcnow() + datetime.timedelta(seconds=5))
+    router.check()
+    assert router.pick() is None
+
+def test_migrate_upgrades_a_database_from_before_migrations():
+    from sqlalchemy import MetaData, Table, Column, Integer, DateTime, Float, String, inspect
+    from app.lifecycle import reset_database, migrate
+    from app.sqlalchemy_conn import engine
+    # The auctions table as builds without schema_migrations left it
+    reset_database()
+    Table(
+        "auctions", MetaData(),
+        Column("auction_id", Integer, primary_key=True),
+        Column("item_id", Integer, nullable=False),
+        Column("start_time", DateTime, nullable=False),
+        Column("end_date", DateTime, nullable=False),
+        Column("starting_price", Float, nullable=False),
+        Column("current_price", Float, nullable=False),
+        Column("status", String, nullable=False),
+    ).create(engine)
+    migrate()
+    assert {"seller_id", "updated_at"} <= {column["name"] for column in inspect(engine).get_columns("auctions")}
+    response = client.post("/auctions", json={
+        "item_id": 111,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": "2999-01-02T00:00:00",
+        "starting_price": 10.0,
+        "current_price": 10.0,
+        "status": "Active",
+        "seller_id": 79
+    })
+    assert response.status_code == 201
+
+ASYNC_MODE_SCRIPT = """
+import asyncio, json
+import httpx
+from fastapi import Depends
+from sqlalchemy import text
+from app.lifecycle import prepare_database
+from app.main import app
+from app.sqlalchemy_conn import get_db, get_primary_db
+
+@app.get("/test/sessions")
+def sessions(db=Depends(get_db), primary=Depends(get_primary_db)):
+    return {"distinct": db is not primary, "primary": primary.execute(text("SELECT 1")).scalar()}
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        metrics = await asyncio.wait_for(asyncio.gather(client.get("/metrics"), client.get("/metrics")), 20)
+        both = (await client.get("/test/sessions")).json()
+    print(json.dumps({"metrics": [r.status_code for r in metrics], "sessions": both}))
+
+prepare_database(reset=True)
+asyncio.run(main())
+"""
+
+def test_async_mode_serves_concurrent_metrics_and_separate_sessions(tmp_path):
+    import json
+    import os
+    import subprocess
+    import sys
+    # DB_ASYNC is read at import, so this runs in its own interpreter
+    env = {**os.environ, "DB_ASYNC": "true", "DATABASE_URL": f"sqlite:///{tmp_path / 'async.db'}"}
+    result = subprocess.run(
+        [sys.executable, "-c", ASYNC_MODE_SCRIPT], env=env, capture_output=True, text=True, timeout=60,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    # Two cold /metrics requests used to deadlock the loop on the single-flight lock
+    assert report["metrics"] == [200, 200]
+    assert report["sessions"] == {"distinct": True, "primary": 1}
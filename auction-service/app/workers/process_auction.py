@@ -1,7 +1,24 @@
+import asyncio
 from celery import Celery
+from ..settings import CELERY_BROKER_URL, CELERY_TASK_ALWAYS_EAGER
 
-celery_app = Celery('auction_worker', broker='redis://localhost:6379/0')
+celery_app = Celery('auction_worker', broker=CELERY_BROKER_URL)
+# With CELERY_BROKER_URL=memory:// and eager tasks this runs without a broker
+celery_app.conf.task_always_eager = CELERY_TASK_ALWAYS_EAGER
+
+async def _drain():
+    from ..settlement import settlement_pipeline
+    from .. import http_client
+    try:
+        return await settlement_pipeline.drain()
+    finally:
+        await http_client.close_clients()
 
 @celery_app.task
-def process_auction(auction_id: int):
-    print(f"Processing auction with ID: {auction_id}") 
\ No newline at end of file
+def process_auction(auction_id: int = None):
+    """
+    Settle closed auctions from a worker process. Work is taken from the
+    settlements table, so any trigger settles everything that is due,
+    including `auction_id`.
+    """
+    return asyncio.run(_drain())
@@ -1,28 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response
+from typing import Optional
 from sqlalchemy.orm import Session
 from .models.user import User
 from .schemas.user import UserOut, UserCreate
-from .sqlalchemy_conn import Base, engine, get_db
-import time
+from .sqlalchemy_conn import get_db, run_db, pool_metrics, DbRoute, ReadYourWrites
+from .lifecycle import prepare_database, health
+from .metrics_cache import metrics_cache
+from .pagination import keyset, page, stream_ndjson, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 import logging
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.sql import func
-from datetime import datetime, timedelta
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Wait for database to be ready
-time.sleep(5)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Wait for the database, then apply any pending migrations
+    await run_in_threadpool(prepare_database)
+    health.started = True
+    yield
+    health.started = False
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = DbRoute
+app.add_middleware(ReadYourWrites)
 
-# Initialize database
-logger.info("Creating database tables...")
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
-logger.info("Database tables created successfully")
+@app.get("/health/live")
+def liveness():
+    return health.live()
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    ready, body = health.ready()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return body
 
 # User API endpoints
 @app.post("/users", response_model=UserOut, status_code=status.HTTP_201_CREATED)
@@ -51,9 +67,21 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
     return user
 
 @app.get("/users", response_model=list[UserOut])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+def get_users(
+    response: Response,
+    after: Optional[int] = None,
+    skip: int = 0,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    # `after` (keyset) is preferred; `skip` is kept for existing OFFSET callers
+    def build(db: Session):
+        query = keyset(db.query(User), User.user_id, after=after)
+        return query.offset(skip) if skip else query
+    if stream:
+        return stream_ndjson(build, UserOut, db=db)
+    return page(build(db), limit, response, lambda user: user.user_id)
 
 @app.put("/users/{user_id}", response_model=UserOut)
 def update_user(user_id: int, user: UserCreate, db: Session = Depends(get_db)):
@@ -80,17 +108,18 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     db.commit()
     return None
 
-@app.get("/metrics")
-def get_user_metrics(db: Session = Depends(get_db)):
-    now = datetime.utcnow()
-    one_day_ago = now - timedelta(days=1)
-    one_week_ago = now - timedelta(weeks=1)
-    one_month_ago = now - timedelta(days=30)
-    one_year_ago = now - timedelta(days=365)
-
-    total_users = db.query(User).count()
+def compute_user_metrics(db: Session):
+    total_users = db.query(func.count(User.user_id)).scalar()
     # If created_at field is available, add time-based metrics
     return {
         "total_users": total_users,
         # Add time-based metrics if created_at exists
     }
+
+@app.get("/metrics")
+async def get_user_metrics(db: Session = Depends(get_db)):
+    return await metrics_cache.get("users", lambda: run_db(compute_user_metrics, db))
+
+@app.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
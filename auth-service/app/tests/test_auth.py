@@ -1,15 +1,15 @@
 from fastapi.testclient import TestClient
 from app.main import app
+from app.lifecycle import prepare_database
 
+prepare_database(reset=True)
 client = TestClient(app)
 
 def test_register_user():
-    response = client.post("/register", json={
-        "first_name": "Alice",
-        "last_name": "Smith",
-        "email": "alice@example.com",
-        "password": "securepass",
-        "phone_number": "+37012345678"
-    })
-    assert response.status_code == 200
+    # Registration is POST /users; there is no /register route
+    user = {"first_name": "Alice", "last_name": "Smith", "email": "alice@example.com"}
+    response = client.post("/users", json=user)
+    assert response.status_code == 201
     assert response.json()["email"] == "alice@example.com"
+    assert client.get(f"/users/{response.json()['user_id']}").json() == response.json()
+    assert client.post("/users", json=user).status_code == 400
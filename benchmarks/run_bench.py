@@ -0,0 +1,337 @@
+"""
+Load and latency benchmark for the bid path.
+
+Boots the services under test with uvicorn (SQLite files by default, or the
+databases given with --database-url), stands in for every other peer with
+stub_peers.py, drives a weighted mix of requests and reports throughput and
+p50/p95/p99 per endpoint.
+
+    python benchmarks/run_bench.py --duration 30 --concurrency 64
+    python benchmarks/run_bench.py --mix place_bid=60,highest_bid=30,list_bids=10
+    python benchmarks/run_bench.py --services bidding,notifications --mix place_bid=50,user_notifications=50
+    python benchmarks/run_bench.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_bench.py --baseline benchmarks/baseline.json --tolerance 0.15
+
+With --baseline the run exits non-zero when an endpoint's p95 grows, or its
+throughput drops, by more than the tolerance, or when its error rate is higher
+than the baseline's. Throughput counts only requests answered without a 5xx or
+transport error, so failing fast does not pass for being fast.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICES = {
+    "bidding": "bidding-service",
+    "auction": "auction-service",
+    "notifications": "notifications-service",
+    "transactions": "transactions-service",
+    "items": "items-service",
+    "auth": "auth-service",
+}
+
+# Peer URLs every service reads from its settings
+PEER_SETTINGS = {
+    "auction": "AUCTION_SERVICE_URL",
+    "bidding": "BIDDING_SERVICE_URL",
+    "items": "ITEMS_SERVICE_URL",
+    "notifications": "NOTIFICATIONS_SERVICE_URL",
+    "transactions": "TRANSACTIONS_SERVICE_URL",
+}
+
+DEFAULT_MIX = "place_bid=60,highest_bid=20,auction_bids=10,list_bids=5,bid_metrics=5"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_pairs(value: str, cast=str):
+    pairs = {}
+    for part in filter(None, value.split(",")):
+        key, _, raw = part.partition("=")
+        pairs[key.strip()] = cast(raw.strip())
+    return pairs
+
+
+def percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Cluster:
+    """Services under test plus one stub process for every other peer."""
+
+    def __init__(self, services, database_urls, workdir, extra_env):
+        self.services = services
+        self.database_urls = database_urls
+        self.workdir = workdir
+        self.extra_env = extra_env
+        self.urls = {}
+        self.processes = []
+
+    def _spawn(self, args, cwd, env, log_name):
+        log = open(os.path.join(self.workdir, f"{log_name}.log"), "w")
+        process = subprocess.Popen(args, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+
+    def start(self):
+        stub_port = free_port()
+        stub_url = f"http://127.0.0.1:{stub_port}"
+        self._spawn(
+            [sys.executable, "-m", "uvicorn", "stub_peers:app", "--port", str(stub_port), "--log-level", "warning"],
+            os.path.dirname(os.path.abspath(__file__)), dict(os.environ), "stub_peers",
+        )
+        for name in self.services:
+            self.urls[name] = f"http://127.0.0.1:{free_port()}"
+        peers = {name: self.urls.get(name, stub_url) for name in PEER_SETTINGS}
+
+        for name in self.services:
+            env = dict(os.environ)
+            env.update(self.extra_env)
+            env["DATABASE_URL"] = self.database_urls.get(
+                name, f"sqlite:///{os.path.join(self.workdir, name + '.db')}"
+            )
+            for peer, setting in PEER_SETTINGS.items():
+                env[setting] = peers[peer]
+            port = self.urls[name].rsplit(":", 1)[1]
+            self._spawn(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", port, "--log-level", "warning"],
+                os.path.join(ROOT, SERVICES[name]), env, name,
+            )
+        self._wait_ready([stub_url] + [self.urls[name] for name in self.services])
+
+    def _wait_ready(self, urls, timeout: float = 60):
+        deadline = time.monotonic() + timeout
+        pending = list(urls)
+        while pending:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Services did not come up: {pending} (logs in {self.workdir})")
+            url = pending[0]
+            try:
+                if httpx.get(f"{url}/health/ready", timeout=1).status_code == 200:
+                    pending.pop(0)
+                    continue
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class Workload:
+    """The request mix; each operation returns (endpoint, method, path, kwargs)."""
+
+    def __init__(self, auctions: int, users: int):
+        self.auctions = auctions
+        self.users = users
+        self.prices = {auction_id: 1.0 for auction_id in range(1, auctions + 1)}
+
+    def _auction(self):
+        return random.randint(1, self.auctions)
+
+    def place_bid(self):
+        auction_id = self._auction()
+        self.prices[auction_id] += random.uniform(0.5, 5.0)
+        return "bidding", "POST", "/bids", {"json": {
+            "auction_id": auction_id,
+            "bidder_id": random.randint(1, self.users),
+            "bid_amount": round(self.prices[auction_id], 2),
+            "bid_time": "2024-01-01T00:00:00",
+        }}
+
+    def highest_bid(self):
+        return "bidding", "GET", f"/bids/auction/{self._auction()}/highest", {}
+
+    def auction_bids(self):
+        return "bidding", "GET", f"/bids/auction/{self._auction()}", {"params": {"limit": 50}}
+
+    def list_bids(self):
+        return "bidding", "GET", "/bids", {"params": {"limit": 100}}
+
+    def bid_metrics(self):
+        return "bidding", "GET", "/metrics", {}
+
+    def create_notification(self):
+        return "notifications", "POST", "/notifications", {"json": {
+            "user_id": random.randint(1, self.users),
+            "type": "new_bid",
+            "message": "You have been outbid",
+            "metadata": {"auction_id": self._auction()},
+        }}
+
+    def user_notifications(self):
+        return "notifications", "GET", f"/notifications/user/{random.randint(1, self.users)}", {}
+
+    def list_auctions(self):
+        return "auction", "GET", "/auctions", {"params": {"limit": 100}}
+
+    def get_auction(self):
+        return "auction", "GET", f"/auctions/{self._auction()}", {}
+
+
+async def drive(cluster: Cluster, workload: Workload, mix, duration: float, concurrency: int, warmup: float):
+    operations = list(mix)
+    weights = [mix[name] for name in operations]
+    samples = {name: [] for name in operations}
+    statuses = {name: {} for name in operations}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        measure_from = time.monotonic() + warmup
+        stop_at = measure_from + duration
+
+        async def worker():
+            while time.monotonic() < stop_at:
+                name = random.choices(operations, weights)[0]
+                service, method, path, kwargs = getattr(workload, name)()
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, cluster.urls[service] + path, **kwargs)
+                    code = response.status_code
+                except httpx.HTTPError as e:
+                    code = type(e).__name__
+                elapsed = time.perf_counter() - started
+                if time.monotonic() >= measure_from:
+                    samples[name].append(elapsed)
+                    statuses[name][code] = statuses[name].get(code, 0) + 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, statuses
+
+
+def summarize(samples, statuses, duration: float):
+    report = {}
+    for name, latencies in samples.items():
+        errors = sum(count for code, count in statuses[name].items() if not isinstance(code, int) or code >= 500)
+        report[name] = {
+            "requests": len(latencies),
+            "throughput_rps": (len(latencies) - errors) / duration,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "errors": errors,
+            "error_rate": errors / len(latencies) if latencies else 0.0,
+            "statuses": {str(code): count for code, count in sorted(statuses[name].items(), key=str)},
+        }
+    return report
+
+
+def print_report(report):
+    header = f"{'endpoint':<22}{'reqs':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report.items():
+        print(f"{name:<22}{row['requests']:>8}{row['throughput_rps']:>10.1f}{row['p50_ms']:>10.2f}"
+              f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['errors']:>8}")
+
+
+def compare(report, baseline, tolerance: float):
+    regressions = []
+    for name, row in report.items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms")
+        if before["throughput_rps"] and row["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_rps']:.1f} -> {row['throughput_rps']:.1f} rps")
+        before_error_rate = before.get("error_rate", before["errors"] / before["requests"] if before["requests"] else 0.0)
+        if row["error_rate"] > before_error_rate:
+            regressions.append(f"{name}: error rate {before_error_rate:.2%} -> {row['error_rate']:.2%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", default="bidding", help="comma-separated services to boot (others are stubbed)")
+    parser.add_argument("--database-url", action="append", default=[], metavar="SERVICE=URL",
+                        help="database for a service; defaults to a SQLite file in a temp dir")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted operations, e.g. place_bid=70,highest_bid=30")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before the run")
+    # SQLite takes one writer at a time: beyond a few clients the default run
+    # measures lock waits (and "database is locked" errors), not the services
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="concurrent clients; raise it with --database-url on PostgreSQL")
+    parser.add_argument("--auctions", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra setting for the services, e.g. GROUP_COMMIT_ENABLED=true")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--save-baseline", help="write this run as the baseline to compare against")
+    parser.add_argument("--baseline", help="compare against this baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    services = [name.strip() for name in args.services.split(",") if name.strip()]
+    unknown = [name for name in services if name not in SERVICES]
+    if unknown:
+        parser.error(f"unknown services: {', '.join(unknown)}")
+    mix = parse_pairs(args.mix, float)
+    workload = Workload(args.auctions, args.users)
+    for name in mix:
+        operation = getattr(workload, name, None)
+        if operation is None:
+            parser.error(f"unknown operation: {name}")
+        if operation()[0] not in services:
+            parser.error(f"operation {name} needs the {operation()[0]} service in --services")
+
+    workdir = tempfile.mkdtemp(prefix="auction-bench-")
+    cluster = Cluster(services, parse_pairs(",".join(args.database_url)), workdir, parse_pairs(",".join(args.env)))
+    try:
+        cluster.start()
+        samples, statuses = asyncio.run(
+            drive(cluster, workload, mix, args.duration, args.concurrency, args.warmup)
+        )
+    finally:
+        cluster.stop()
+
+    report = summarize(samples, statuses, args.duration)
+    print_report(report)
+    result = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline", "output")},
+        "endpoints": report,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
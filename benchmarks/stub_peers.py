@@ -0,0 +1,47 @@
+# Stand-in peer services for benchmarks: answers every inter-service call
+# cheaply so the service under test is the only thing being measured.
+from typing import Any, Dict, List
+from fastapi import FastAPI, Query, Request
+
+app = FastAPI()
+
+
+@app.get("/auctions/{auction_id}")
+def get_auction(auction_id: int):
+    return {
+        "auction_id": auction_id,
+        "item_id": auction_id,
+        "start_time": "2024-01-01T00:00:00",
+        "end_date": "2999-01-01T00:00:00",
+        "starting_price": 1.0,
+        "current_price": 1.0,
+        "status": "Active",
+    }
+
+
+
+@app.get("/bids/auctions/summary")
+def get_auction_summaries(auction_ids: List[int] = Query([])):
+    # Every closing auction has sold, so settlement goes through the transactions stub
+    return [
+        {"auction_id": auction_id, "highest_bid": {"bidder_id": 1, "bid_amount": 1.0}, "bid_count": 1}
+        for auction_id in auction_ids
+    ]
+
+
+@app.get("/bids/auctions/bidders")
+def get_auction_bidders(auction_ids: List[int] = Query([])):
+    return [{"auction_id": auction_id, "bidder_ids": [1]} for auction_id in auction_ids]
+
+
+@app.post("/transactions/batch")
+def create_transactions(transactions: List[Dict[str, Any]]):
+    return [
+        {**transaction, "transaction_id": transaction["auction_id"], "status": "Pending"}
+        for transaction in transactions
+    ]
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def accept_anything(path: str, request: Request):
+    await request.body()
+    return {"status": "ok"}
@@ -0,0 +1,122 @@
+# Incrementally maintained per-auction leader for bidding-service
+from collections import Counter
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+from .models.bid import Bid, AuctionLeader, AuctionBidder
+from .sqlalchemy_conn import upsert
+from .rollups import record_bid_hours, unrecord_bid_hour
+from .settings import METRICS_USE_ROLLUPS
+
+
+def record_bids(db: Session, bids):
+    """
+    Fold newly inserted bids (dicts with bid_id, auction_id, bidder_id,
+    bid_amount and bid_time) into the leader table, and the hourly rollup when
+    enabled. Must run in the same transaction as the inserts.
+    """
+    if not bids:
+        return
+
+    pairs = {(bid["auction_id"], bid["bidder_id"]) for bid in bids}
+    new_bidders = Counter(
+        auction_id for (auction_id,) in db.execute(
+            upsert(db, AuctionBidder)
+            .values([{"auction_id": auction_id, "bidder_id": bidder_id} for auction_id, bidder_id in pairs])
+            .on_conflict_do_nothing()
+            .returning(AuctionBidder.auction_id)
+        )
+    )
+
+    per_auction = {}
+    for bid in bids:
+        entry = per_auction.setdefault(bid["auction_id"], {"leader": bid, "count": 0})
+        entry["count"] += 1
+        if bid["bid_amount"] > entry["leader"]["bid_amount"]:
+            entry["leader"] = bid
+    rows = [
+        {
+            "auction_id": auction_id,
+            "highest_bid_id": entry["leader"]["bid_id"],
+            "highest_bidder_id": entry["leader"]["bidder_id"],
+            "highest_bid_amount": entry["leader"]["bid_amount"],
+            "highest_bid_time": entry["leader"]["bid_time"],
+            "bid_count": entry["count"],
+            "unique_bidder_count": new_bidders[auction_id],
+        }
+        for auction_id, entry in per_auction.items()
+    ]
+
+    stmt = upsert(db, AuctionLeader)
+    excluded = stmt.excluded
+    leads = excluded.highest_bid_amount > AuctionLeader.highest_bid_amount
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AuctionLeader.auction_id],
+        set_={
+            "bid_count": AuctionLeader.bid_count + excluded.bid_count,
+            "unique_bidder_count": AuctionLeader.unique_bidder_count + excluded.unique_bidder_count,
+            "highest_bid_id": case((leads, excluded.highest_bid_id), else_=AuctionLeader.highest_bid_id),
+            "highest_bidder_id": case((leads, excluded.highest_bidder_id), else_=AuctionLeader.highest_bidder_id),
+            "highest_bid_amount": case((leads, excluded.highest_bid_amount), else_=AuctionLeader.highest_bid_amount),
+            "highest_bid_time": case((leads, excluded.highest_bid_time), else_=AuctionLeader.highest_bid_time),
+        },
+    )
+    db.execute(stmt, rows)
+    if METRICS_USE_ROLLUPS:
+        record_bid_hours(db, bids)
+
+
+def unrecord_bid(db: Session, bid: Bid):
+    """Take a deleted bid back out of the leader table; call after the delete is flushed."""
+    leader = (
+        db.query(AuctionLeader)
+        .filter(AuctionLeader.auction_id == bid.auction_id)
+        .with_for_update()
+        .first()
+    )
+    if leader is None:
+        return
+
+    leader.bid_count -= 1
+    if METRICS_USE_ROLLUPS:
+        unrecord_bid_hour(db, bid)
+    still_bidding = db.query(Bid.bid_id).filter(
+        Bid.auction_id == bid.auction_id, Bid.bidder_id == bid.bidder_id
+    ).first()
+    if still_bidding is None:
+        db.query(AuctionBidder).filter(
+            AuctionBidder.auction_id == bid.auction_id, AuctionBidder.bidder_id == bid.bidder_id
+        ).delete(synchronize_session=False)
+        leader.unique_bidder_count -= 1
+
+    if leader.bid_count <= 0:
+        db.delete(leader)
+    elif leader.highest_bid_id == bid.bid_id:
+        top = (
+            db.query(Bid)
+            .filter(Bid.auction_id == bid.auction_id)
+            .order_by(Bid.bid_amount.desc(), Bid.bid_time)
+            .first()
+        )
+        leader.highest_bid_id = top.bid_id
+        leader.highest_bidder_id = top.bidder_id
+        leader.highest_bid_amount = top.bid_amount
+        leader.highest_bid_time = top.bid_time
+
+
+def leader_as_bid(leader: AuctionLeader) -> dict:
+    return {
+        "bid_id": leader.highest_bid_id,
+        "auction_id": leader.auction_id,
+        "bidder_id": leader.highest_bidder_id,
+        "bid_amount": leader.highest_bid_amount,
+        "bid_time": leader.highest_bid_time,
+    }
+
+
+def leader_summary(leader: AuctionLeader) -> dict:
+    return {
+        "auction_id": leader.auction_id,
+        "highest_bid": leader_as_bid(leader),
+        "bid_count": leader.bid_count,
+        "unique_bidder_count": leader.unique_bidder_count,
+    }
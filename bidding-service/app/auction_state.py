@@ -0,0 +1,134 @@
+# In-memory auction state for bidding-service
+import datetime
+import threading
+
+# Number of lock stripes guarding the auction states. Auctions are mapped onto
+# a stripe by id, so bids on unrelated auctions only contend on a collision.
+LOCK_STRIPES = 64
+
+
+class BidRejected(Exception):
+    """Raised when a bid fails validation against the auction state."""
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class AuctionState:
+    """Authoritative view of a single auction as seen by the bidding path."""
+
+    __slots__ = ("auction_id", "status", "end_date", "current_price", "highest_bidder_id")
+
+    def __init__(self, auction_id: int, status: str, end_date: datetime.datetime,
+                 current_price: float, highest_bidder_id: int = None):
+        self.auction_id = auction_id
+        self.status = status
+        self.end_date = end_date
+        self.current_price = current_price
+        self.highest_bidder_id = highest_bidder_id
+
+    def as_dict(self):
+        return {
+            "auction_id": self.auction_id,
+            "status": self.status,
+            "end_date": self.end_date,
+            "current_price": self.current_price,
+            "highest_bidder_id": self.highest_bidder_id,
+        }
+
+
+def _parse_datetime(value):
+    if isinstance(value, datetime.datetime) or value is None:
+        return value
+    return datetime.datetime.fromisoformat(value)
+
+
+class AuctionStateStore:
+    def __init__(self, stripes: int = LOCK_STRIPES):
+        self._states = {}
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _lock_for(self, auction_id: int) -> threading.Lock:
+        return self._locks[auction_id % len(self._locks)]
+
+    def get(self, auction_id: int):
+        return self._states.get(auction_id)
+
+    def warm(self, auction: dict, highest_bid_amount: float = None, highest_bidder_id: int = None) -> AuctionState:
+        """
+        Install the state of an auction from an auction-service payload.
+        The local highest bid wins over a lagging current_price upstream.
+        """
+        auction_id = auction["auction_id"]
+        current_price = auction["current_price"]
+        if highest_bid_amount is not None and highest_bid_amount >= current_price:
+            current_price = highest_bid_amount
+        else:
+            highest_bidder_id = None
+
+        with self._lock_for(auction_id):
+            existing = self._states.get(auction_id)
+            if existing is not None and existing.current_price > current_price:
+                # A bid was accepted while the snapshot was in flight
+                current_price = existing.current_price
+                highest_bidder_id = existing.highest_bidder_id
+            state = AuctionState(
+                auction_id=auction_id,
+                status=auction["status"],
+                end_date=_parse_datetime(auction["end_date"]),
+                current_price=current_price,
+                highest_bidder_id=highest_bidder_id,
+            )
+            self._states[auction_id] = state
+        return state
+
+    def invalidate(self, auction_id: int):
+        with self._lock_for(auction_id):
+            self._states.pop(auction_id, None)
+
+    def check_active(self, auction_id: int, now: datetime.datetime = None) -> AuctionState:
+        state = self._states.get(auction_id)
+        if state is None:
+            raise BidRejected("Auction not found or inaccessible")
+        now = now or datetime.datetime.utcnow()
+        if state.status != "Active" or (state.end_date is not None and state.end_date <= now):
+            raise BidRejected("Auction is not active")
+        return state
+
+    def try_accept(self, auction_id: int, bidder_id: int, bid_amount: float, now: datetime.datetime = None):
+        """
+        Atomically check a bid against the auction state and, if it beats the
+        current price, make it the new leader. If the bid then fails to
+        commit, the caller invalidates the auction so it reloads from the
+        leader table: a bid accepted after this one may already lead.
+        """
+        with self._lock_for(auction_id):
+            state = self.check_active(auction_id, now)
+            if bid_amount <= state.current_price:
+                raise BidRejected("Bid amount must be higher than current price")
+            state.current_price = bid_amount
+            state.highest_bidder_id = bidder_id
+
+    def try_accept_many(self, auction_id: int, bids, now: datetime.datetime = None):
+        """
+        Check a sequence of (bidder_id, bid_amount) pairs for one auction under
+        a single lock acquisition; each accepted bid raises the price for the
+        ones after it. Returns a rejection detail per bid (None if accepted).
+        """
+        with self._lock_for(auction_id):
+            try:
+                state = self.check_active(auction_id, now)
+            except BidRejected as e:
+                return [e.detail] * len(bids)
+            results = []
+            for bidder_id, bid_amount in bids:
+                if bid_amount <= state.current_price:
+                    results.append("Bid amount must be higher than current price")
+                    continue
+                state.current_price = bid_amount
+                state.highest_bidder_id = bidder_id
+                results.append(None)
+        return results
+
+auction_states = AuctionStateStore()
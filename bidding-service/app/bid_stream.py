@@ -0,0 +1,89 @@
+# In-process fan-out of accepted bids to live subscribers
+import asyncio
+import json
+import logging
+from fastapi.encoders import jsonable_encoder
+from .settings import BID_STREAM_QUEUE_SIZE, BID_STREAM_MAX_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, auction_id: int, queue_size: int):
+        self.auction_id = auction_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class BidBroker:
+    """
+    Per-auction pub/sub living on the event loop. Each subscriber has a
+    bounded queue; one that falls behind is dropped rather than allowed to
+    hold up publishing or grow without bound.
+    """
+
+    def __init__(self, queue_size: int = BID_STREAM_QUEUE_SIZE, max_subscribers: int = BID_STREAM_MAX_SUBSCRIBERS):
+        self._queue_size = queue_size
+        self._max_subscribers = max_subscribers
+        self._subscribers = {}
+        self._count = 0
+        self.dropped_total = 0
+
+    def subscribe(self, auction_id: int) -> Subscription:
+        if self._count >= self._max_subscribers:
+            raise TooManySubscribers()
+        subscription = Subscription(auction_id, self._queue_size)
+        self._subscribers.setdefault(auction_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.auction_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        self._count -= 1
+        if not subscribers:
+            del self._subscribers[subscription.auction_id]
+
+    def publish(self, auction_id: int, event: str, data: dict):
+        subscribers = self._subscribers.get(auction_id)
+        if not subscribers:
+            return
+        message = (event, data)
+        for subscription in list(subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+                self.dropped_total += 1
+                logger.info("Dropped slow bid stream subscriber on auction %s", auction_id)
+
+    def publish_bid(self, bid: dict):
+        self.publish(bid["auction_id"], "bid", {
+            "bid_id": bid["bid_id"],
+            "auction_id": bid["auction_id"],
+            "bidder_id": bid["bidder_id"],
+            "bid_amount": bid["bid_amount"],
+            "bid_time": bid["bid_time"],
+            "current_price": bid["bid_amount"],
+        })
+
+    def stats(self):
+        return {
+            "subscribers": self._count,
+            "auctions": len(self._subscribers),
+            "dropped_total": self.dropped_total,
+        }
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+bid_broker = BidBroker()
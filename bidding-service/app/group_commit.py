@@ -0,0 +1,125 @@
+# Group commit for bid inserts in bidding-service
+import asyncio
+import threading
+import time
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
+from .models.bid import Bid
+from .outbox import enqueue, bid_events
+from .auction_leader import record_bids
+from .auction_state import auction_states
+from .sqlalchemy_conn import SessionLocal
+from .settings import GROUP_COMMIT_WINDOW_MS, GROUP_COMMIT_MAX_BATCH
+
+
+class GroupCommitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.bids = 0
+        self.failed_batches = 0
+        self.max_batch_size = 0
+        self.total_queue_delay_ms = 0.0
+        self.max_queue_delay_ms = 0.0
+
+    def record(self, batch_size: int, queue_delays_ms):
+        with self._lock:
+            self.batches += 1
+            self.bids += batch_size
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.total_queue_delay_ms += sum(queue_delays_ms)
+            self.max_queue_delay_ms = max([self.max_queue_delay_ms, *queue_delays_ms])
+
+    def record_failure(self):
+        with self._lock:
+            self.failed_batches += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "bids": self.bids,
+                "failed_batches": self.failed_batches,
+                "avg_batch_size": self.bids / self.batches if self.batches else 0,
+                "max_batch_size": self.max_batch_size,
+                "avg_queue_delay_ms": self.total_queue_delay_ms / self.bids if self.bids else 0,
+                "max_queue_delay_ms": self.max_queue_delay_ms,
+            }
+
+
+class GroupCommitWriter:
+    """
+    Coalesces concurrent bid inserts arriving within a short window into one
+    multi-row INSERT ... RETURNING, committed together with their outbox
+    events. Each caller gets back its own row, including the new bid_id.
+    """
+
+    def __init__(self, session_factory=SessionLocal, window_ms: float = GROUP_COMMIT_WINDOW_MS,
+                 max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self._session_factory = session_factory
+        self._window = window_ms / 1000
+        self._max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        # The loop holds tasks weakly; keep flushes alive until they finish
+        self._tasks = set()
+        self.stats = GroupCommitStats()
+
+    async def submit(self, row: dict) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future, time.perf_counter()))
+        if len(self._pending) >= self._max_batch:
+            task = asyncio.create_task(self._flush(self._take()))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+        return await future
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        return batch
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self._window)
+        self._timer = None
+        await self._flush(self._take())
+
+    async def _flush(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        self.stats.record(len(batch), [(started - enqueued) * 1000 for _, _, enqueued in batch])
+        try:
+            results = await run_in_threadpool(self._write, [row for row, _, _ in batch])
+        except Exception as e:
+            self.stats.record_failure()
+            # Leads claimed by these bids never committed; reload from the leader table.
+            # Done here rather than by the callers, which may have gone away.
+            for auction_id in {row["auction_id"] for row, _, _ in batch}:
+                auction_states.invalidate(auction_id)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _write(self, rows):
+        with self._session_factory() as db:
+            inserted = db.execute(
+                insert(Bid).returning(Bid.bid_id, sort_by_parameter_order=True), rows
+            ).all()
+            results = [{**row, "bid_id": bid_id} for row, (bid_id,) in zip(rows, inserted)]
+            record_bids(db, results)
+            enqueue(db, [
+                event
+                for bid in results
+                for event in bid_events(bid["auction_id"], bid["bid_id"], bid["bidder_id"], bid["bid_amount"])
+            ])
+            db.commit()
+        return results
+
+
+bid_writer = GroupCommitWriter()
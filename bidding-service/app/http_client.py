@@ -0,0 +1,51 @@
+# Pooled async HTTP client for calls to peer services
+import asyncio
+import logging
+import httpx
+from .settings import HTTP_POOL_SIZE, HTTP_TIMEOUT, HTTP_POOL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# One long-lived client per peer service, so connections are kept alive and
+# outbound concurrency to each peer is bounded by its own pool.
+_clients = {}
+
+
+def get_client(base_url: str) -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(base_url)
+    if entry is None or entry[0] is not loop:
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, pool=HTTP_POOL_TIMEOUT),
+        )
+        entry = (loop, client)
+        _clients[base_url] = entry
+    return entry[1]
+
+
+async def request(base_url: str, method: str, path: str, timeout: float = None, **kwargs) -> httpx.Response:
+    """
+    Send a request to a peer service through its pooled client.
+    `timeout` overrides the default deadline for this call only.
+    """
+    if timeout is not None:
+        kwargs["timeout"] = httpx.Timeout(timeout, pool=HTTP_POOL_TIMEOUT)
+    return await get_client(base_url).request(method, path, **kwargs)
+
+
+async def send_quietly(base_url: str, method: str, path: str, **kwargs):
+    # Fire a best-effort call; failures are logged, never raised
+    try:
+        return await request(base_url, method, path, **kwargs)
+    except Exception as e:
+        logger.warning("%s %s%s failed: %s", method, base_url, path, e)
+        return None
+
+
+async def close_clients():
+    while _clients:
+        _, (loop, client) = _clients.popitem()
+        if loop is asyncio.get_running_loop():
+            await client.aclose()
@@ -1,77 +1,274 @@
 import datetime
-from fastapi import FastAPI, Depends, HTTPException, status
-from .models.bid import Base, Bid
+from collections import OrderedDict
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Query, Response
+from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert
+from .models.bid import Bid, AuctionLeader, AuctionBidder, BidHourly
 from .schemas.bid import Bid as BidSchema, BidCreate
-from .workers.process_bid import process_bid
+from .auction_state import auction_states, BidRejected
 from sqlalchemy.orm import Session
-from .sqlalchemy_conn import engine, get_db
-import time
-import requests
+from .sqlalchemy_conn import get_db, get_primary_db, SessionLocal, run_db, release_db, pool_metrics, DbRoute, ReadYourWrites
+from .lifecycle import prepare_database, health
+from .settings import (
+    AUCTION_SERVICE_URL, AUCTION_VALIDATORS_MAX, GROUP_COMMIT_ENABLED, BID_BATCH_MAX_SIZE, METRICS_USE_ROLLUPS, BID_STREAM_HEARTBEAT,
+)
+from .outbox import enqueue, bid_events, outbox_dispatcher
+from .group_commit import bid_writer
+from .bid_stream import bid_broker, sse, TooManySubscribers
+from .pagination import keyset, page, stream_ndjson, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .metrics_cache import metrics_cache
+from .rollups import hour_of, catch_up_bid_hours
+from .auction_leader import record_bids, unrecord_bid, leader_as_bid, leader_summary
+from . import http_client
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import logging
 from sqlalchemy.sql import func
 
-time.sleep(5)
-Base.metadata.create_all(bind=engine)
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(prepare_database)
+    if METRICS_USE_ROLLUPS:
+        await run_in_threadpool(catch_up_rollups)
+    health.started = True
+    outbox_dispatcher.start()
+    yield
+    health.started = False
+    await outbox_dispatcher.stop()
+    await http_client.close_clients()
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = DbRoute
+app.add_middleware(ReadYourWrites)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-logger.info("Creating database tables...")
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
-logger.info("Database tables created successfully")
-# CRUD Operations
-@app.post("/bids", response_model=BidCreate, status_code=status.HTTP_201_CREATED)
-def place_bid(payload: BidCreate, db: Session = Depends(get_db)):
-    # Check if auction exists and is active
+
+def catch_up_rollups():
+    with SessionLocal() as db:
+        catch_up_bid_hours(db)
+
+@app.get("/health/live")
+def liveness():
+    return health.live()
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    ready, body = health.ready()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return body
+
+def find_leaders(db: Session, auction_ids):
+    leaders = db.query(AuctionLeader).filter(AuctionLeader.auction_id.in_(auction_ids)).all()
+    return {leader.auction_id: leader for leader in leaders}
+
+# Last representation seen per auction, so refetches can be revalidated with
+# If-None-Match and answered by a bodiless 304
+auction_validators = OrderedDict()
+
+async def fetch_auction(auction_id: int):
+    cached = auction_validators.get(auction_id)
+    headers = {"If-None-Match": cached[0]} if cached else None
+    auction_response = await http_client.request(
+        AUCTION_SERVICE_URL, "GET", f"/auctions/{auction_id}", headers=headers
+    )
+    if auction_response.status_code == 304 and cached:
+        auction_validators.move_to_end(auction_id)
+        return cached[1]
+    if auction_response.status_code != 200:
+        auction_validators.pop(auction_id, None)
+        return None
+    auction = auction_response.json()
+    etag = auction_response.headers.get("etag")
+    if etag:
+        auction_validators[auction_id] = (etag, auction)
+        auction_validators.move_to_end(auction_id)
+        while len(auction_validators) > AUCTION_VALIDATORS_MAX:
+            auction_validators.popitem(last=False)
+    return auction
+
+async def warm_auction_states(auctions, db: Session):
+    leaders = await run_db(find_leaders, db, [auction["auction_id"] for auction in auctions])
+    for auction in auctions:
+        leader = leaders.get(auction["auction_id"])
+        auction_states.warm(
+            auction,
+            highest_bid_amount=leader.highest_bid_amount if leader else None,
+            highest_bidder_id=leader.highest_bidder_id if leader else None,
+        )
+
+async def get_auction_state(auction_id: int, db: Session):
+    # Serve from the in-memory state, warming it from auction-service on a miss
+    state = auction_states.get(auction_id)
+    if state is not None:
+        return state
     try:
-        auction_response = requests.get(f"http://auction-service:8000/auctions/{payload.auction_id}")
-        if auction_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Auction not found or inaccessible")
-        
-        auction = auction_response.json()
-        if auction["status"] != "Active":
-            raise HTTPException(status_code=400, detail="Auction is not active")
-        
-        # Check if bid is higher than current price
-        if payload.bid_amount <= auction["current_price"]:
-            raise HTTPException(status_code=400, detail="Bid amount must be higher than current price")
+        auction = await fetch_auction(auction_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error validating bid: {str(e)}")
+    if auction is None:
+        raise HTTPException(status_code=400, detail="Auction not found or inaccessible")
+
+    await warm_auction_states([auction], db)
+    return auction_states.get(auction_id)
 
-    # Create new bid
+def insert_bid(db: Session, payload: BidCreate):
     new_bid = Bid(
         auction_id=payload.auction_id,
         bidder_id=payload.bidder_id,
         bid_amount=payload.bid_amount,
         bid_time=datetime.datetime.utcnow()
     )
-    db.add(new_bid)
-    db.commit()
-    db.refresh(new_bid)
-    
-    # Update auction current price
     try:
-        requests.put(
-            f"http://auction-service:8000/auctions/{payload.auction_id}/current_price",
-            json={"current_price": payload.bid_amount}
-        )
-    except:
-        # Log error but continue
-        pass
-    
-    # Notify about new bid
+        db.add(new_bid)
+        db.flush()
+        record_bids(db, [{
+            "bid_id": new_bid.bid_id,
+            "auction_id": new_bid.auction_id,
+            "bidder_id": new_bid.bidder_id,
+            "bid_amount": new_bid.bid_amount,
+            "bid_time": new_bid.bid_time,
+        }])
+        # Side-effects are committed with the bid and delivered by the outbox dispatcher
+        enqueue(db, bid_events(new_bid.auction_id, new_bid.bid_id, new_bid.bidder_id, new_bid.bid_amount))
+        db.commit()
+        db.refresh(new_bid)
+    except Exception:
+        db.rollback()
+        raise
+    return new_bid
+
+# CRUD Operations
+@app.post("/bids", response_model=BidSchema, status_code=status.HTTP_201_CREATED)
+async def place_bid(payload: BidCreate, db: Session = Depends(get_db)):
+    # Check the bid against the auction state and claim the lead atomically
+    await get_auction_state(payload.auction_id, db)
     try:
-        requests.post(
-            f"http://notifications-service:8000/notifications/auction/{payload.auction_id}/bid",
-            json={"bid_id": new_bid.bid_id, "bidder_id": new_bid.bidder_id, "amount": new_bid.bid_amount}
-        )
-    except:
-        # Log error but continue
-        pass
-    
+        auction_states.try_accept(payload.auction_id, payload.bidder_id, payload.bid_amount)
+    except BidRejected as e:
+        raise HTTPException(status_code=400, detail=e.detail)
+
+    if GROUP_COMMIT_ENABLED:
+        row = {
+            "auction_id": payload.auction_id,
+            "bidder_id": payload.bidder_id,
+            "bid_amount": payload.bid_amount,
+            "bid_time": datetime.datetime.utcnow(),
+        }
+        # A failed batch invalidates the state of every auction it had bids on
+        new_bid = await bid_writer.submit(row)
+    else:
+        try:
+            new_bid = BidSchema.model_validate(await run_db(insert_bid, db, payload)).model_dump()
+        except Exception:
+            # The claimed lead never committed; reload the state from the leader table
+            auction_states.invalidate(payload.auction_id)
+            raise
+    outbox_dispatcher.wake()
+    bid_broker.publish_bid(new_bid)
     return new_bid
 
+async def read_bid_batch(request: Request):
+    # Accept either a JSON array or an NDJSON stream of bids
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        entries, buffer = [], b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            entries.extend(json.loads(line) for line in lines if line.strip())
+        if buffer.strip():
+            entries.append(json.loads(buffer))
+        return entries
+    entries = await request.json()
+    if not isinstance(entries, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of bids")
+    return entries
+
+def insert_bid_batch(db: Session, rows):
+    try:
+        inserted = db.execute(insert(Bid).returning(Bid.bid_id, sort_by_parameter_order=True), rows).all()
+        results = [{**row, "bid_id": bid_id} for row, (bid_id,) in zip(rows, inserted)]
+        record_bids(db, results)
+        # Only the final leader of each auction needs a price update and notification
+        leaders = {}
+        for bid in results:
+            leaders[bid["auction_id"]] = bid
+        enqueue(db, [
+            event
+            for bid in leaders.values()
+            for event in bid_events(bid["auction_id"], bid["bid_id"], bid["bidder_id"], bid["bid_amount"])
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return results
+
+@app.post("/bids/batch")
+async def place_bid_batch(request: Request, db: Session = Depends(get_db)):
+    try:
+        entries = await read_bid_batch(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed bid batch: {str(e)}")
+    if len(entries) > BID_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BID_BATCH_MAX_SIZE} bids")
+
+    results = [None] * len(entries)
+    by_auction = {}
+    for index, entry in enumerate(entries):
+        try:
+            bid = BidCreate.model_validate(entry)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "rejected", "detail": e.errors(include_url=False)}
+            continue
+        by_auction.setdefault(bid.auction_id, []).append((index, bid))
+
+    # Warm every unknown auction once, concurrently
+    missing = [auction_id for auction_id in by_auction if auction_states.get(auction_id) is None]
+    fetched = await asyncio.gather(*(fetch_auction(auction_id) for auction_id in missing), return_exceptions=True)
+    await warm_auction_states([auction for auction in fetched if isinstance(auction, dict)], db)
+
+    # Validate each auction's bids in one pass against its state
+    now = datetime.datetime.utcnow()
+    rows = []
+    for auction_id, bids in by_auction.items():
+        outcomes = auction_states.try_accept_many(
+            auction_id, [(bid.bidder_id, bid.bid_amount) for _, bid in bids], now
+        )
+        for (index, bid), rejection in zip(bids, outcomes):
+            if rejection is not None:
+                results[index] = {"index": index, "status": "rejected", "detail": rejection}
+                continue
+            rows.append((index, {
+                "auction_id": bid.auction_id,
+                "bidder_id": bid.bidder_id,
+                "bid_amount": bid.bid_amount,
+                "bid_time": now,
+            }))
+
+    if rows:
+        try:
+            inserted = await run_db(insert_bid_batch, db, [row for _, row in rows])
+        except Exception:
+            for auction_id in {row["auction_id"] for _, row in rows}:
+                auction_states.invalidate(auction_id)
+            raise
+        for (index, _), bid in zip(rows, inserted):
+            results[index] = {"index": index, "status": "accepted", "bid_id": bid["bid_id"]}
+            bid_broker.publish_bid(bid)
+        outbox_dispatcher.wake()
+
+    return {
+        "accepted": len(rows),
+        "rejected": len(entries) - len(rows),
+        "results": results,
+    }
+
 @app.get("/bids/{bid_id}", response_model=BidSchema)
 def get_bid(bid_id: int, db: Session = Depends(get_db)):
     bid = db.query(Bid).filter(Bid.bid_id == bid_id).first()
@@ -80,72 +277,212 @@ def get_bid(bid_id: int, db: Session = Depends(get_db)):
     return bid
 
 @app.get("/bids", response_model=list[BidSchema])
-def list_bids(db: Session = Depends(get_db)):
-    return db.query(Bid).all()
+def list_bids(
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    def build(db: Session):
+        return keyset(db.query(Bid), Bid.bid_id, after=after)
+    if stream:
+        return stream_ndjson(build, BidSchema, db=db)
+    return page(build(db), limit, response, lambda bid: bid.bid_id)
+
+def find_bid(db: Session, bid_id: int):
+    return db.query(Bid).filter(Bid.bid_id == bid_id).first()
+
+def remove_bid(db: Session, bid: Bid):
+    db.delete(bid)
+    db.flush()
+    unrecord_bid(db, bid)
+    db.commit()
 
 @app.delete("/bids/{bid_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_bid(bid_id: int, db: Session = Depends(get_db)):
-    bid = db.query(Bid).filter(Bid.bid_id == bid_id).first()
+async def delete_bid(bid_id: int, db: Session = Depends(get_db)):
+    bid = await run_db(find_bid, db, bid_id)
     if not bid:
         raise HTTPException(status_code=404, detail="Bid not found")
     
     # Check if the bid can be deleted (e.g., auction not ended)
+    await get_auction_state(bid.auction_id, db)
     try:
-        auction_response = requests.get(f"http://auction-service:8000/auctions/{bid.auction_id}")
-        if auction_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Auction not found")
-        
-        auction = auction_response.json()
-        if auction["status"] != "Active":
-            raise HTTPException(status_code=400, detail="Cannot delete bid: auction is not active")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error validating bid deletion: {str(e)}")
+        auction_states.check_active(bid.auction_id)
+    except BidRejected:
+        raise HTTPException(status_code=400, detail="Cannot delete bid: auction is not active")
     
-    db.delete(bid)
-    db.commit()
+    auction_id = bid.auction_id
+    await run_db(remove_bid, db, bid)
+    # The deleted bid may have been the leader; rebuild the state from the leader table
+    auction_states.invalidate(auction_id)
+    bid_broker.publish(auction_id, "invalidated", {"auction_id": auction_id})
     return
 
 # Specialized Operations
 @app.get("/bids/auction/{auction_id}", response_model=list[BidSchema])
-def get_auction_bids(auction_id: int, db: Session = Depends(get_db)):
-    bids = db.query(Bid).filter(Bid.auction_id == auction_id).all()
-    return bids
+def get_auction_bids(
+    auction_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    def build(db: Session):
+        return keyset(db.query(Bid).filter(Bid.auction_id == auction_id), Bid.bid_id, after=after)
+    if stream:
+        return stream_ndjson(build, BidSchema, db=db)
+    return page(build(db), limit, response, lambda bid: bid.bid_id)
 
 @app.get("/bids/user/{user_id}", response_model=list[BidSchema])
-def get_user_bids(user_id: int, db: Session = Depends(get_db)):
-    bids = db.query(Bid).filter(Bid.bidder_id == user_id).all()
-    return bids
+def get_user_bids(
+    user_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    def build(db: Session):
+        return keyset(db.query(Bid).filter(Bid.bidder_id == user_id), Bid.bid_id, after=after)
+    if stream:
+        return stream_ndjson(build, BidSchema, db=db)
+    return page(build(db), limit, response, lambda bid: bid.bid_id)
 
 @app.get("/bids/auction/{auction_id}/highest", response_model=BidSchema)
 def get_highest_bid(auction_id: int, db: Session = Depends(get_db)):
-    highest_bid = db.query(Bid).filter(Bid.auction_id == auction_id).order_by(Bid.bid_amount.desc()).first()
-    if not highest_bid:
+    leader = db.query(AuctionLeader).filter(AuctionLeader.auction_id == auction_id).first()
+    if not leader:
         raise HTTPException(status_code=404, detail="No bids found for this auction")
-    return highest_bid
+    return leader_as_bid(leader)
 
-@app.get("/metrics")
-def get_bid_metrics(db: Session = Depends(get_db)):
-    now = datetime.datetime.utcnow()
-    one_day_ago = now - datetime.timedelta(days=1)
-    one_week_ago = now - datetime.timedelta(weeks=1)
-    one_month_ago = now - datetime.timedelta(days=30)
-    one_year_ago = now - datetime.timedelta(days=365)
-
-    total_bids = db.query(Bid).count()
-    avg_bid = db.query(func.coalesce(func.avg(Bid.bid_amount), 0)).scalar()
-    min_bid = db.query(func.coalesce(func.min(Bid.bid_amount), 0)).scalar()
-    max_bid = db.query(func.coalesce(func.max(Bid.bid_amount), 0)).scalar()
-    bids_today = db.query(Bid).filter(Bid.bid_time >= one_day_ago).count()
-    bids_week = db.query(Bid).filter(Bid.bid_time >= one_week_ago).count()
-    bids_month = db.query(Bid).filter(Bid.bid_time >= one_month_ago).count()
-    bids_year = db.query(Bid).filter(Bid.bid_time >= one_year_ago).count()
+@app.get("/bids/auction/{auction_id}/summary")
+def get_auction_bid_summary(auction_id: int, db: Session = Depends(get_db)):
+    leader = db.query(AuctionLeader).filter(AuctionLeader.auction_id == auction_id).first()
+    if not leader:
+        return {"auction_id": auction_id, "highest_bid": None, "bid_count": 0, "unique_bidder_count": 0}
+    return leader_summary(leader)
+
+@app.get("/bids/auctions/summary")
+def get_auction_bid_summaries(auction_ids: List[int] = Query(...), db: Session = Depends(get_db)):
+    # Batch form for auction listings: one indexed lookup for many auctions
+    return [leader_summary(leader) for leader in find_leaders(db, auction_ids).values()]
+
+@app.get("/bids/auctions/bidders")
+def get_auction_bidders(auction_ids: List[int] = Query(...), db: Session = Depends(get_db)):
+    # Everyone who bid on each auction, from the auction_bidder index rather than the bid table
+    bidders = {auction_id: [] for auction_id in auction_ids}
+    rows = db.query(AuctionBidder.auction_id, AuctionBidder.bidder_id).filter(
+        AuctionBidder.auction_id.in_(auction_ids)
+    ).order_by(AuctionBidder.auction_id, AuctionBidder.bidder_id)
+    for auction_id, bidder_id in rows:
+        bidders[auction_id].append(bidder_id)
+    return [{"auction_id": auction_id, "bidder_ids": ids} for auction_id, ids in bidders.items()]
+
+@app.get("/bids/auction/{auction_id}/state")
+async def get_auction_state_view(auction_id: int, db: Session = Depends(get_primary_db)):
+    return (await get_auction_state(auction_id, db)).as_dict()
+
+@app.post("/bids/auction/{auction_id}/invalidate", status_code=status.HTTP_204_NO_CONTENT)
+async def invalidate_auction_state(auction_id: int):
+    # Called by auction-service whenever an auction changes outside the bid path
+    auction_states.invalidate(auction_id)
+    bid_broker.publish(auction_id, "invalidated", {"auction_id": auction_id})
+    return
+
+@app.get("/bids/auction/{auction_id}/stream")
+async def stream_auction_bids(auction_id: int, db: Session = Depends(get_primary_db)):
+    # Server-sent events: the current state first, then every accepted bid
+    state = await get_auction_state(auction_id, db)
+    # Warming may have used the session; the stream must not keep its connection
+    await release_db(db)
+    try:
+        subscription = bid_broker.subscribe(auction_id)
+    except TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many bid stream subscribers")
+    snapshot = state.as_dict()
+
+    async def events():
+        try:
+            yield sse("state", snapshot)
+            while True:
+                if subscription.dropped and subscription.queue.empty():
+                    yield sse("dropped", {"auction_id": auction_id})
+                    break
+                try:
+                    event, data = await asyncio.wait_for(subscription.queue.get(), BID_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse(event, data)
+        finally:
+            bid_broker.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def metric_windows(now: datetime.datetime):
+    return {
+        "today": now - datetime.timedelta(days=1),
+        "last_week": now - datetime.timedelta(weeks=1),
+        "last_month": now - datetime.timedelta(days=30),
+        "last_year": now - datetime.timedelta(days=365),
+    }
+
+def compute_bid_metrics(db: Session):
+    # One scan with conditional aggregates instead of a query per figure
+    windows = metric_windows(datetime.datetime.utcnow())
+    row = db.query(
+        func.count(Bid.bid_id),
+        func.coalesce(func.avg(Bid.bid_amount), 0),
+        func.coalesce(func.min(Bid.bid_amount), 0),
+        func.coalesce(func.max(Bid.bid_amount), 0),
+        *(func.count(Bid.bid_id).filter(Bid.bid_time >= since) for since in windows.values()),
+    ).one()
+    total_bids, avg_bid, min_bid, max_bid, *counts = row
     return {
         "total_bids": total_bids,
         "avg_bid_amount": avg_bid,
         "min_bid_amount": min_bid,
         "max_bid_amount": max_bid,
-        "bids_today": bids_today,
-        "bids_last_week": bids_week,
-        "bids_last_month": bids_month,
-        "bids_last_year": bids_year,
-    }
\ No newline at end of file
+        **{f"bids_{window}": count for window, count in zip(windows, counts)},
+    }
+
+def compute_bid_metrics_from_rollups(db: Session):
+    # Reads bid_hourly; windows are aligned to whole hours
+    windows = metric_windows(datetime.datetime.utcnow())
+    row = db.query(
+        func.coalesce(func.sum(BidHourly.bid_count), 0),
+        func.coalesce(func.sum(BidHourly.amount_sum), 0),
+        func.coalesce(func.min(BidHourly.amount_min), 0),
+        func.coalesce(func.max(BidHourly.amount_max), 0),
+        *(
+            func.coalesce(func.sum(BidHourly.bid_count).filter(BidHourly.hour >= hour_of(since)), 0)
+            for since in windows.values()
+        ),
+    ).one()
+    total_bids, amount_sum, min_bid, max_bid, *counts = row
+    return {
+        "total_bids": total_bids,
+        "avg_bid_amount": amount_sum / total_bids if total_bids else 0,
+        "min_bid_amount": min_bid,
+        "max_bid_amount": max_bid,
+        **{f"bids_{window}": count for window, count in zip(windows, counts)},
+    }
+
+@app.get("/metrics")
+async def get_bid_metrics(db: Session = Depends(get_db)):
+    compute = compute_bid_metrics_from_rollups if METRICS_USE_ROLLUPS else compute_bid_metrics
+    return await metrics_cache.get("bids", lambda: run_db(compute, db))
+
+@app.get("/metrics/bid-stream")
+def get_bid_stream_metrics():
+    return bid_broker.stats()
+
+@app.get("/metrics/group-commit")
+def get_group_commit_metrics():
+    return {"enabled": GROUP_COMMIT_ENABLED, **bid_writer.stats.as_dict()}
+
+@app.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
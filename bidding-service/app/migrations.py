@@ -0,0 +1,27 @@
+# Versioned schema migrations for bidding-service
+from .models.bid import Base
+from .models.outbox import OutboxEvent  # noqa: F401 (registers the table)
+from .sqlalchemy_conn import replica_heartbeat
+
+metadata = Base.metadata
+
+
+def initial_schema(conn):
+    # Databases from before versioned migrations have the old tables but no
+    # schema_migrations. Those builds dropped and recreated every table on
+    # each boot, so doing it once more loses nothing and brings in new columns.
+    metadata.drop_all(conn)
+    metadata.create_all(conn)
+
+
+def replica_heartbeat_table(conn):
+    replica_heartbeat.create(conn, checkfirst=True)
+
+
+# (version, description, step) in order. Append new steps; never edit one that
+# has shipped. A fresh database runs every step after `initial schema`, which
+# already builds the current models, so later steps must check before altering.
+MIGRATIONS = [
+    (1, "initial schema", initial_schema),
+    (2, "replica heartbeat", replica_heartbeat_table),
+]
@@ -1,5 +1,5 @@
 # Bid model for bidding-service 
-from sqlalchemy import Column, Integer, Float, DateTime
+from sqlalchemy import Column, Integer, Float, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 
@@ -11,4 +11,36 @@ class Bid(Base):
     auction_id = Column(Integer, nullable=False)
     bidder_id = Column(Integer, nullable=False)
     bid_amount = Column(Float, nullable=False)
-    bid_time = Column(DateTime, default=datetime.datetime.utcnow)
\ No newline at end of file
+    bid_time = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_bid_auction_amount_time', auction_id, bid_amount.desc(), bid_time),
+        Index('ix_bid_auction_id_bid_id', auction_id, bid_id),
+        Index('ix_bid_bidder_id_bid_id', bidder_id, bid_id),
+    )
+
+class AuctionLeader(Base):
+    """Highest bid and bid counters per auction, maintained with every accepted bid."""
+    __tablename__ = 'auction_leader'
+    auction_id = Column(Integer, primary_key=True, autoincrement=False)
+    highest_bid_id = Column(Integer, nullable=False)
+    highest_bidder_id = Column(Integer, nullable=False)
+    highest_bid_amount = Column(Float, nullable=False)
+    highest_bid_time = Column(DateTime)
+    bid_count = Column(Integer, nullable=False, default=0)
+    unique_bidder_count = Column(Integer, nullable=False, default=0)
+
+class AuctionBidder(Base):
+    """One row per distinct bidder on an auction."""
+    __tablename__ = 'auction_bidder'
+    auction_id = Column(Integer, primary_key=True, autoincrement=False)
+    bidder_id = Column(Integer, primary_key=True, autoincrement=False)
+
+class BidHourly(Base):
+    """Hourly bid rollup backing /metrics when METRICS_USE_ROLLUPS is on."""
+    __tablename__ = 'bid_hourly'
+    hour = Column(DateTime, primary_key=True)
+    bid_count = Column(Integer, nullable=False, default=0)
+    amount_sum = Column(Float, nullable=False, default=0)
+    amount_min = Column(Float)
+    amount_max = Column(Float)
@@ -0,0 +1,18 @@
+# Outbox model for bidding-service
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from .bid import Base
+import datetime
+
+class OutboxEvent(Base):
+    """A side-effect call to a peer service, committed with the bid that caused it."""
+    __tablename__ = 'outbox'
+    event_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    destination = Column(String, nullable=False)
+    method = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    payload = Column(JSON)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    delivered_at = Column(DateTime, nullable=True, index=True)
+    last_error = Column(String, nullable=True)
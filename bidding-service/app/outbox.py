@@ -0,0 +1,226 @@
+# Transactional outbox for bidding-service side-effects
+import asyncio
+import datetime
+import logging
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from .models.outbox import OutboxEvent
+from .sqlalchemy_conn import SessionLocal
+from .settings import (
+    AUCTION_SERVICE_URL, NOTIFICATIONS_SERVICE_URL,
+    OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_ATTEMPTS, OUTBOX_LEASE_SECONDS,
+)
+from . import http_client
+
+logger = logging.getLogger(__name__)
+
+DESTINATIONS = {
+    "auction": AUCTION_SERVICE_URL,
+    "notifications": NOTIFICATIONS_SERVICE_URL,
+}
+
+
+def outbox_event(destination: str, method: str, path: str, payload: dict = None) -> dict:
+    if destination not in DESTINATIONS:
+        raise ValueError(f"Unknown outbox destination: {destination}")
+    return {"destination": destination, "method": method, "path": path, "payload": payload}
+
+
+def bid_events(auction_id: int, bid_id: int, bidder_id: int, bid_amount: float):
+    """Side-effects of an accepted bid: raise the auction price and notify."""
+    return [
+        outbox_event("auction", "PUT", f"/auctions/{auction_id}/current_price",
+                     {"current_price": bid_amount}),
+        outbox_event("notifications", "POST", f"/notifications/auction/{auction_id}/bid",
+                     {"bid_id": bid_id, "bidder_id": bidder_id, "amount": bid_amount}),
+    ]
+
+
+def enqueue(db: Session, events):
+    """Stage calls to peer services; they are only sent once `db` commits."""
+    if events:
+        db.execute(insert(OutboxEvent), events)
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    return datetime.timedelta(seconds=min(0.5 * 2 ** attempts, 60))
+
+
+def supersedes(event: dict, other: dict) -> bool:
+    # Bids commit concurrently, so event_id order is not acceptance order: a
+    # price update only gives way to a higher price, other PUTs to later ones
+    def rank(e):
+        return ((e.get("payload") or {}).get("current_price", float("-inf")), e["event_id"])
+    return rank(event) > rank(other)
+
+
+def coalesce(events):
+    """
+    Collapse PUTs to the same path into the one that supersedes the others
+    (e.g. a burst of current_price updates for one auction collapses into
+    the highest price). Returns (event, covered_event_ids) pairs in
+    delivery order.
+    """
+    winners = {}
+    for event in events:
+        if event["method"] == "PUT":
+            winner = winners.get(event["path"])
+            if winner is None or supersedes(event, winner):
+                winners[event["path"]] = event
+    last_put = {path: event["event_id"] for path, event in winners.items()}
+    covered = {}
+    ordered = []
+    for event in events:
+        if event["method"] == "PUT" and last_put[event["path"]] != event["event_id"]:
+            covered.setdefault(last_put[event["path"]], []).append(event["event_id"])
+            continue
+        ordered.append(event)
+    return [(event, covered.get(event["event_id"], []) + [event["event_id"]]) for event in ordered]
+
+
+class OutboxDispatcher:
+    """
+    Background task that delivers outbox events in batches. Events for one
+    destination are sent in order; a failure holds back the rest of that
+    destination's batch until the retry.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        # Called after a commit that staged events, to skip the poll interval
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.dispatch_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                claimed = 0
+            if claimed < OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def _claim(self):
+        now = datetime.datetime.utcnow()
+        with self._session_factory() as db:
+            events = (
+                db.query(OutboxEvent)
+                .filter(
+                    OutboxEvent.delivered_at.is_(None),
+                    OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS,
+                    OutboxEvent.next_attempt_at <= now,
+                )
+                .order_by(OutboxEvent.event_id)
+                .limit(OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            # Lease the batch so another replica does not pick it up meanwhile
+            lease_until = now + datetime.timedelta(seconds=OUTBOX_LEASE_SECONDS)
+            claimed = []
+            for event in events:
+                event.next_attempt_at = lease_until
+                claimed.append({
+                    "event_id": event.event_id,
+                    "destination": event.destination,
+                    "method": event.method,
+                    "path": event.path,
+                    "payload": event.payload,
+                    "attempts": event.attempts,
+                })
+            db.commit()
+        return claimed
+
+    def _complete(self, delivered, failed, deferred):
+        now = datetime.datetime.utcnow()
+        with self._session_factory() as db:
+            if delivered:
+                db.query(OutboxEvent).filter(OutboxEvent.event_id.in_(delivered)).update(
+                    {OutboxEvent.delivered_at: now}, synchronize_session=False
+                )
+            for event, error in failed:
+                attempts = event["attempts"] + 1
+                if attempts >= OUTBOX_MAX_ATTEMPTS:
+                    logger.error("Giving up on outbox event %s after %s attempts: %s", event["event_id"], attempts, error)
+                db.query(OutboxEvent).filter(OutboxEvent.event_id == event["event_id"]).update(
+                    {
+                        OutboxEvent.attempts: attempts,
+                        OutboxEvent.next_attempt_at: now + retry_delay(attempts),
+                        OutboxEvent.last_error: error,
+                    },
+                    synchronize_session=False,
+                )
+            for event_ids, retry_at in deferred:
+                db.query(OutboxEvent).filter(OutboxEvent.event_id.in_(event_ids)).update(
+                    {OutboxEvent.next_attempt_at: retry_at}, synchronize_session=False
+                )
+            db.commit()
+
+    async def _deliver(self, destination: str, events):
+        base_url = DESTINATIONS[destination]
+        delivered, failed, deferred = [], [], []
+        pending = coalesce(events)
+        for index, (event, event_ids) in enumerate(pending):
+            try:
+                response = await http_client.request(base_url, event["method"], event["path"], json=event["payload"])
+                if response.status_code >= 500:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+            except Exception as e:
+                failed.append((event, str(e) or type(e).__name__))
+                retry_at = datetime.datetime.utcnow() + retry_delay(event["attempts"] + 1)
+                held_back = [event_id for _, ids in pending[index + 1:] for event_id in ids]
+                held_back += [event_id for event_id in event_ids if event_id != event["event_id"]]
+                if held_back:
+                    deferred.append((held_back, retry_at))
+                break
+            if response.status_code >= 400:
+                # Not retryable; the peer rejected the call outright
+                logger.warning("Outbox event %s rejected by %s: HTTP %s", event["event_id"], destination, response.status_code)
+            delivered.extend(event_ids)
+        return delivered, failed, deferred
+
+    async def dispatch_once(self) -> int:
+        claimed = await run_in_threadpool(self._claim)
+        if not claimed:
+            return 0
+        by_destination = {}
+        for event in claimed:
+            by_destination.setdefault(event["destination"], []).append(event)
+
+        results = await asyncio.gather(*(
+            self._deliver(destination, events) for destination, events in by_destination.items()
+        ))
+        delivered, failed, deferred = [], [], []
+        for d, f, h in results:
+            delivered.extend(d)
+            failed.extend(f)
+            deferred.extend(h)
+        await run_in_threadpool(self._complete, delivered, failed, deferred)
+        return len(claimed)
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,102 @@
+# Hourly bid rollups for bidding-service metrics
+import datetime
+import logging
+from sqlalchemy import func, select, delete, insert, text
+from sqlalchemy.orm import Session
+from .models.bid import Bid, BidHourly
+from .sqlalchemy_conn import upsert
+from .lifecycle import MIGRATION_LOCK_KEY
+
+logger = logging.getLogger(__name__)
+
+
+def hour_of(moment: datetime.datetime) -> datetime.datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_bid_hours(db: Session, bids):
+    """Fold newly inserted bids into bid_hourly, in the inserting transaction."""
+    buckets = {}
+    for bid in bids:
+        hour = hour_of(bid["bid_time"])
+        bucket = buckets.setdefault(hour, {
+            "hour": hour, "bid_count": 0, "amount_sum": 0.0,
+            "amount_min": bid["bid_amount"], "amount_max": bid["bid_amount"],
+        })
+        bucket["bid_count"] += 1
+        bucket["amount_sum"] += bid["bid_amount"]
+        bucket["amount_min"] = min(bucket["amount_min"], bid["bid_amount"])
+        bucket["amount_max"] = max(bucket["amount_max"], bid["bid_amount"])
+    if not buckets:
+        return
+
+    # Two-argument min/max is least/greatest on PostgreSQL
+    if db.get_bind().dialect.name == "postgresql":
+        lower, upper = func.least, func.greatest
+    else:
+        lower, upper = func.min, func.max
+    stmt = upsert(db, BidHourly)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[BidHourly.hour],
+        set_={
+            "bid_count": BidHourly.bid_count + excluded.bid_count,
+            "amount_sum": BidHourly.amount_sum + excluded.amount_sum,
+            "amount_min": lower(BidHourly.amount_min, excluded.amount_min),
+            "amount_max": upper(BidHourly.amount_max, excluded.amount_max),
+        },
+    )
+    db.execute(stmt, list(buckets.values()))
+
+
+def unrecord_bid_hour(db: Session, bid: Bid):
+    # Counts and sums stay exact; min/max keep the deleted value until a rebuild
+    db.query(BidHourly).filter(BidHourly.hour == hour_of(bid.bid_time)).update(
+        {
+            BidHourly.bid_count: BidHourly.bid_count - 1,
+            BidHourly.amount_sum: BidHourly.amount_sum - bid.bid_amount,
+        },
+        synchronize_session=False,
+    )
+
+
+def rebuild_bid_hours(db: Session):
+    """Recompute bid_hourly from the bid table (first enable, or after drift)."""
+    if db.get_bind().dialect.name == "postgresql":
+        hour = func.date_trunc("hour", Bid.bid_time)
+    else:
+        hour = func.strftime("%Y-%m-%d %H:00:00.000000", Bid.bid_time)
+    db.execute(delete(BidHourly))
+    db.execute(insert(BidHourly).from_select(
+        ["hour", "bid_count", "amount_sum", "amount_min", "amount_max"],
+        select(hour, func.count(), func.sum(Bid.bid_amount), func.min(Bid.bid_amount), func.max(Bid.bid_amount))
+        .where(Bid.bid_time.is_not(None))
+        .group_by(hour),
+    ))
+    db.commit()
+
+
+def bid_hours_behind(db: Session) -> bool:
+    """Whether bid_hourly is missing the hour of the newest bid (both lookups use a key)."""
+    newest = db.query(Bid.bid_time).filter(Bid.bid_time.is_not(None)).order_by(Bid.bid_id.desc()).limit(1).scalar()
+    if newest is None:
+        return False
+    latest = db.query(func.max(BidHourly.hour)).scalar()
+    return latest is None or latest < hour_of(newest)
+
+
+def catch_up_bid_hours(db: Session) -> bool:
+    """
+    Rebuild bid_hourly at startup only when it is empty or behind the newest
+    bid, e.g. when rollups were just switched on. On PostgreSQL this holds the
+    migration lock, so of replicas starting together one rebuilds and the rest
+    find the table current.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    if not bid_hours_behind(db):
+        db.commit()
+        return False
+    logger.info("bid_hourly is behind the bid table; rebuilding it")
+    rebuild_bid_hours(db)
+    return True
@@ -3,4 +3,59 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
\ No newline at end of file
+DATABASE_URL = os.getenv("DATABASE_URL")
+AUCTION_SERVICE_URL = os.getenv("AUCTION_SERVICE_URL", "http://auction-service:8000")
+NOTIFICATIONS_SERVICE_URL = os.getenv("NOTIFICATIONS_SERVICE_URL", "http://notifications-service:8000")
+# Auctions whose last ETag is kept for conditional refetches
+AUCTION_VALIDATORS_MAX = int(os.getenv("AUCTION_VALIDATORS_MAX", "10000"))
+
+# Outbound HTTP to peer services
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "2.0"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "1.0"))
+
+# Outbox dispatcher
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+
+# Group commit: coalesce concurrent bid inserts into one transaction
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT_ENABLED", "false").lower() == "true"
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "500"))
+
+# Bulk ingestion
+BID_BATCH_MAX_SIZE = int(os.getenv("BID_BATCH_MAX_SIZE", "10000"))
+
+# /metrics
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "10"))
+METRICS_USE_ROLLUPS = os.getenv("METRICS_USE_ROLLUPS", "false").lower() == "true"
+
+# Live bid stream
+BID_STREAM_QUEUE_SIZE = int(os.getenv("BID_STREAM_QUEUE_SIZE", "100"))
+BID_STREAM_MAX_SUBSCRIBERS = int(os.getenv("BID_STREAM_MAX_SUBSCRIBERS", "10000"))
+BID_STREAM_HEARTBEAT = float(os.getenv("BID_STREAM_HEARTBEAT", "15"))
+
+# Startup: wait for the database with exponential backoff
+DB_WAIT_TIMEOUT = float(os.getenv("DB_WAIT_TIMEOUT", "60"))
+DB_WAIT_INITIAL_DELAY = float(os.getenv("DB_WAIT_INITIAL_DELAY", "0.1"))
+DB_WAIT_MAX_DELAY = float(os.getenv("DB_WAIT_MAX_DELAY", "5"))
+
+# Database connection pool; the defaults cover FastAPI's 40 sync worker threads
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+# Behind PgBouncer (transaction pooling): no local pool and no prepared statements
+DB_EXTERNAL_POOLER = os.getenv("DB_EXTERNAL_POOLER", "false").lower() == "true"
+# Serve requests from an asyncpg (aiosqlite for SQLite) engine instead of the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+# Read replicas for GET handlers, comma-separated; empty means the primary serves everything
+DATABASE_REPLICA_URLS = [url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "1"))
+# How long a client's own write keeps its reads off replicas that have not replayed it
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "30"))
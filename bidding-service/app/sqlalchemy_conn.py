@@ -1,15 +1,442 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import datetime
+import functools
+import inspect
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from fastapi import Depends, Request
+from fastapi.params import Depends as DependsParam
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, event, select, update, insert, Table, Column, Integer, DateTime, MetaData
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import QueuePool, NullPool, AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
-from .settings import DATABASE_URL
+from .settings import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_EXTERNAL_POOLER,
+    DB_ASYNC, DATABASE_REPLICA_URLS, REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_SECONDS, REPLICA_STICKY_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """Checkout wait and in-use counts for the engine's pool (GET /metrics/db-pool)."""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.in_use = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            self._waits.append(seconds)
+
+    def track(self, delta: int):
+        with self._lock:
+            self.in_use += delta
+
+    def snapshot(self, pool):
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {
+                "pool": type(pool).__name__,
+                "in_use": self.in_use,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            stats[f"wait_seconds_{name}"] = waits[min(int(q * len(waits)), len(waits) - 1)] if waits else 0.0
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), idle=pool.checkedin(), overflow=max(pool.overflow(), 0))
+        return stats
+
+
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+
+class _TimedCheckout:
+    # Times how long a request waits for a connection, including a new connect
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - started)
+        return entry
+
+
+def timed(pool_class, stats: PoolStats):
+    return type(f"Timed{pool_class.__name__}", (_TimedCheckout, pool_class), {"stats": stats})
+
+
+def without_prepared_statements(url):
+    # Server-side prepared statements don't survive transaction pooling
+    driver = url.get_driver_name()
+    if driver == "psycopg":
+        return {"prepare_threshold": None}
+    if driver == "asyncpg":
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return {}
+
+
+def engine_options(url: str, stats: PoolStats, is_async: bool = False):
+    url = make_url(url)
+    if DB_EXTERNAL_POOLER:
+        return {"poolclass": timed(NullPool, stats), "connect_args": without_prepared_statements(url)}
+    if url.database in (None, "", ":memory:"):
+        # In-memory SQLite keeps one connection per thread; nothing to tune
+        return {}
+    return {
+        "poolclass": timed(AsyncAdaptedQueuePool if is_async else QueuePool, stats),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def instrument(engine, stats: PoolStats):
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.track(1)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.track(-1)
+
+
+def async_url(url: str):
+    url = make_url(url)
+    drivers = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+    return url.set(drivername=drivers[url.get_backend_name()])
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, pool_stats))
+instrument(engine, pool_stats)
+
+# Optional second engine on asyncpg/aiosqlite; request handlers use it when
+# DB_ASYNC is set, background workers and startup keep the sync engine
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = create_async_engine(
+        async_url(DATABASE_URL), **engine_options(DATABASE_URL, async_pool_stats, is_async=True)
+    )
+    instrument(async_engine.sync_engine, async_pool_stats)
+    # Responses are serialized after the handler returns, outside the session's greenlet
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+# Updated on the primary and replayed by replicas; how far a replica's copy
+# trails the primary's is its replication lag
+replica_heartbeat = Table(
+    "replica_heartbeat", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("beat_at", DateTime, nullable=False),
+)
+
+READ_METHODS = ("GET", "HEAD")
+# Set on every successful write response: when the client last wrote
+WRITTEN_AT_COOKIE = "db_written_at"
+
+
+def read_heartbeat(conn):
+    return conn.execute(select(replica_heartbeat.c.beat_at).where(replica_heartbeat.c.id == 1)).scalar()
+
+
+def write_heartbeat(conn, beat_at: datetime.datetime):
+    updated = conn.execute(update(replica_heartbeat).where(replica_heartbeat.c.id == 1).values(beat_at=beat_at))
+    if updated.rowcount == 0:
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(replica_heartbeat).values(id=1, beat_at=beat_at))
+        except IntegrityError:
+            # Another process inserted it first; its beat is as good as ours
+            pass
+
+
+class ReplicaRouter:
+    """
+    Routes reads to replicas. A replica serves a read while its lag is
+    within `max_lag` seconds and, for a client that wrote recently, once it
+    has replayed past that write; otherwise the read goes to the primary.
+
+    Lag is re-measured at most every `check_interval` seconds by whichever
+    request finds the measurement stale: the primary's heartbeat is compared
+    with each replica's copy, then the primary's is advanced.
+    """
+
+    def __init__(self, primary, replicas, async_replicas=None, replica_stats=None,
+                 max_lag: float = REPLICA_MAX_LAG_SECONDS, check_interval: float = REPLICA_CHECK_SECONDS):
+        self.primary = primary
+        self.replicas = replicas
+        self.async_replicas = async_replicas or []
+        self.replica_stats = replica_stats or []
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._check_lock = threading.Lock()
+        self._checked_at = None
+        self._replayed = [None] * len(replicas)
+        self._lag = [None] * len(replicas)
+        self._turn = itertools.count()
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def due(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    def check(self):
+        # Single-flight: while one request measures, others route on the last result
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            with self.primary.connect() as conn:
+                beat = read_heartbeat(conn)
+            replayed = []
+            for replica in self.replicas:
+                try:
+                    with replica.connect() as conn:
+                        replayed.append(read_heartbeat(conn))
+                except Exception:
+                    logger.warning("Replica %s unreachable", replica.url.render_as_string(), exc_info=True)
+                    replayed.append(None)
+            with self.primary.begin() as conn:
+                write_heartbeat(conn, datetime.datetime.utcnow())
+            self._replayed = replayed
+            self._lag = [
+                None if beat is None or seen is None else max((beat - seen).total_seconds(), 0.0)
+                for seen in replayed
+            ]
+        except Exception:
+            logger.exception("Replica lag check failed")
+        finally:
+            self._checked_at = time.monotonic()
+            self._check_lock.release()
+
+    def pick(self, written_at: datetime.datetime = None):
+        """Index of the replica to read from, or None to read from the primary."""
+        candidates = [
+            index for index, lag in enumerate(self._lag)
+            if lag is not None and lag <= self.max_lag
+            and (written_at is None or self._replayed[index] >= written_at)
+        ]
+        if not candidates:
+            self.primary_reads += 1
+            return None
+        self.replica_reads += 1
+        return candidates[next(self._turn) % len(candidates)]
+
+    def stats(self):
+        replicas = []
+        for index, replica in enumerate(self.replicas):
+            entry = {
+                "url": replica.url.render_as_string(),
+                "lag_seconds": self._lag[index],
+                "replayed_until": self._replayed[index],
+            }
+            if index < len(self.replica_stats):
+                entry["pool"] = self.replica_stats[index].snapshot(replica.pool)
+            replicas.append(entry)
+        return {
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "max_lag_seconds": self.max_lag,
+            "replicas": replicas,
+        }
+
+
+replica_router = None
+if DATABASE_REPLICA_URLS:
+    replica_stats = [PoolStats() for _ in DATABASE_REPLICA_URLS]
+    replicas = []
+    async_replicas = []
+    for url, stats in zip(DATABASE_REPLICA_URLS, replica_stats):
+        replica = create_engine(url, **engine_options(url, stats))
+        instrument(replica, stats)
+        replicas.append(replica)
+        if DB_ASYNC:
+            async_replica = create_async_engine(async_url(url), **engine_options(url, stats, is_async=True))
+            instrument(async_replica.sync_engine, stats)
+            async_replicas.append(async_replica)
+    replica_router = ReplicaRouter(engine, replicas, async_replicas, replica_stats)
+
+
+def written_at(request: Request):
+    # The client's last write, while it is recent enough to matter
+    try:
+        stamp = float(request.cookies.get(WRITTEN_AT_COOKIE, ""))
+    except ValueError:
+        return None
+    if time.time() - stamp > REPLICA_STICKY_SECONDS:
+        return None
+    return datetime.datetime.utcfromtimestamp(stamp)
+
+
+def replica_for(request: Request):
+    if replica_router is None or request.method not in READ_METHODS:
+        return None
+    return replica_router.pick(written_at(request))
+
+
+def read_bind(replica, is_async: bool = False):
+    """Engine for a replica index from replica_for (None is the primary)."""
+    if replica is None:
+        return async_engine if is_async else engine
+    return (replica_router.async_replicas if is_async else replica_router.replicas)[replica]
+
+
+class ReadYourWrites:
+    """ASGI middleware: stamps successful writes with WRITTEN_AT_COOKIE when replicas are in use."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if replica_router is None or scope["type"] != "http" or scope["method"] in READ_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def stamped_send(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = f"{WRITTEN_AT_COOKIE}={time.time():.6f}; Max-Age={int(REPLICA_STICKY_SECONDS)}; Path=/; HttpOnly"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, stamped_send)
+
+
+def pool_metrics():
+    stats = pool_stats.snapshot(engine.pool)
+    if async_engine is not None:
+        stats["async"] = async_pool_stats.snapshot(async_engine.pool)
+    if replica_router is not None:
+        stats["replication"] = replica_router.stats()
+    return stats
 
-engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
+def get_db(request: Request):
+    # GETs may be served by a replica; see ReplicaRouter
+    if replica_router is not None and replica_router.due():
+        replica_router.check()
+    replica = replica_for(request)
+    db = SessionLocal(bind=read_bind(replica))
+    db.info["replica"] = replica
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_primary_db():
+    # For reads that feed an in-process cache, which must not be filled from a lagging replica
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db(request: Request):
+    if replica_router is not None and replica_router.due():
+        await run_in_threadpool(replica_router.check)
+    replica = replica_for(request)
+    async with AsyncSessionLocal(bind=read_bind(replica, is_async=True)) as db:
+        db.info["replica"] = replica
+        yield db
+
+async def get_async_primary_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def run_db(fn, db, *args):
+    """
+    Run `fn(session, *args)` for an async handler: on the AsyncSession's
+    greenlet in async mode, otherwise in the threadpool like before.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+async def release_db(db):
+    # Hand the session's connection back now, e.g. before a long-lived stream
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+def on_async_session(endpoint):
+    """
+    Swap an endpoint's get_db (get_primary_db) dependency for get_async_db
+    (get_async_primary_db). A sync endpoint becomes a coroutine that runs its
+    body through AsyncSession.run_sync, so its queries await the database
+    instead of holding a threadpool thread.
+    """
+    async_dependencies = {get_db: get_async_db, get_primary_db: get_async_primary_db}
+    signature = inspect.signature(endpoint)
+    names = [
+        name for name, param in signature.parameters.items()
+        if isinstance(param.default, DependsParam) and param.default.dependency in async_dependencies
+    ]
+    if not names:
+        return endpoint
+    signature = signature.replace(parameters=[
+        param.replace(default=Depends(async_dependencies[param.default.dependency])) if name in names else param
+        for name, param in signature.parameters.items()
+    ])
+    if inspect.iscoroutinefunction(endpoint):
+        async def wrapper(**kwargs):
+            return await endpoint(**kwargs)
+    else:
+        async def wrapper(**kwargs):
+            # Each dependency keeps its own session (e.g. get_db on a replica
+            # next to get_primary_db); run_sync's greenlet serves them all
+            sessions = {name: kwargs[name].sync_session for name in names}
+            return await kwargs[names[0]].run_sync(lambda _: endpoint(**{**kwargs, **sessions}))
+    functools.update_wrapper(wrapper, endpoint)
+    # FastAPI must see the wrapper's own signature and coroutine-ness
+    del wrapper.__wrapped__
+    wrapper.__signature__ = signature
+    return wrapper
+
+class DbRoute(APIRoute):
+    """Route class for the app: with DB_ASYNC, endpoints get an AsyncSession (see on_async_session)."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        if async_engine is not None:
+            endpoint = on_async_session(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+def upsert(db: Session, model):
+    # INSERT ... ON CONFLICT is dialect specific; both supported backends have it
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
@@ -1,7 +1,9 @@
 # Tests for bid model in bidding-service 
 from fastapi.testclient import TestClient
 from app.main import app
+from app.lifecycle import prepare_database
 
+prepare_database(reset=True)
 client = TestClient(app)
 
 def test_place_and_list_bid():
@@ -13,4 +15,294 @@ def test_place_and_list_bid():
 
     #response = client.get("/bids/")
     #assert response.status_code == 200
-    #assert bid in response.json() 
\ No newline at end of file
+    #assert bid in response.json() 
+
+def test_place_bid_against_auction_state():
+    from app.auction_state import auction_states
+    auction_states.warm({
+        "auction_id": 1,
+        "status": "Active",
+        "end_date": "2999-01-01T00:00:00",
+        "current_price": 100.0,
+    })
+    bid = {"auction_id": 1, "bidder_id": 501, "bid_amount": 150.0, "bid_time": "2024-01-01T00:00:00"}
+    response = client.post("/bids", json=bid)
+    assert response.status_code == 201
+
+    response = client.post("/bids", json={**bid, "bidder_id": 502})
+    assert response.status_code == 400
+
+    state = client.get("/bids/auction/1/state").json()
+    assert state["current_price"] == 150.0
+    assert state["highest_bidder_id"] == 501
+
+
+def test_deleting_a_bid_drops_the_auction_state():
+    from app.auction_state import auction_states
+    auction_states.warm({
+        "auction_id": 10,
+        "status": "Active",
+        "end_date": "2999-01-01T00:00:00",
+        "current_price": 100.0,
+    })
+    bid = {"auction_id": 10, "bidder_id": 501, "bid_amount": 150.0, "bid_time": "2024-01-01T00:00:00"}
+    bid_id = client.post("/bids", json=bid).json()["bid_id"]
+    assert auction_states.get(10).highest_bidder_id == 501
+    assert client.delete(f"/bids/{bid_id}").status_code == 204
+    # The next read warms again instead of keeping the deleted leader
+    assert auction_states.get(10) is None
+
+
+def test_failed_inserts_leave_the_auction_state_as_committed(monkeypatch):
+    import asyncio
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    import app.main as main
+    from app.auction_state import auction_states
+    from app.sqlalchemy_conn import SessionLocal
+    auction = {"auction_id": 11, "status": "Active", "end_date": "2999-01-01T00:00:00", "current_price": 100.0}
+    auction_states.warm(auction)
+    # Both bids claim the lead before either insert fails
+    both_accepted = threading.Barrier(2, timeout=5)
+
+    def failing_insert(db, payload):
+        both_accepted.wait()
+        raise RuntimeError("insert failed")
+    monkeypatch.setattr(main, "insert_bid", failing_insert)
+    failing_client = TestClient(app, raise_server_exceptions=False)
+    bids = [
+        {"auction_id": 11, "bidder_id": bidder_id, "bid_amount": amount, "bid_time": "2024-01-01T00:00:00"}
+        for bidder_id, amount in ((601, 150.0), (602, 160.0))
+    ]
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(failing_client.post, "/bids", json=bids[0])
+        while auction_states.get(11).current_price != 150.0:
+            time.sleep(0.01)
+        second = pool.submit(failing_client.post, "/bids", json=bids[1])
+        assert [first.result().status_code, second.result().status_code] == [500, 500]
+    assert auction_states.get(11) is None
+
+    # Warming again finds no committed bid, so a lower bid than the failed ones is valid
+    monkeypatch.undo()
+    with SessionLocal() as db:
+        asyncio.run(main.warm_auction_states([auction], db))
+    state = auction_states.get(11)
+    assert (state.current_price, state.highest_bidder_id) == (100.0, None)
+    assert client.post("/bids", json={
+        "auction_id": 11, "bidder_id": 603, "bid_amount": 120.0, "bid_time": "2024-01-01T00:00:00"
+    }).status_code == 201
+
+
+def test_place_bid_stages_side_effects_in_outbox():
+    from app.auction_state import auction_states
+    from app.models.outbox import OutboxEvent
+    from app.sqlalchemy_conn import SessionLocal
+    auction_states.warm({
+        "auction_id": 2,
+        "status": "Active",
+        "end_date": "2999-01-01T00:00:00",
+        "current_price": 10.0,
+    })
+    bid = {"auction_id": 2, "bidder_id": 7, "bid_amount": 20.0, "bid_time": "2024-01-01T00:00:00"}
+    assert client.post("/bids", json=bid).status_code == 201
+
+    with SessionLocal() as db:
+        events = db.query(OutboxEvent).filter(OutboxEvent.path.like("%/2/%")).order_by(OutboxEvent.event_id).all()
+        assert [(e.destination, e.method) for e in events] == [("auction", "PUT"), ("notifications", "POST")]
+        assert events[0].payload == {"current_price": 20.0}
+
+
+def test_outbox_coalesces_price_updates():
+    from app.outbox import coalesce
+    events = [
+        {"event_id": 1, "method": "PUT", "path": "/auctions/1/current_price"},
+        {"event_id": 2, "method": "POST", "path": "/notifications"},
+        {"event_id": 3, "method": "PUT", "path": "/auctions/1/current_price"},
+    ]
+    assert [(e["event_id"], ids) for e, ids in coalesce(events)] == [(2, [2]), (3, [1, 3])]
+
+
+def test_outbox_coalesce_keeps_the_highest_price_whatever_the_event_order():
+    from app.outbox import coalesce
+    # The 30.0 bid committed after the 40.0 one and got the later event_id
+    events = [
+        {"event_id": 5, "method": "PUT", "path": "/auctions/1/current_price", "payload": {"current_price": 40.0}},
+        {"event_id": 6, "method": "PUT", "path": "/auctions/1/current_price", "payload": {"current_price": 30.0}},
+    ]
+    assert [(e["payload"]["current_price"], ids) for e, ids in coalesce(events)] == [(40.0, [6, 5])]
+
+
+def test_group_commit_returns_each_bid_id():
+    import asyncio
+    import datetime
+    from app.group_commit import GroupCommitWriter
+    writer = GroupCommitWriter(window_ms=5, max_batch=100)
+
+    async def submit_all():
+        rows = [
+            {"auction_id": 3, "bidder_id": n, "bid_amount": 100.0 + n, "bid_time": datetime.datetime.utcnow()}
+            for n in range(10)
+        ]
+        return await asyncio.gather(*(writer.submit(row) for row in rows))
+
+    results = asyncio.run(submit_all())
+    assert len({r["bid_id"] for r in results}) == 10
+    assert [r["bidder_id"] for r in results] == list(range(10))
+    assert writer.stats.batches == 1
+    assert writer.stats.max_batch_size == 10
+
+
+def test_group_commit_failed_batch_invalidates_its_auctions():
+    import asyncio
+    import datetime
+    from app.auction_state import auction_states
+    from app.group_commit import GroupCommitWriter
+    writer = GroupCommitWriter(window_ms=5, max_batch=2)
+
+    def failing_write(rows):
+        raise RuntimeError("insert failed")
+    writer._write = failing_write
+    for auction_id in (12, 13):
+        auction_states.warm({
+            "auction_id": auction_id, "status": "Active", "end_date": "2999-01-01T00:00:00", "current_price": 100.0,
+        })
+    bids = [(12, 1, 150.0), (12, 2, 160.0), (13, 3, 150.0)]
+    for auction_id, bidder_id, amount in bids:
+        auction_states.try_accept(auction_id, bidder_id, amount)
+
+    async def submit_all():
+        rows = [
+            {"auction_id": auction_id, "bidder_id": bidder_id, "bid_amount": amount, "bid_time": datetime.datetime.utcnow()}
+            for auction_id, bidder_id, amount in bids
+        ]
+        return await asyncio.gather(*(writer.submit(row) for row in rows), return_exceptions=True)
+
+    results = asyncio.run(submit_all())
+    assert [type(r) for r in results] == [RuntimeError] * 3
+    assert writer.stats.failed_batches == 2
+    assert auction_states.get(12) is None and auction_states.get(13) is None
+    assert not writer._tasks
+
+
+def test_place_bid_batch_ndjson():
+    import json
+    from app.auction_state import auction_states
+    auction_states.warm({
+        "auction_id": 4,
+        "status": "Active",
+        "end_date": "2999-01-01T00:00:00",
+        "current_price": 50.0,
+    })
+    bids = [
+        {"auction_id": 4, "bidder_id": 1, "bid_amount": 60.0, "bid_time": "2024-01-01T00:00:00"},
+        {"auction_id": 4, "bidder_id": 2, "bid_amount": 55.0, "bid_time": "2024-01-01T00:00:00"},
+        {"auction_id": 4, "bidder_id": 3, "bid_amount": 70.0, "bid_time": "2024-01-01T00:00:00"},
+        {"auction_id": 4, "bidder_id": 4},
+    ]
+    response = client.post(
+        "/bids/batch",
+        content="\n".join(json.dumps(bid) for bid in bids),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["accepted"] == 2
+    assert [r["status"] for r in body["results"]] == ["accepted", "rejected", "accepted", "rejected"]
+    assert auction_states.get(4).highest_bidder_id == 3
+
+
+def test_highest_bid_served_from_leader_table():
+    from app.auction_state import auction_states
+    auction_states.warm({
+        "auction_id": 5,
+        "status": "Active",
+        "end_date": "2999-01-01T00:00:00",
+        "current_price": 1.0,
+    })
+    bid_ids = []
+    for bidder_id, amount in [(1, 2.0), (2, 3.0), (1, 4.0)]:
+        response = client.post("/bids", json={
+            "auction_id": 5, "bidder_id": bidder_id, "bid_amount": amount, "bid_time": "2024-01-01T00:00:00"
+        })
+        bid_ids.append(response.json()["bid_id"])
+
+    summary = client.get("/bids/auction/5/summary").json()
+    assert summary["bid_count"] == 3
+    assert summary["unique_bidder_count"] == 2
+    assert summary["highest_bid"]["bid_amount"] == 4.0
+
+    assert client.delete(f"/bids/{bid_ids[2]}").status_code == 204
+    highest = client.get("/bids/auction/5/highest").json()
+    assert highest["bid_id"] == bid_ids[1]
+    assert client.get("/bids/auction/5/summary").json()["bid_count"] == 2
+
+
+def test_list_bids_keyset_pages_and_stream():
+    import json
+    from app.pagination import NEXT_CURSOR_HEADER
+    total = len([line for line in client.get("/bids?stream=true").text.splitlines() if line])
+    assert total > 2
+
+    first = client.get("/bids?limit=2")
+    assert len(first.json()) == 2
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+    second = client.get(f"/bids?limit=2&after={cursor}").json()
+    assert second[0]["bid_id"] > first.json()[-1]["bid_id"]
+
+    streamed = [json.loads(line) for line in client.get(f"/bids?stream=true&after={cursor}").text.splitlines()]
+    assert [bid["bid_id"] for bid in streamed[:len(second)]] == [bid["bid_id"] for bid in second]
+
+
+def test_metrics_single_pass_matches_rollups():
+    from app.main import compute_bid_metrics, compute_bid_metrics_from_rollups
+    from app.rollups import rebuild_bid_hours
+    from app.sqlalchemy_conn import SessionLocal
+    with SessionLocal() as db:
+        direct = compute_bid_metrics(db)
+        rebuild_bid_hours(db)
+        rolled_up = compute_bid_metrics_from_rollups(db)
+    assert direct["total_bids"] > 0
+    assert rolled_up["total_bids"] == direct["total_bids"]
+    assert rolled_up["max_bid_amount"] == direct["max_bid_amount"]
+    assert abs(rolled_up["avg_bid_amount"] - direct["avg_bid_amount"]) < 1e-9
+    assert client.get("/metrics").json()["total_bids"] == direct["total_bids"]
+
+
+def test_rollups_are_rebuilt_at_startup_only_when_behind():
+    import datetime
+    from sqlalchemy import delete, func
+    from app.models.bid import Bid, BidHourly
+    from app.rollups import catch_up_bid_hours
+    from app.sqlalchemy_conn import SessionLocal
+    with SessionLocal() as db:
+        db.execute(delete(BidHourly))
+        db.commit()
+        assert catch_up_bid_hours(db)
+        assert not catch_up_bid_hours(db)
+        # A bid written while rollups were off lands in an hour the table lacks
+        db.add(Bid(auction_id=14, bidder_id=1, bid_amount=5.0, bid_time=datetime.datetime.utcnow() + datetime.timedelta(hours=1)))
+        db.commit()
+        assert catch_up_bid_hours(db)
+        assert db.query(func.sum(BidHourly.bid_count)).scalar() == db.query(func.count(Bid.bid_id)).scalar()
+
+
+def test_bid_broker_drops_slow_subscribers():
+    import asyncio
+    from app.bid_stream import BidBroker
+
+    async def scenario():
+        broker = BidBroker(queue_size=2, max_subscribers=10)
+        fast = broker.subscribe(9)
+        slow = broker.subscribe(9)
+        for amount in (1.0, 2.0):
+            broker.publish(9, "bid", {"bid_amount": amount})
+        await fast.queue.get()
+        await fast.queue.get()
+        broker.publish(9, "bid", {"bid_amount": 3.0})
+        return broker, fast, slow
+
+    broker, fast, slow = asyncio.run(scenario())
+    assert slow.dropped and not fast.dropped
+    assert fast.queue.qsize() == 1
+    assert broker.stats() == {"subscribers": 1, "auctions": 1, "dropped_total": 1}
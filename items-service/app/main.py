@@ -1,27 +1,52 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from .models.item import Item, Base
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response, BackgroundTasks
+from typing import Optional
+from .models.item import Item
 from .schemas.item import Item as ItemSchema, ItemCreate
 from sqlalchemy.orm import Session
-from .sqlalchemy_conn import engine, get_db
-import time
+from .sqlalchemy_conn import get_db, run_db, pool_metrics, DbRoute, ReadYourWrites
+from .lifecycle import prepare_database, health
+from .metrics_cache import metrics_cache
+from .settings import AUCTION_SERVICE_URL
+from . import http_client
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+from .pagination import keyset, page, stream_ndjson, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 import logging
 from sqlalchemy.sql import func
-from datetime import datetime, timedelta
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Wait for database to be ready
-time.sleep(5)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Wait for the database, then apply any pending migrations
+    await run_in_threadpool(prepare_database)
+    health.started = True
+    yield
+    health.started = False
+    await http_client.close_clients()
 
-# Explicitly drop and recreate tables on startup
-logger.info("Creating database tables...")
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
-logger.info("Database tables created successfully")
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = DbRoute
+app.add_middleware(ReadYourWrites)
 
-app = FastAPI()
+@app.get("/health/live")
+def liveness():
+    return health.live()
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    ready, body = health.ready()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return body
+
+async def propagate_owner(item_id: int, owner_id: Optional[int]):
+    # auction-service keeps a denormalized seller_id per auction
+    await http_client.send_quietly(
+        AUCTION_SERVICE_URL, "PUT", f"/auctions/item/{item_id}/seller", json={"seller_id": owner_id}
+    )
 
 # CRUD Operations
 @app.post("/items", response_model=ItemSchema, status_code=status.HTTP_201_CREATED)
@@ -29,7 +54,8 @@ def create_item(item: ItemCreate, db: Session = Depends(get_db)):
     new_item = Item(
         name=item.name,
         description=item.description,
-        category_id=item.category_id
+        category_id=item.category_id,
+        owner_id=item.owner_id
     )
     db.add(new_item)
     db.commit()
@@ -44,14 +70,25 @@ def get_item(item_id: int, db: Session = Depends(get_db)):
     return item
 
 @app.get("/items", response_model=list[ItemSchema])
-def list_items(db: Session = Depends(get_db)):
-    return db.query(Item).all()
+def list_items(
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    def build(db: Session):
+        return keyset(db.query(Item), Item.item_id, after=after)
+    if stream:
+        return stream_ndjson(build, ItemSchema, db=db)
+    return page(build(db), limit, response, lambda item: item.item_id)
 
 @app.put("/items/{item_id}", response_model=ItemSchema)
-def update_item(item_id: int, item: ItemCreate, db: Session = Depends(get_db)):
+def update_item(item_id: int, item: ItemCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     db_item = db.query(Item).filter(Item.item_id == item_id).first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
+    previous_owner = db_item.owner_id
     
     # Update allowed fields
     update_data = item.dict(exclude_unset=True)
@@ -60,6 +97,8 @@ def update_item(item_id: int, item: ItemCreate, db: Session = Depends(get_db)):
     
     db.commit()
     db.refresh(db_item)
+    if db_item.owner_id != previous_owner:
+        background_tasks.add_task(propagate_owner, item_id, db_item.owner_id)
     return db_item
 
 @app.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -74,23 +113,49 @@ def delete_item(item_id: int, db: Session = Depends(get_db)):
 
 # Items by category
 @app.get("/items/category/{category_id}", response_model=list[ItemSchema])
-def get_category_items(category_id: int, db: Session = Depends(get_db)):
-    return db.query(Item).filter(Item.category_id == category_id).all()
+def get_category_items(
+    category_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    def build(db: Session):
+        return keyset(db.query(Item).filter(Item.category_id == category_id), Item.item_id, after=after)
+    if stream:
+        return stream_ndjson(build, ItemSchema, db=db)
+    return page(build(db), limit, response, lambda item: item.item_id)
 
-@app.get("/metrics")
-def get_item_metrics(db: Session = Depends(get_db)):
-    now = datetime.utcnow()
-    one_day_ago = now - timedelta(days=1)
-    one_week_ago = now - timedelta(weeks=1)
-    one_month_ago = now - timedelta(days=30)
-    one_year_ago = now - timedelta(days=365)
-
-    total_items = db.query(Item).count()
-    # Items per category
+# Items by owner
+@app.get("/items/user/{user_id}", response_model=list[ItemSchema])
+def get_user_items(
+    user_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    def build(db: Session):
+        return keyset(db.query(Item).filter(Item.owner_id == user_id), Item.item_id, after=after)
+    if stream:
+        return stream_ndjson(build, ItemSchema, db=db)
+    return page(build(db), limit, response, lambda item: item.item_id)
+
+def compute_item_metrics(db: Session):
+    # The per-category counts already cover every row; total is their sum
     by_category = db.query(Item.category_id, func.count()).group_by(Item.category_id).all()
-    # Items created in time periods (assuming no created_at, so skip these if not available)
     return {
-        "total_items": total_items,
+        "total_items": sum(count for _, count in by_category),
         "items_per_category": {str(cat): count for cat, count in by_category},
         # If created_at field is added, add time-based metrics here
-    }
\ No newline at end of file
+    }
+
+@app.get("/metrics")
+async def get_item_metrics(db: Session = Depends(get_db)):
+    return await metrics_cache.get("items", lambda: run_db(compute_item_metrics, db))
+
+@app.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
@@ -1,5 +1,5 @@
 # Item model for items-service 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -9,4 +9,10 @@ class Item(Base):
     item_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, nullable=False)
     description = Column(String)
-    category_id = Column(Integer)
\ No newline at end of file
+    category_id = Column(Integer, index=True)
+    # The user who owns (and sells) the item
+    owner_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_item_owner_id_item_id", "owner_id", "item_id"),
+    )
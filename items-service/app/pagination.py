@@ -0,0 +1,60 @@
+# Keyset pagination and NDJSON streaming for list endpoints
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from . import sqlalchemy_conn
+from .sqlalchemy_conn import SessionLocal
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def keyset(query, *columns, after=None, descending=False):
+    """
+    Order `query` by `columns` and start right after the row whose key is
+    `after` (a scalar for one column, a tuple for several).
+    """
+    if after is not None:
+        key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        value = tuple_(*after) if len(columns) > 1 else after
+        query = query.filter(key < value if descending else key > value)
+    return query.order_by(*(column.desc() if descending else column for column in columns))
+
+
+def page(query, limit: int, response: Response, cursor_of):
+    # Fetch one page; a full page advertises the cursor of its last row
+    rows = query.limit(limit).all()
+    if len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(cursor_of(rows[-1]))
+    return rows
+
+
+def stream_ndjson(build_query, schema, chunk_size: int = STREAM_CHUNK_SIZE, db=None) -> StreamingResponse:
+    """
+    Stream every row of `build_query(db)` as NDJSON through a server-side
+    cursor, so memory use does not depend on the size of the result.
+    Passing the handler's `db` streams from the same replica it reads from.
+    """
+    replica = db.info.get("replica") if db is not None else None
+
+    def rows():
+        with SessionLocal(bind=sqlalchemy_conn.read_bind(replica)) as db:
+            for row in build_query(db).yield_per(chunk_size):
+                yield schema.model_validate(row).model_dump_json() + "\n"
+
+    async def async_rows():
+        # Same stream over the async engine: the Query is only built, then
+        # its statement is streamed without holding a threadpool thread
+        async with sqlalchemy_conn.AsyncSessionLocal(bind=sqlalchemy_conn.read_bind(replica, is_async=True)) as db:
+            query = build_query(db.sync_session)
+            result = await db.stream(query.statement.execution_options(yield_per=chunk_size))
+            if len(query.column_descriptions) == 1:
+                result = result.scalars()
+            async for row in result:
+                yield schema.model_validate(row).model_dump_json() + "\n"
+
+    if sqlalchemy_conn.async_engine is not None:
+        return StreamingResponse(async_rows(), media_type="application/x-ndjson")
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
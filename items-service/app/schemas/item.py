@@ -6,6 +6,7 @@ class ItemBase(BaseModel):
     name: str
     description: Optional[str] = None
     category_id: Optional[int] = None
+    owner_id: Optional[int] = None
     
 class ItemCreate(ItemBase):
     """Schema for creating new items."""
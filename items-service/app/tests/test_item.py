@@ -1,17 +1,31 @@
 # Tests for item model in items-service 
 
 from fastapi.testclient import TestClient
-from main import app
+from app.main import app
+from app.lifecycle import prepare_database
 
+prepare_database(reset=True)
 client = TestClient(app)
 
 def test_create_and_list_item():
-    assert 1 == 1
-    item = {"item_id": 1, "seller_id": 10, "name": "Test Item", "description": "A test item.", "category": "art"}
-    response = client.post("/items/", json=item)
-    assert response.status_code == 200
-    assert response.json() == item
+    item = {"name": "Test Item", "description": "A test item.", "category_id": 3, "owner_id": 12}
+    response = client.post("/items", json=item)
+    assert response.status_code == 201
+    created = response.json()
+    assert created == {**item, "item_id": created["item_id"]}
 
-    response = client.get("/items/")
+    response = client.get("/items", params={"limit": 100})
     assert response.status_code == 200
-    assert item in response.json() 
\ No newline at end of file
+    assert created in response.json()
+
+def test_user_items_filter_by_owner_and_page():
+    mine = [client.post("/items", json={"name": f"Lamp {n}", "owner_id": 10}).json()["item_id"] for n in range(3)]
+    client.post("/items", json={"name": "Chair", "owner_id": 11})
+    first = client.get("/items/user/10", params={"limit": 2})
+    assert [item["item_id"] for item in first.json()] == mine[:2]
+    second = client.get("/items/user/10", params={"limit": 2, "after": first.headers["X-Next-Cursor"]})
+    assert [item["item_id"] for item in second.json()] == mine[2:]
+    assert "X-Next-Cursor" not in second.headers
+    streamed = client.get("/items/user/10", params={"stream": True}).text.splitlines()
+    assert len(streamed) == 3
+
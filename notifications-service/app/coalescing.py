@@ -0,0 +1,181 @@
+# Coalescing of repeated notifications before they reach the per-user feed
+import asyncio
+import datetime
+import logging
+from sqlalchemy import insert, func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from .models.notification import Notification, NotificationType
+from .models.pending_notification import PendingNotification
+from .sqlalchemy_conn import SessionLocal, upsert
+from .inbox_cache import entry_of
+from .notification_stream import committed
+from .settings import NOTIFICATION_COALESCE_WINDOWS, NOTIFICATION_FLUSH_INTERVAL, NOTIFICATION_FLUSH_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# {"NEW_BID": 10} -> {NotificationType.NEW_BID: 10 seconds}; other types are not coalesced
+COALESCE_WINDOWS = {
+    NotificationType[name]: datetime.timedelta(seconds=seconds)
+    for name, seconds in NOTIFICATION_COALESCE_WINDOWS.items()
+    if seconds > 0
+}
+
+
+def auction_of(row: dict):
+    return (row.get("meta") or {}).get("auction_id")
+
+
+FEED_COLUMNS = (
+    Notification.notification_id, Notification.user_id, Notification.type, Notification.message,
+    Notification.meta, Notification.created_at, Notification.is_read, Notification.read_at,
+)
+
+
+def insert_feed(db: Session, rows):
+    # Multi-row INSERT into the feed; returns the rows as the API shows them.
+    # Whole rows come back, so nothing depends on RETURNING order (asking for
+    # input order makes SQLite fall back to one INSERT per row).
+    returned = db.execute(insert(Notification).returning(*FEED_COLUMNS), rows).all()
+    return [entry_of(row._asdict(), row.notification_id) for row in returned]
+
+
+def write_notifications(db: Session, rows):
+    """
+    Write notification rows (column dicts with a `created_at`). Rows of a
+    type with a coalescing window that concern an auction are staged,
+    merging with what is already pending for the same (user, type,
+    auction); the rest go straight to the feed. The caller commits, then
+    passes the returned feed entries to `committed`.
+    """
+    direct = []
+    staged = {}
+    for row in rows:
+        window = COALESCE_WINDOWS.get(row["type"])
+        auction_id = auction_of(row)
+        if window is None or auction_id is None:
+            direct.append(row)
+            continue
+        key = (row["user_id"], row["type"], auction_id)
+        entry = staged.get(key)
+        if entry is None:
+            staged[key] = {
+                "user_id": row["user_id"], "type": row["type"], "auction_id": auction_id,
+                "message": row["message"], "meta": row["meta"], "count": 1,
+                "first_at": row["created_at"], "last_at": row["created_at"],
+                "flush_at": row["created_at"] + window,
+            }
+        else:
+            # One statement cannot upsert the same key twice, so merge here first
+            entry.update(message=row["message"], meta=row["meta"], last_at=row["created_at"], count=entry["count"] + 1)
+    inserted = insert_feed(db, direct) if direct else []
+    if staged:
+        stmt = upsert(db, PendingNotification)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PendingNotification.user_id, PendingNotification.type, PendingNotification.auction_id],
+            set_={
+                PendingNotification.message: stmt.excluded.message,
+                PendingNotification.meta: stmt.excluded["metadata"],
+                PendingNotification.count: PendingNotification.count + stmt.excluded.count,
+                PendingNotification.last_at: stmt.excluded.last_at,
+            },
+        )
+        db.execute(stmt, list(staged.values()))
+    return inserted, len(staged)
+
+
+class NotificationCoalescer:
+    """
+    Moves pending notifications whose window has closed into the feed, one
+    row per (user, type, auction) carrying the latest message and the number
+    of events it stands for. A window opens with the first event, so nothing
+    waits longer than its window. Rows are taken with SKIP LOCKED, so this
+    background task and Celery workers can flush side by side.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._task = None
+        self.rows_written = 0
+        self.events_merged = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def flush_due(self, now: datetime.datetime = None) -> int:
+        now = now or datetime.datetime.utcnow()
+        with self._session_factory() as db:
+            pending = (
+                db.query(PendingNotification)
+                .filter(PendingNotification.flush_at <= now)
+                .order_by(PendingNotification.flush_at)
+                .limit(NOTIFICATION_FLUSH_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not pending:
+                return 0
+            inserted = insert_feed(db, [
+                {
+                    "user_id": entry.user_id,
+                    "type": entry.type,
+                    "message": entry.message,
+                    "meta": {**(entry.meta or {}), "count": entry.count},
+                    "created_at": entry.last_at,
+                    "is_read": False,
+                }
+                for entry in pending
+            ])
+            merged = sum(entry.count for entry in pending)
+            for entry in pending:
+                db.delete(entry)
+            db.commit()
+        committed(inserted)
+        self.rows_written += len(pending)
+        self.events_merged += merged
+        return len(pending)
+
+    def drain(self) -> int:
+        """Flush until nothing is due; for runners outside the API process."""
+        total = 0
+        while True:
+            flushed = self.flush_due()
+            total += flushed
+            if flushed < NOTIFICATION_FLUSH_BATCH_SIZE:
+                return total
+
+    async def _run(self):
+        while True:
+            try:
+                flushed = await run_in_threadpool(self.flush_due)
+            except Exception:
+                logger.exception("Notification flush failed")
+                flushed = 0
+            if flushed < NOTIFICATION_FLUSH_BATCH_SIZE:
+                await asyncio.sleep(NOTIFICATION_FLUSH_INTERVAL)
+
+    def stats(self):
+        with self._session_factory() as db:
+            pending, pending_events = db.query(
+                func.count(PendingNotification.user_id), func.coalesce(func.sum(PendingNotification.count), 0)
+            ).one()
+        return {
+            "windows_seconds": {kind.name: window.total_seconds() for kind, window in COALESCE_WINDOWS.items()},
+            "pending": pending,
+            "pending_events": pending_events,
+            "rows_written": self.rows_written,
+            "events_merged": self.events_merged,
+        }
+
+
+coalescer = NotificationCoalescer()
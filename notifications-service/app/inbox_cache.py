@@ -0,0 +1,215 @@
+# In-process per-user inbox: recent notifications and unread counts
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .models.notification import Notification
+from .schemas.notification import Notification as NotificationSchema
+from .settings import INBOX_CACHE_USERS, INBOX_CACHE_DEPTH, INBOX_CACHE_TTL
+
+
+def entry_of(row: dict, notification_id: int) -> dict:
+    # A row as written (column dict) in the shape the API returns
+    return {
+        "notification_id": notification_id,
+        "user_id": row["user_id"],
+        "type": row["type"],
+        "message": row["message"],
+        "metadata": row["meta"],
+        "created_at": row["created_at"],
+        "is_read": row["is_read"],
+        "read_at": row.get("read_at"),
+    }
+
+
+def newer(a: dict, b: dict) -> bool:
+    return (a["created_at"], a["notification_id"]) > (b["created_at"], b["notification_id"])
+
+
+class UserInbox:
+    """
+    A user's newest notifications (newest first, at most the cache depth) and
+    the number of unread notifications they have in total. `complete` when
+    `recent` is everything the user has.
+    """
+    __slots__ = ("recent", "unread", "complete", "expires_at")
+
+    def __init__(self, recent, unread: int, complete: bool, expires_at: float):
+        self.recent = recent
+        self.unread = unread
+        self.complete = complete
+        self.expires_at = expires_at
+
+    def page(self, limit: int, unread_only: bool = False, before: int = None):
+        """The page the database would return, or None if this entry cannot tell."""
+        start = 0
+        if before is not None:
+            ids = [entry["notification_id"] for entry in self.recent]
+            if before not in ids:
+                return None
+            start = ids.index(before) + 1
+        rows = [entry for entry in self.recent[start:] if not (unread_only and entry["is_read"])]
+        if len(rows) < limit and not self.complete:
+            return None
+        return rows[:limit]
+
+
+class InboxCache:
+    """
+    Bounded LRU of UserInbox entries with a TTL. Writes committed in this
+    process are applied to the cached entry instead of dropping it, so the
+    inbox and the unread count stay exact without going back to the
+    database; the TTL bounds staleness from writes made by other replicas.
+
+    As in the auction cache, loaders take a token first and `put` drops an
+    entry when the user was written to after the token was issued.
+    """
+
+    def __init__(self, max_users: int = INBOX_CACHE_USERS, depth: int = INBOX_CACHE_DEPTH, ttl: float = INBOX_CACHE_TTL):
+        self.max_users = max_users
+        self.depth = depth
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._written = {}
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.updates = 0
+
+    def get(self, user_id: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= now:
+                del self._entries[user_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+
+    def token(self) -> int:
+        with self._lock:
+            return self._seq
+
+    def put(self, user_id: int, recent, unread: int, complete: bool, token: int) -> UserInbox:
+        entry = UserInbox(recent, unread, complete, time.monotonic() + self.ttl)
+        with self._lock:
+            if token < self._floor or self._written.get(user_id, -1) > token:
+                return entry
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def load(self, db: Session, user_id: int) -> UserInbox:
+        """Read a user's inbox from `db` (the primary) and cache it."""
+        token = self.token()
+        rows = (
+            db.query(Notification)
+            .filter(Notification.user_id == user_id)
+            .order_by(Notification.created_at.desc(), Notification.notification_id.desc())
+            .limit(self.depth + 1)
+            .all()
+        )
+        unread = db.query(func.count(Notification.notification_id)).filter(
+            Notification.user_id == user_id, Notification.is_read == False
+        ).scalar()
+        recent = [NotificationSchema.model_validate(row).model_dump() for row in rows[:self.depth]]
+        return self.put(user_id, recent, unread, len(rows) <= self.depth, token)
+
+    def _written_to(self, user_id: int):
+        # Caller holds the lock: loads of this user that are in flight are stale
+        self._seq += 1
+        self._written[user_id] = self._seq
+        if len(self._written) > self.max_users:
+            self._written.clear()
+            self._seq += 1
+            self._floor = self._seq
+
+    def _update(self, user_id: int, apply):
+        with self._lock:
+            self._written_to(user_id)
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                # Entries are replaced, never mutated: readers may hold the old list
+                apply(entry)
+                self.updates += 1
+
+    def added(self, entries):
+        """Committed new notifications (API-shaped dicts)."""
+        by_user = {}
+        for entry in entries:
+            by_user.setdefault(entry["user_id"], []).append(entry)
+        for user_id, new in by_user.items():
+            def apply(inbox, new=new):
+                recent = list(inbox.recent)
+                for entry in new:
+                    # Usually the newest; coalesced rows may land further down
+                    position = 0
+                    while position < len(recent) and newer(recent[position], entry):
+                        position += 1
+                    if position < len(recent) or inbox.complete:
+                        recent.insert(position, entry)
+                if len(recent) > self.depth:
+                    del recent[self.depth:]
+                    inbox.complete = False
+                inbox.recent = recent
+                inbox.unread += sum(1 for entry in new if not entry["is_read"])
+            self._update(user_id, apply)
+
+    def marked_read(self, user_id: int, notification_ids, read_at):
+        """Committed read marks; `notification_ids` are the ones that were unread."""
+        ids = set(notification_ids)
+
+        def apply(inbox):
+            inbox.recent = [
+                {**entry, "is_read": True, "read_at": read_at} if entry["notification_id"] in ids else entry
+                for entry in inbox.recent
+            ]
+            inbox.unread = max(inbox.unread - len(ids), 0)
+        self._update(user_id, apply)
+
+    def removed(self, user_id: int, notification_ids, unread: int):
+        """Committed deletes, `unread` of which were unread."""
+        ids = set(notification_ids)
+
+        def apply(inbox):
+            inbox.recent = [entry for entry in inbox.recent if entry["notification_id"] not in ids]
+            inbox.unread = max(inbox.unread - unread, 0)
+        self._update(user_id, apply)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._written_to(user_id)
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._entries),
+                "max_users": self.max_users,
+                "depth": self.depth,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "updates": self.updates,
+            }
+
+
+inbox_cache = InboxCache()
@@ -0,0 +1,96 @@
+# Startup lifecycle: wait for the database, apply migrations, report health
+import datetime
+import logging
+import time
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select, insert, text
+from sqlalchemy.exc import OperationalError
+from .sqlalchemy_conn import engine
+from .settings import DB_WAIT_TIMEOUT, DB_WAIT_INITIAL_DELAY, DB_WAIT_MAX_DELAY
+from .migrations import MIGRATIONS
+
+logger = logging.getLogger(__name__)
+
+# Same key in every service; each service has its own database
+MIGRATION_LOCK_KEY = 7300
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def wait_for_database(timeout: float = DB_WAIT_TIMEOUT):
+    """Block until the database accepts connections, backing off exponentially."""
+    delay = DB_WAIT_INITIAL_DELAY
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return
+        except OperationalError as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.info("Database not ready (%s); retrying in %.1fs", e.orig, delay)
+            time.sleep(delay)
+            delay = min(delay * 2, DB_WAIT_MAX_DELAY)
+
+
+def migrate():
+    """
+    Apply the migrations in MIGRATIONS that this database has not seen yet,
+    in one transaction. On PostgreSQL an advisory lock makes replicas that
+    start together wait for the first one instead of migrating twice.
+    """
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        schema_migrations.create(conn, checkfirst=True)
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+        for version, description, step in MIGRATIONS:
+            if version in applied:
+                continue
+            logger.info("Applying migration %s: %s", version, description)
+            step(conn)
+            conn.execute(insert(schema_migrations).values(
+                version=version, description=description, applied_at=datetime.datetime.utcnow()
+            ))
+
+
+def reset_database():
+    # Tests only: start from an empty schema
+    from .migrations import metadata
+    metadata.drop_all(bind=engine)
+    schema_migrations.drop(bind=engine, checkfirst=True)
+
+
+def prepare_database(reset: bool = False):
+    wait_for_database()
+    if reset:
+        reset_database()
+    migrate()
+
+
+class Health:
+    """Liveness is the process answering; readiness also needs startup done and the DB reachable."""
+
+    def __init__(self):
+        self.started = False
+
+    def live(self):
+        return {"status": "ok"}
+
+    def ready(self):
+        if not self.started:
+            return False, {"status": "starting"}
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            return False, {"status": "unavailable", "detail": str(e)}
+        return True, {"status": "ok"}
+
+
+health = Health()
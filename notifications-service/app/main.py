@@ -1,26 +1,61 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response, Body, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from .models.notification import Base, Notification, NotificationType
-from .schemas.notification import Notification as NotificationSchema, NotificationCreate
-from .sqlalchemy_conn import engine, get_db
-import time
+from typing import List, Dict, Any, Optional
+from .models.notification import Notification, NotificationType
+from .schemas.notification import Notification as NotificationSchema, NotificationCreate, BidPlaced
+from .sqlalchemy_conn import get_db, get_primary_db, run_db, release_db, pool_metrics, DbRoute, ReadYourWrites
+from .lifecycle import prepare_database, health
+from .metrics_cache import metrics_cache
+from .pagination import keyset, page, stream_ndjson, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from .settings import (
+    BIDDING_SERVICE_URL, NOTIFY_FANOUT_CHUNK_SIZE, BIDDERS_FETCH_TIMEOUT, NOTIFICATION_COALESCER_ENABLED,
+    NOTIFICATION_STREAM_HEARTBEAT, NOTIFICATION_STREAM_REPLAY_MAX,
+)
+from .coalescing import write_notifications, coalescer
+from .inbox_cache import inbox_cache
+from .notification_stream import notification_broker, committed, sse, TooManySubscribers
+from . import http_client
+import asyncio
 import logging
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import update, delete, and_, or_
 from sqlalchemy.sql import func
 
 
-time.sleep(5)
-Base.metadata.create_all(bind=engine)
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(prepare_database)
+    health.started = True
+    notification_broker.start()
+    if NOTIFICATION_COALESCER_ENABLED:
+        coalescer.start()
+    yield
+    health.started = False
+    await coalescer.stop()
+    notification_broker.stop()
+    await http_client.close_clients()
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = DbRoute
+app.add_middleware(ReadYourWrites)
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-logger.info("Creating database tables...")
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
-logger.info("Database tables created successfully")
+
+@app.get("/health/live")
+def liveness():
+    return health.live()
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    ready, body = health.ready()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return body
 
 # Basic Notification Operations
 @app.post("/notifications", response_model=NotificationSchema, status_code=status.HTTP_201_CREATED)
@@ -29,32 +64,150 @@ def create_notification(notification: NotificationCreate, db: Session = Depends(
         user_id=notification.user_id,
         type=notification.type,
         message=notification.message,
-        metadata=notification.metadata,
+        meta=notification.metadata,
         created_at=datetime.utcnow(),
         is_read=False
     )
     db.add(new_notification)
     db.commit()
     db.refresh(new_notification)
-    
-    # Note: Notification delivery would happen here in a production system
-    # This could be via websockets, push notifications, email, etc.
-    
+    # Delivered to connected clients through /notifications/user/{user_id}/stream
+    committed([NotificationSchema.model_validate(new_notification).model_dump()])
     return new_notification
 
+@app.post("/notifications/batch", status_code=status.HTTP_201_CREATED)
+def create_notification_batch(notifications: List[NotificationCreate], db: Session = Depends(get_db)):
+    # Bulk form for service callers (e.g. auction settlement): one multi-row insert
+    now = datetime.utcnow()
+    rows = [
+        {
+            "user_id": notification.user_id,
+            "type": notification.type,
+            "message": notification.message,
+            "meta": notification.metadata,
+            "created_at": now,
+            "is_read": False,
+        }
+        for notification in notifications
+    ]
+    if rows:
+        inserted, _ = write_notifications(db, rows)
+        db.commit()
+        committed(inserted)
+    return {"status": "Notifications sent", "recipient_count": len(rows)}
+
 @app.get("/notifications/user/{user_id}", response_model=List[NotificationSchema])
 def get_user_notifications(
     user_id: int, 
+    response: Response,
     unread_only: bool = False, 
-    limit: int = 50, 
-    db: Session = Depends(get_db)
+    before: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), 
+    stream: bool = False,
+    db: Session = Depends(get_db),
+    primary: Session = Depends(get_primary_db)
 ):
-    query = db.query(Notification).filter(Notification.user_id == user_id)
-    if unread_only:
-        query = query.filter(Notification.is_read == False)
-    
-    notifications = query.order_by(Notification.created_at.desc()).limit(limit).all()
-    return notifications
+    # Newest first; `before` is the notification_id of the last row already seen.
+    # Pages within the user's cached recent notifications skip the database.
+    if not stream:
+        inbox = inbox_cache.get(user_id) or (inbox_cache.load(primary, user_id) if before is None else None)
+        rows = inbox.page(limit, unread_only, before) if inbox is not None else None
+        if rows is not None:
+            if len(rows) == limit:
+                response.headers[NEXT_CURSOR_HEADER] = str(rows[-1]["notification_id"])
+            return rows
+
+    cursor = None
+    if before is not None:
+        cursor = db.query(Notification.created_at, Notification.notification_id).filter(
+            Notification.notification_id == before
+        ).first()
+
+    def build(db: Session):
+        query = db.query(Notification).filter(Notification.user_id == user_id)
+        if unread_only:
+            query = query.filter(Notification.is_read == False)
+        if before is not None and cursor is None:
+            # The cursor row is gone; ids grow with created_at, so resume by id
+            query = query.filter(Notification.notification_id < before)
+        return keyset(
+            query, Notification.created_at, Notification.notification_id,
+            after=tuple(cursor) if cursor else None, descending=True
+        )
+    if stream:
+        return stream_ndjson(build, NotificationSchema, db=db)
+    return page(build(db), limit, response, lambda notification: notification.notification_id)
+
+@app.get("/notifications/user/{user_id}/unread-count")
+def get_unread_count(user_id: int, primary: Session = Depends(get_primary_db)):
+    # Badge count: exact from the inbox cache, which loads the user on a miss
+    inbox = inbox_cache.get(user_id) or inbox_cache.load(primary, user_id)
+    return {"user_id": user_id, "unread": inbox.unread}
+
+def load_missed(db: Session, user_id: int, last_id: int):
+    # Resume by id: ids are assigned at insert, which is when rows are pushed
+    rows = (
+        db.query(Notification)
+        .filter(Notification.user_id == user_id, Notification.notification_id > last_id)
+        .order_by(Notification.notification_id)
+        .limit(NOTIFICATION_STREAM_REPLAY_MAX + 1)
+        .all()
+    )
+    return [NotificationSchema.model_validate(row).model_dump() for row in rows]
+
+@app.get("/notifications/user/{user_id}/stream")
+async def stream_user_notifications(
+    user_id: int,
+    last_event_id: Optional[int] = Header(None),
+    since: Optional[int] = None,
+    db: Session = Depends(get_primary_db)
+):
+    """
+    Server-sent events: every new notification for the user as it is
+    committed. A reconnect sends Last-Event-ID (or `since`, for a first
+    connect) and first gets what it missed, up to the replay limit; past
+    that a `resync` event tells the client to reload its inbox.
+    """
+    try:
+        subscription = notification_broker.subscribe(user_id)
+    except TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many notification stream subscribers")
+    resume_from = last_event_id if last_event_id is not None else since
+    missed = []
+    try:
+        if resume_from is not None:
+            # Subscribed first, so nothing committed meanwhile falls between the two
+            missed = await run_db(load_missed, db, user_id, resume_from)
+    except Exception:
+        notification_broker.unsubscribe(subscription)
+        raise
+    finally:
+        # The stream must not keep the replay's connection for its whole life
+        await release_db(db)
+    replayed = {entry["notification_id"] for entry in missed}
+
+    async def events():
+        try:
+            if len(missed) > NOTIFICATION_STREAM_REPLAY_MAX:
+                yield sse("resync", {"user_id": user_id})
+            else:
+                for entry in missed:
+                    yield sse("notification", entry, entry["notification_id"])
+            while True:
+                if subscription.dropped and subscription.queue.empty():
+                    yield sse("dropped", {"user_id": user_id})
+                    break
+                try:
+                    entry = await asyncio.wait_for(subscription.queue.get(), NOTIFICATION_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if entry["notification_id"] not in replayed:
+                    yield sse("notification", entry, entry["notification_id"])
+        finally:
+            notification_broker.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.put("/notifications/{notification_id}/read", response_model=NotificationSchema)
 def mark_notification_read(notification_id: int, db: Session = Depends(get_db)):
@@ -62,10 +215,13 @@ def mark_notification_read(notification_id: int, db: Session = Depends(get_db)):
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     
+    was_unread = not notification.is_read
     notification.is_read = True
     notification.read_at = datetime.utcnow()
     db.commit()
     db.refresh(notification)
+    if was_unread:
+        inbox_cache.marked_read(notification.user_id, [notification_id], notification.read_at)
     return notification
 
 @app.delete("/notifications/{notification_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -74,41 +230,129 @@ def delete_notification(notification_id: int, db: Session = Depends(get_db)):
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     
+    user_id, was_unread = notification.user_id, not notification.is_read
     db.delete(notification)
     db.commit()
+    inbox_cache.removed(user_id, [notification_id], int(was_unread))
     return
 
+@app.post("/notifications/user/{user_id}/read")
+def mark_user_notifications_read(user_id: int, up_to: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Mark all of a user's unread notifications as read, or with `up_to` only
+    that notification and the ones older than it, in one UPDATE.
+    """
+    query = update(Notification).where(Notification.user_id == user_id, Notification.is_read == False)
+    if up_to is not None:
+        cursor = db.query(Notification.created_at, Notification.notification_id).filter(
+            Notification.notification_id == up_to, Notification.user_id == user_id
+        ).first()
+        if not cursor:
+            raise HTTPException(status_code=404, detail="Notification not found")
+        query = query.where(or_(
+            Notification.created_at < cursor.created_at,
+            and_(Notification.created_at == cursor.created_at, Notification.notification_id <= up_to),
+        ))
+    read_at = datetime.utcnow()
+    marked = db.execute(
+        query.values(is_read=True, read_at=read_at)
+        .returning(Notification.notification_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    inbox_cache.marked_read(user_id, marked, read_at)
+    return {"user_id": user_id, "marked_read": len(marked)}
+
+@app.delete("/notifications/user/{user_id}")
+def delete_user_notifications(
+    user_id: int,
+    notification_ids: List[int] = Query(None),
+    older_than_days: Optional[float] = Query(None, ge=0),
+    db: Session = Depends(get_db)
+):
+    # One DELETE for the listed notifications and/or those older than the age
+    if not notification_ids and older_than_days is None:
+        raise HTTPException(status_code=400, detail="Specify notification_ids or older_than_days")
+    query = delete(Notification).where(Notification.user_id == user_id)
+    if notification_ids:
+        query = query.where(Notification.notification_id.in_(notification_ids))
+    if older_than_days is not None:
+        query = query.where(Notification.created_at < datetime.utcnow() - timedelta(days=older_than_days))
+    deleted = db.execute(
+        query.returning(Notification.notification_id, Notification.is_read)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    inbox_cache.removed(
+        user_id, [notification_id for notification_id, _ in deleted], sum(1 for _, is_read in deleted if not is_read)
+    )
+    return {"user_id": user_id, "deleted": len(deleted)}
+
 # Service to Service Notification Endpoints
+def fan_out(db: Session, user_ids: List[int], notification_type: NotificationType, message: str, meta):
+    """
+    Insert the same notification for every recipient. The shared columns are
+    built once and rows go out as multi-row INSERTs of
+    NOTIFY_FANOUT_CHUNK_SIZE, all in one transaction. Coalesced types are
+    staged instead (see write_notifications).
+    """
+    inserted = []
+    shared = {"type": notification_type, "message": message, "meta": meta, "created_at": datetime.utcnow(), "is_read": False}
+    for start in range(0, len(user_ids), NOTIFY_FANOUT_CHUNK_SIZE):
+        chunk = user_ids[start:start + NOTIFY_FANOUT_CHUNK_SIZE]
+        inserted.extend(write_notifications(db, [{**shared, "user_id": user_id} for user_id in chunk])[0])
+    db.commit()
+    committed(inserted)
+    return len(user_ids)
+
+async def fetch_bidders(auction_id: int) -> List[int]:
+    # One indexed lookup in bidding-service, however many bidders there are
+    try:
+        response = await http_client.request(
+            BIDDING_SERVICE_URL, "GET", "/bids/auctions/bidders",
+            params={"auction_ids": auction_id}, timeout=BIDDERS_FETCH_TIMEOUT
+        )
+        response.raise_for_status()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error communicating with bidding service: {str(e)}")
+    return [bidder_id for entry in response.json() for bidder_id in entry["bidder_ids"]]
+
 @app.post("/notifications/auction/{auction_id}/new")
-def notify_auction_event(
+async def notify_auction_event(
     auction_id: int,
     event_type: str,
-    user_ids: List[int],
     message: str,
+    user_ids: List[int] = Body([]),
     metadata: Dict[str, Any] = None,
+    all_bidders: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Generic auction event notification endpoint that replaces the specific event endpoints"""
-    
+    """
+    Generic auction event notification endpoint that replaces the specific
+    event endpoints. Recipients are `user_ids` plus, with `all_bidders`,
+    everyone who has bid on the auction.
+    """
     try:
         notification_type = NotificationType[event_type]
     except KeyError:
         raise HTTPException(status_code=400, detail=f"Invalid notification type: {event_type}")
-    
-    # Create notifications for provided users
-    for user_id in user_ids:
-        new_notification = Notification(
-            user_id=user_id,
-            type=notification_type,
-            message=message,
-            metadata=metadata or {"auction_id": auction_id},
-            created_at=datetime.utcnow(),
-            is_read=False
-        )
-        db.add(new_notification)
-    
-    db.commit()
-    return {"status": "Notifications sent", "recipient_count": len(user_ids)}
+
+    recipients = list(user_ids)
+    if all_bidders:
+        recipients.extend(await fetch_bidders(auction_id))
+    recipients = list(dict.fromkeys(recipients))
+    count = await run_db(fan_out, db, recipients, notification_type, message, metadata or {"auction_id": auction_id})
+    return {"status": "Notifications sent", "recipient_count": count}
+
+@app.post("/notifications/auction/{auction_id}/bid", status_code=status.HTTP_201_CREATED)
+async def notify_new_bid(auction_id: int, bid: BidPlaced, db: Session = Depends(get_db)):
+    # Every other bidder hears about it; bursts are coalesced into one row per window
+    recipients = [user_id for user_id in await fetch_bidders(auction_id) if user_id != bid.bidder_id]
+    count = await run_db(
+        fan_out, db, recipients, NotificationType.NEW_BID, f"New bid of ${bid.amount:.2f} on auction #{auction_id}",
+        {"auction_id": auction_id, "bid_id": bid.bid_id, "amount": bid.amount},
+    )
+    return {"status": "Notifications sent", "recipient_count": count}
 
 @app.post("/notifications/item/{item_id}/sold")
 def notify_item_sold(
@@ -117,52 +361,68 @@ def notify_item_sold(
     owner_id: int,
     db: Session = Depends(get_db)
 ):
-    # Notify buyer
-    buyer_notification = Notification(
-        user_id=buyer_id,
-        type=NotificationType.ITEM_PURCHASED,
-        message=f"You've successfully purchased item #{item_id}",
-        metadata={"item_id": item_id},
-        created_at=datetime.utcnow(),
-        is_read=False
-    )
-    db.add(buyer_notification)
-    
-    # Notify seller
-    seller_notification = Notification(
-        user_id=owner_id,
-        type=NotificationType.ITEM_SOLD,
-        message=f"Your item #{item_id} has been sold",
-        metadata={"item_id": item_id},
-        created_at=datetime.utcnow(),
-        is_read=False
-    )
-    db.add(seller_notification)
-    
+    now = datetime.utcnow()
+    inserted, _ = write_notifications(db, [
+        {
+            "user_id": buyer_id,
+            "type": NotificationType.ITEM_PURCHASED,
+            "message": f"You've successfully purchased item #{item_id}",
+            "meta": {"item_id": item_id},
+            "created_at": now,
+            "is_read": False,
+        },
+        {
+            "user_id": owner_id,
+            "type": NotificationType.ITEM_SOLD,
+            "message": f"Your item #{item_id} has been sold",
+            "meta": {"item_id": item_id},
+            "created_at": now,
+            "is_read": False,
+        },
+    ])
     db.commit()
+    committed(inserted)
     return {"status": "Notifications sent"}
 
-@app.get("/metrics")
-def get_notification_metrics(db: Session = Depends(get_db)):
+def compute_notification_metrics(db: Session):
+    # One scan with conditional aggregates instead of a query per figure
     now = datetime.utcnow()
-    one_day_ago = now - timedelta(days=1)
-    one_week_ago = now - timedelta(weeks=1)
-    one_month_ago = now - timedelta(days=30)
-    one_year_ago = now - timedelta(days=365)
-
-    total_notifications = db.query(Notification).count()
-    read_count = db.query(Notification).filter(Notification.is_read == True).count()
-    unread_count = db.query(Notification).filter(Notification.is_read == False).count()
-    sent_today = db.query(Notification).filter(Notification.created_at >= one_day_ago).count()
-    sent_week = db.query(Notification).filter(Notification.created_at >= one_week_ago).count()
-    sent_month = db.query(Notification).filter(Notification.created_at >= one_month_ago).count()
-    sent_year = db.query(Notification).filter(Notification.created_at >= one_year_ago).count()
+    windows = {
+        "today": now - timedelta(days=1),
+        "last_week": now - timedelta(weeks=1),
+        "last_month": now - timedelta(days=30),
+        "last_year": now - timedelta(days=365),
+    }
+    row = db.query(
+        func.count(Notification.notification_id),
+        func.count(Notification.notification_id).filter(Notification.is_read == True),
+        func.count(Notification.notification_id).filter(Notification.is_read == False),
+        *(func.count(Notification.notification_id).filter(Notification.created_at >= since) for since in windows.values()),
+    ).one()
+    total_notifications, read_count, unread_count, *sent = row
     return {
         "total_notifications": total_notifications,
         "read_notifications": read_count,
         "unread_notifications": unread_count,
-        "sent_today": sent_today,
-        "sent_last_week": sent_week,
-        "sent_last_month": sent_month,
-        "sent_last_year": sent_year,
-    }
\ No newline at end of file
+        **{f"sent_{window}": count for window, count in zip(windows, sent)},
+    }
+
+@app.get("/metrics")
+async def get_notification_metrics(db: Session = Depends(get_db)):
+    return await metrics_cache.get("notifications", lambda: run_db(compute_notification_metrics, db))
+
+@app.get("/metrics/coalescing")
+def get_coalescing_metrics():
+    return coalescer.stats()
+
+@app.get("/metrics/inbox-cache")
+def get_inbox_cache_metrics():
+    return inbox_cache.stats()
+
+@app.get("/metrics/stream")
+def get_stream_metrics():
+    return notification_broker.stats()
+
+@app.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
@@ -1,5 +1,5 @@
 # Notification model for notifications-service 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 from enum import Enum as PyEnum
@@ -25,4 +25,11 @@ class Notification(Base):
     message = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     is_read = Column(Boolean, default=False)
-    read_at = Column(DateTime, nullable=True)
\ No newline at end of file
+    read_at = Column(DateTime, nullable=True)
+    # `metadata` is reserved on declarative classes, so the attribute is `meta`
+    meta = Column("metadata", JSON, nullable=True)
+
+    __table_args__ = (
+        # Inbox reads: one user's (unread) notifications, newest first
+        Index("ix_notifications_user_unread_created", user_id, is_read, created_at.desc(), notification_id.desc()),
+    )
@@ -0,0 +1,24 @@
+# Staged notifications awaiting coalescing, for notifications-service
+from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON, Index
+from .notification import Base, NotificationType
+
+class PendingNotification(Base):
+    """
+    Repeated notifications of one type about one auction for one user,
+    merged while their coalescing window is open. `count` events have been
+    merged; `message` and `meta` are the latest one's.
+    """
+    __tablename__ = 'pending_notifications'
+    user_id = Column(Integer, primary_key=True)
+    type = Column(Enum(NotificationType), primary_key=True)
+    auction_id = Column(Integer, primary_key=True)
+    message = Column(String, nullable=False)
+    meta = Column("metadata", JSON, nullable=True)
+    count = Column(Integer, nullable=False, default=1)
+    first_at = Column(DateTime, nullable=False)
+    last_at = Column(DateTime, nullable=False)
+    flush_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_pending_notifications_flush_at", "flush_at"),
+    )
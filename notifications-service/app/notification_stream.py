@@ -0,0 +1,149 @@
+# Server-push delivery of new notifications to connected users
+import asyncio
+import json
+import logging
+import threading
+from fastapi.encoders import jsonable_encoder
+from .inbox_cache import inbox_cache
+from .settings import NOTIFICATION_STREAM_QUEUE_SIZE, NOTIFICATION_STREAM_MAX_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+
+class LocalPubSub:
+    """
+    In-process stand-in for a bus shared by all replicas (Redis pub/sub,
+    PostgreSQL LISTEN/NOTIFY). Every replica publishes the notifications it
+    commits and every replica's broker listens, so a user is reached
+    whichever replica holds their connection; with this stand-in that is
+    only the local process. Messages are lists of API-shaped notifications.
+    """
+
+    def __init__(self):
+        self._handlers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler):
+        with self._lock:
+            self._handlers = self._handlers + [handler]
+
+    def unsubscribe(self, handler):
+        with self._lock:
+            self._handlers = [h for h in self._handlers if h is not handler]
+
+    def publish(self, message):
+        for handler in self._handlers:
+            handler(message)
+
+
+class Subscription:
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class NotificationBroker:
+    """
+    Per-user pub/sub living on the event loop, fed from the bus. Each
+    connection has a bounded queue; one that falls behind is dropped rather
+    than allowed to hold up delivery, and reconnects with its last event id
+    to replay what it missed from the database.
+    """
+
+    def __init__(self, pubsub, queue_size: int = NOTIFICATION_STREAM_QUEUE_SIZE,
+                 max_subscribers: int = NOTIFICATION_STREAM_MAX_SUBSCRIBERS):
+        self._pubsub = pubsub
+        self._queue_size = queue_size
+        self._max_subscribers = max_subscribers
+        self._subscribers = {}
+        self._count = 0
+        self._loop = None
+        self.delivered_total = 0
+        self.dropped_total = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._pubsub.subscribe(self._receive)
+
+    def stop(self):
+        self._pubsub.unsubscribe(self._receive)
+        self._loop = None
+
+    def publish(self, entries):
+        # Safe from any thread; call only once the rows are committed
+        if entries:
+            self._pubsub.publish(list(entries))
+
+    def _receive(self, entries):
+        loop = self._loop
+        if loop is None:
+            return
+        # Most fan-out recipients are not connected; only hop threads for those who are
+        wanted = [entry for entry in entries if entry["user_id"] in self._subscribers]
+        if not wanted:
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, wanted)
+        except RuntimeError:
+            pass
+
+    def _deliver(self, entries):
+        for entry in entries:
+            subscribers = self._subscribers.get(entry["user_id"])
+            if not subscribers:
+                continue
+            for subscription in list(subscribers):
+                try:
+                    subscription.queue.put_nowait(entry)
+                    self.delivered_total += 1
+                except asyncio.QueueFull:
+                    subscription.dropped = True
+                    self.unsubscribe(subscription)
+                    self.dropped_total += 1
+                    logger.info("Dropped slow notification stream subscriber for user %s", entry["user_id"])
+
+    def subscribe(self, user_id: int) -> Subscription:
+        if self._count >= self._max_subscribers:
+            raise TooManySubscribers()
+        subscription = Subscription(user_id, self._queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        self._count -= 1
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+
+    def stats(self):
+        return {
+            "subscribers": self._count,
+            "max_subscribers": self._max_subscribers,
+            "users": len(self._subscribers),
+            "delivered_total": self.delivered_total,
+            "dropped_total": self.dropped_total,
+        }
+
+
+def sse(event: str, data: dict, event_id: int = None) -> str:
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+def committed(entries):
+    """New feed rows, after their commit: keep the inbox cache exact and push them out."""
+    inbox_cache.added(entries)
+    notification_broker.publish(entries)
+
+
+notification_pubsub = LocalPubSub()
+notification_broker = NotificationBroker(notification_pubsub)
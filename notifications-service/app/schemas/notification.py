@@ -1,5 +1,5 @@
 # Notification schema for notifications-service 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, AliasChoices
 from typing import Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -28,7 +28,15 @@ class NotificationCreate(NotificationBase):
     """
     pass
 
+class BidPlaced(BaseModel):
+    # Sent by bidding-service (through its outbox) for every accepted bid
+    bid_id: int
+    bidder_id: int
+    amount: float
+
 class Notification(NotificationBase):
+    # ORM rows carry the column as `meta`; `metadata` there is the table registry
+    metadata: Optional[Dict[str, Any]] = Field(None, validation_alias=AliasChoices("meta", "metadata"))
     notification_id: int
     created_at: datetime
     is_read: bool = False
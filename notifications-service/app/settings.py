@@ -3,4 +3,70 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
\ No newline at end of file
+DATABASE_URL = os.getenv("DATABASE_URL")
+BIDDING_SERVICE_URL = os.getenv("BIDDING_SERVICE_URL", "http://bidding-service:8000")
+
+# Outbound HTTP to peer services
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "2.0"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "1.0"))
+
+# /metrics
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "10"))
+
+# Auction event fan-out: rows per multi-row INSERT, and the deadline for
+# resolving "all bidders" from bidding-service
+NOTIFY_FANOUT_CHUNK_SIZE = int(os.getenv("NOTIFY_FANOUT_CHUNK_SIZE", "5000"))
+BIDDERS_FETCH_TIMEOUT = float(os.getenv("BIDDERS_FETCH_TIMEOUT", "10"))
+
+# Coalescing: NotificationType=seconds; pending notifications of a listed type
+# for the same (user, auction) are merged into one feed row per window
+NOTIFICATION_COALESCE_WINDOWS = {
+    name.strip(): float(seconds)
+    for name, seconds in (
+        entry.split("=") for entry in os.getenv("NOTIFICATION_COALESCE_WINDOWS", "NEW_BID=10").split(",") if entry
+    )
+}
+NOTIFICATION_COALESCER_ENABLED = os.getenv("NOTIFICATION_COALESCER_ENABLED", "true").lower() == "true"
+NOTIFICATION_FLUSH_INTERVAL = float(os.getenv("NOTIFICATION_FLUSH_INTERVAL", "1.0"))
+NOTIFICATION_FLUSH_BATCH_SIZE = int(os.getenv("NOTIFICATION_FLUSH_BATCH_SIZE", "1000"))
+
+# Per-user inbox cache: users kept, newest notifications kept per user, and how
+# long an entry may miss writes made by other replicas
+INBOX_CACHE_USERS = int(os.getenv("INBOX_CACHE_USERS", "10000"))
+INBOX_CACHE_DEPTH = int(os.getenv("INBOX_CACHE_DEPTH", "50"))
+INBOX_CACHE_TTL = float(os.getenv("INBOX_CACHE_TTL", "10"))
+
+# Server-push stream: per-connection queue, connections per process, keep-alive
+# interval, and how many missed notifications a reconnect may replay
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+NOTIFICATION_STREAM_MAX_SUBSCRIBERS = int(os.getenv("NOTIFICATION_STREAM_MAX_SUBSCRIBERS", "10000"))
+NOTIFICATION_STREAM_HEARTBEAT = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT", "15"))
+NOTIFICATION_STREAM_REPLAY_MAX = int(os.getenv("NOTIFICATION_STREAM_REPLAY_MAX", "500"))
+
+# Celery runner for the coalescer; memory:// with eager tasks runs it in-process
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() == "true"
+
+# Startup: wait for the database with exponential backoff
+DB_WAIT_TIMEOUT = float(os.getenv("DB_WAIT_TIMEOUT", "60"))
+DB_WAIT_INITIAL_DELAY = float(os.getenv("DB_WAIT_INITIAL_DELAY", "0.1"))
+DB_WAIT_MAX_DELAY = float(os.getenv("DB_WAIT_MAX_DELAY", "5"))
+
+# Database connection pool; the defaults cover FastAPI's 40 sync worker threads
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+# Behind PgBouncer (transaction pooling): no local pool and no prepared statements
+DB_EXTERNAL_POOLER = os.getenv("DB_EXTERNAL_POOLER", "false").lower() == "true"
+# Serve requests from an asyncpg (aiosqlite for SQLite) engine instead of the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+# Read replicas for GET handlers, comma-separated; empty means the primary serves everything
+DATABASE_REPLICA_URLS = [url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "1"))
+# How long a client's own write keeps its reads off replicas that have not replayed it
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "30"))
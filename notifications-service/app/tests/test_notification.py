@@ -1,17 +1,167 @@
 # Tests for notification model in notifications-service 
 
 from fastapi.testclient import TestClient
-from main import app
+from app.main import app
+from app.lifecycle import prepare_database
 
+prepare_database(reset=True)
 client = TestClient(app)
 
 def test_create_and_list_notification():
-    pass
-    notification = {"id": 1, "user_id": 42, "message": "Test notification", "is_read": False}
-    response = client.post("/notifications/", json=notification)
-    assert response.status_code == 200
-    assert response.json() == notification
+    notification = {"user_id": 42, "type": "auction_started", "message": "Test notification", "metadata": {"auction_id": 1}}
+    response = client.post("/notifications", json=notification)
+    assert response.status_code == 201
+    created = response.json()
+    assert {key: created[key] for key in notification} == notification
+    assert created["is_read"] is False
 
-    response = client.get("/notifications/")
+    response = client.get("/notifications/user/42")
     assert response.status_code == 200
-    assert notification in response.json() 
\ No newline at end of file
+    assert response.json() == [created]
+
+def test_auction_event_fan_out_is_one_insert_of_unique_recipients(monkeypatch):
+    from sqlalchemy import event
+    import app.main as main
+    from app.sqlalchemy_conn import engine, async_engine
+
+    async def bidders(auction_id):
+        return [102, 103]
+    monkeypatch.setattr(main, "fetch_bidders", bidders)
+    inserts = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO notifications"):
+            inserts.append(statement)
+    # DB_ASYNC handlers write through the async engine
+    engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+    for bound in engines:
+        event.listen(bound, "before_cursor_execute", count)
+    try:
+        response = client.post(
+            "/notifications/auction/31/new",
+            params={"event_type": "AUCTION_ENDED", "message": "Auction #31 has ended", "all_bidders": True},
+            json={"user_ids": [101, 102, 101]},
+        )
+    finally:
+        for bound in engines:
+            event.remove(bound, "before_cursor_execute", count)
+    assert response.json()["recipient_count"] == 3
+    assert len(inserts) == 1
+    for user_id in (101, 102, 103):
+        rows = client.get(f"/notifications/user/{user_id}").json()
+        assert [(n["type"], n["metadata"]) for n in rows] == [("auction_ended", {"auction_id": 31})]
+
+
+def test_bids_in_one_window_coalesce_into_the_latest(monkeypatch):
+    import datetime
+    import app.main as main
+    from app.coalescing import coalescer, COALESCE_WINDOWS
+    from app.models.notification import NotificationType
+
+    async def bidders(auction_id):
+        return [201, 202]
+    monkeypatch.setattr(main, "fetch_bidders", bidders)
+    for bid_id, amount in ((1, 110.0), (2, 125.0), (3, 140.0)):
+        response = client.post("/notifications/auction/32/bid", json={
+            "bid_id": bid_id, "bidder_id": 202, "amount": amount,
+        })
+        assert response.status_code == 201
+
+    now = datetime.datetime.utcnow()
+    assert coalescer.flush_due(now) == 0
+    assert client.get("/notifications/user/201").json() == []
+
+    assert coalescer.flush_due(now + COALESCE_WINDOWS[NotificationType.NEW_BID] + datetime.timedelta(seconds=1)) == 1
+    rows = client.get("/notifications/user/201").json()
+    assert [(n["type"], n["message"]) for n in rows] == [("new_bid", "New bid of $140.00 on auction #32")]
+    assert rows[0]["metadata"] == {"auction_id": 32, "bid_id": 3, "amount": 140.0, "count": 3}
+    assert client.get("/notifications/user/201/unread-count").json()["unread"] == 1
+
+def notify(user_id, message):
+    response = client.post("/notifications", json={"user_id": user_id, "type": "auction_started", "message": message})
+    assert response.status_code == 201
+    return response.json()["notification_id"]
+
+def unread(user_id):
+    return client.get(f"/notifications/user/{user_id}/unread-count").json()["unread"]
+
+def test_inbox_cache_keeps_unread_counts_exact():
+    assert unread(301) == 0
+    ids = [notify(301, f"Message {n}") for n in range(3)]
+    assert unread(301) == 3
+    assert client.put(f"/notifications/{ids[0]}/read").status_code == 200
+    assert unread(301) == 2
+    assert client.delete(f"/notifications/{ids[0]}").status_code == 204
+    assert unread(301) == 2
+    assert client.delete(f"/notifications/{ids[1]}").status_code == 204
+    assert unread(301) == 1
+    assert [n["notification_id"] for n in client.get("/notifications/user/301").json()] == [ids[2]]
+
+def test_inbox_cache_overflow_pages_from_the_database(monkeypatch):
+    from app.inbox_cache import inbox_cache
+    monkeypatch.setattr(inbox_cache, "depth", 3)
+    inbox_cache.invalidate(302)
+    ids = [notify(302, f"Message {n}") for n in range(5)]
+    newest_first = ids[::-1]
+    first = client.get("/notifications/user/302", params={"limit": 2})
+    assert [n["notification_id"] for n in first.json()] == newest_first[:2]
+    cursor = first.headers["x-next-cursor"]
+    # Crosses past the three cached rows into ones only the database has
+    rest = client.get("/notifications/user/302", params={"limit": 10, "before": cursor})
+    assert [n["notification_id"] for n in rest.json()] == newest_first[2:]
+    beyond = client.get("/notifications/user/302", params={"before": newest_first[3]})
+    assert [n["notification_id"] for n in beyond.json()] == newest_first[4:]
+    assert unread(302) == 5
+
+def test_bulk_read_and_delete_touch_only_the_users_notifications():
+    mine = [notify(401, f"Message {n}") for n in range(4)]
+    theirs = [notify(402, f"Message {n}") for n in range(2)]
+    assert (unread(401), unread(402)) == (4, 2)
+
+    # Another user's notification is not a valid cursor
+    assert client.post("/notifications/user/401/read", params={"up_to": theirs[1]}).status_code == 404
+    response = client.post("/notifications/user/401/read", params={"up_to": mine[1]})
+    assert response.json() == {"user_id": 401, "marked_read": 2}
+    assert (unread(401), unread(402)) == (2, 2)
+
+    response = client.delete("/notifications/user/401", params={"notification_ids": [mine[0], mine[2], *theirs]})
+    assert response.json() == {"user_id": 401, "deleted": 2}
+    assert (unread(401), unread(402)) == (1, 2)
+    assert [n["notification_id"] for n in client.get("/notifications/user/401").json()] == [mine[3], mine[1]]
+    assert [n["notification_id"] for n in client.get("/notifications/user/402").json()] == theirs[::-1]
+
+    assert client.post("/notifications/user/401/read").json() == {"user_id": 401, "marked_read": 1}
+    assert unread(401) == 0
+
+def test_stream_replays_then_delivers_live_and_cleans_up():
+    import asyncio
+    import json
+    from app.main import stream_user_notifications
+    from app.notification_stream import notification_broker
+    from app.sqlalchemy_conn import SessionLocal, pool_metrics
+
+    seen = notify(501, "Seen before connecting")
+    missed = notify(501, "Missed while away")
+
+    def event_of(chunk):
+        lines = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+        return lines["event"], json.loads(lines["data"])["notification_id"]
+
+    async def scenario():
+        notification_broker.start()
+        try:
+            response = await stream_user_notifications(501, last_event_id=None, since=seen, db=SessionLocal())
+            # The replay's connection went back before the stream started
+            assert pool_metrics()["in_use"] == 0
+            stream = response.body_iterator
+            assert event_of(await asyncio.wait_for(stream.__anext__(), 5)) == ("notification", missed)
+            live = await asyncio.to_thread(notify, 501, "Arrived while connected")
+            await asyncio.to_thread(notify, 502, "Someone else's")
+            assert event_of(await asyncio.wait_for(stream.__anext__(), 5)) == ("notification", live)
+            assert notification_broker.stats()["subscribers"] == 1
+            # Client disconnect: Starlette closes the generator
+            await stream.aclose()
+            assert notification_broker.stats()["subscribers"] == 0
+        finally:
+            notification_broker.stop()
+
+    asyncio.run(scenario())
@@ -1,9 +1,17 @@
 # Worker to process notifications for notifications-service 
 from celery import Celery
+from ..settings import CELERY_BROKER_URL, CELERY_TASK_ALWAYS_EAGER
 
-celery_app = Celery('notifications_worker', broker='redis://localhost:6379/0')
+celery_app = Celery('notifications_worker', broker=CELERY_BROKER_URL)
+# With CELERY_BROKER_URL=memory:// and eager tasks this runs without a broker
+celery_app.conf.task_always_eager = CELERY_TASK_ALWAYS_EAGER
 
 @celery_app.task
-def process_notification(notification_id: int):
-    # Placeholder for notification processing logic
-    print(f"Processing notification with ID: {notification_id}") 
+def process_notification(notification_id: int = None):
+    """
+    Flush coalesced notifications whose window has closed. Work is taken
+    from the pending_notifications table, so any trigger flushes everything
+    that is due.
+    """
+    from ..coalescing import coalescer
+    return coalescer.drain()
@@ -1,27 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
 from datetime import datetime, timedelta
-from typing import List
-from .models.transaction import Base, Transaction, TransactionStatus
-from .schemas.transaction import TransactionSchema, TransactionCreate as TransactionCreateSchema, TransactionBase, TransactionStatus as TransactionStatusSchema
-from .sqlalchemy_conn import engine, get_db
-from .workers.process_transaction import process_transaction
-import time
-import requests
+from typing import List, Optional
+from .models.transaction import Transaction, TransactionStatus
+from .schemas.transaction import TransactionSchema, TransactionCreate as TransactionCreateSchema, TransactionBatchItem
+from .sqlalchemy_conn import get_db, run_db, pool_metrics, DbRoute, ReadYourWrites
+from .lifecycle import prepare_database, health
+from .settings import AUCTION_SERVICE_URL, NOTIFICATIONS_SERVICE_URL
+from . import http_client
+from .metrics_cache import metrics_cache
+from .pagination import keyset, page, stream_ndjson, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 
-time.sleep(5)
-Base.metadata.create_all(bind=engine)
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(prepare_database)
+    health.started = True
+    yield
+    health.started = False
+    await http_client.close_clients()
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = DbRoute
+app.add_middleware(ReadYourWrites)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-logger.info("Creating database tables...")
-Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
-logger.info("Database tables created successfully")
+
+def process_transaction(transaction_id: int):
+    # Celery is imported on first use rather than at startup
+    from .workers.process_transaction import process_transaction as task
+    task(transaction_id)
+
+@app.get("/health/live")
+def liveness():
+    return health.live()
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    ready, body = health.ready()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return body
 
 # CRUD Operations
 @app.post("/transactions", response_model=TransactionCreateSchema, status_code=status.HTTP_201_CREATED)
@@ -29,12 +56,17 @@ def create_transaction(transaction: TransactionCreateSchema, db: Session = Depen
     new_transaction = Transaction(
         auction_id=transaction.auction_id,
         buyer_id=transaction.buyer_id,
+        seller_id=transaction.seller_id,
         transaction_date=datetime.utcnow(),
         status=TransactionStatus.Pending,
         amount=transaction.amount
     )
     db.add(new_transaction)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Auction already has a transaction")
     db.refresh(new_transaction)
     
     # Process transaction asynchronously
@@ -46,6 +78,54 @@ def create_transaction(transaction: TransactionCreateSchema, db: Session = Depen
     
     return new_transaction
 
+def insert_batch(db: Session, entries: List[TransactionBatchItem]):
+    auction_ids = [entry.auction_id for entry in entries]
+    existing = {
+        transaction.auction_id: transaction
+        for transaction in db.query(Transaction).filter(
+            Transaction.auction_id.in_(auction_ids), Transaction.status != TransactionStatus.Failed
+        ).with_for_update()
+    }
+    now = datetime.utcnow()
+    rows = []
+    for entry in entries:
+        if entry.auction_id not in existing:
+            rows.append({**entry.model_dump(), "transaction_date": now, "status": TransactionStatus.Pending})
+            # Guard against the same auction twice in one batch
+            existing[entry.auction_id] = None
+    created = []
+    if rows:
+        created = db.scalars(insert(Transaction).returning(Transaction, sort_by_parameter_order=True), rows).all()
+    for transaction in created:
+        existing[transaction.auction_id] = transaction
+    # Serialize before the commit expires the rows
+    results = [TransactionSchema.model_validate(existing[auction_id]) for auction_id in dict.fromkeys(auction_ids)]
+    created_ids = [transaction.transaction_id for transaction in created]
+    db.commit()
+    return results, created_ids
+
+@app.post("/transactions/batch", response_model=List[TransactionSchema])
+def create_transaction_batch(entries: List[TransactionBatchItem], db: Session = Depends(get_db)):
+    """
+    Create one Pending transaction per auction in a single insert. Auctions
+    that already have a live (non-failed) transaction get that one back
+    instead, so a settlement retry never charges a winner twice.
+    """
+    try:
+        results, created_ids = insert_batch(db, entries)
+    except IntegrityError:
+        # A concurrent settlement run inserted one of these auctions first;
+        # the unique index made us wait for its commit, so a re-read finds it
+        db.rollback()
+        results, created_ids = insert_batch(db, entries)
+    for transaction_id in created_ids:
+        try:
+            process_transaction(transaction_id)
+        except Exception as e:
+            # Log error but continue
+            pass
+    return results
+
 @app.get("/transactions/{transaction_id}", response_model=TransactionSchema)
 def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
     transaction = db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
@@ -54,13 +134,21 @@ def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
     return transaction
 
 @app.get("/transactions", response_model=List[TransactionSchema])
-def list_transactions(db: Session = Depends(get_db)):
-    transactions = db.query(Transaction).all()
-    return transactions
+def list_transactions(
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    def build(db: Session):
+        return keyset(db.query(Transaction), Transaction.transaction_id, after=after)
+    if stream:
+        return stream_ndjson(build, TransactionSchema, db=db)
+    return page(build(db), limit, response, lambda transaction: transaction.transaction_id)
 
 # Specialized Operations
-@app.put("/transactions/{transaction_id}/confirm", response_model=TransactionSchema)
-def confirm_payment(transaction_id: int, db: Session = Depends(get_db)):
+def mark_completed(db: Session, transaction_id: int):
     transaction = db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -71,92 +159,105 @@ def confirm_payment(transaction_id: int, db: Session = Depends(get_db)):
     transaction.status = TransactionStatus.Completed
     db.commit()
     db.refresh(transaction)
+    return transaction
+
+@app.put("/transactions/{transaction_id}/confirm", response_model=TransactionSchema)
+async def confirm_payment(transaction_id: int, db: Session = Depends(get_db)):
+    transaction = await run_db(mark_completed, db, transaction_id)
     
-    # Notify relevant services
-    try:
-        # Update auction status if applicable
-        requests.put(f"http://auction-service:8000/auctions/{transaction.auction_id}/end")
-        
-        # Notify buyer
-        requests.post(
-            "http://notifications-service:8000/notifications",
+    # Notify relevant services: update auction status if applicable and notify buyer
+    await asyncio.gather(
+        http_client.send_quietly(AUCTION_SERVICE_URL, "PUT", f"/auctions/{transaction.auction_id}/end"),
+        http_client.send_quietly(
+            NOTIFICATIONS_SERVICE_URL, "POST", "/notifications",
             json={
                 "user_id": transaction.buyer_id,
                 "type": "PAYMENT_CONFIRMED",
                 "message": f"Your payment for auction #{transaction.auction_id} has been confirmed",
                 "meta": {"transaction_id": transaction.transaction_id}
             }
-        )
-    except:
-        # Log error but continue
-        pass
+        ),
+    )
     
     return transaction
 
 @app.get("/transactions/auction/{auction_id}", response_model=List[TransactionSchema])
-def get_auction_transactions(auction_id: int, db: Session = Depends(get_db)):
-    transactions = db.query(Transaction).filter(Transaction.auction_id == auction_id).all()
-    return transactions
+def get_auction_transactions(
+    auction_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    def build(db: Session):
+        query = db.query(Transaction).filter(Transaction.auction_id == auction_id)
+        return keyset(query, Transaction.transaction_id, after=after)
+    if stream:
+        return stream_ndjson(build, TransactionSchema, db=db)
+    return page(build(db), limit, response, lambda transaction: transaction.transaction_id)
 
 @app.get("/transactions/user/{user_id}", response_model=List[TransactionSchema])
-def get_user_transactions(user_id: int, db: Session = Depends(get_db)):
+def get_user_transactions(
+    user_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
     # Get both buyer and seller transactions
-    transactions = db.query(Transaction).filter(
-        (Transaction.buyer_id == user_id) | (Transaction.seller_id == user_id)
-    ).all()
-    return transactions
+    def build(db: Session):
+        query = db.query(Transaction).filter(
+            (Transaction.buyer_id == user_id) | (Transaction.seller_id == user_id)
+        )
+        return keyset(query, Transaction.transaction_id, after=after)
+    if stream:
+        return stream_ndjson(build, TransactionSchema, db=db)
+    return page(build(db), limit, response, lambda transaction: transaction.transaction_id)
 
-@app.get("/metrics")
-def get_payment_metrics(db: Session = Depends(get_db)):
+def compute_payment_metrics(db: Session):
+    # One scan with conditional aggregates instead of a query per figure
     now = datetime.utcnow()
-    one_day_ago = now - timedelta(days=1)
-    one_week_ago = now - timedelta(weeks=1)
-    one_month_ago = now - timedelta(days=30)
-    one_year_ago = now - timedelta(days=365)
-
-    total_payments = db.query(Transaction).count()
-    by_status = db.query(Transaction.status, func.count()).group_by(Transaction.status).all()
-
-    # Time-based metrics
-    count_day = db.query(Transaction).filter(Transaction.transaction_date >= one_day_ago).count()
-    count_week = db.query(Transaction).filter(Transaction.transaction_date >= one_week_ago).count()
-    count_month = db.query(Transaction).filter(Transaction.transaction_date >= one_month_ago).count()
-    count_year = db.query(Transaction).filter(Transaction.transaction_date >= one_year_ago).count()
-
-    # Amount-based metrics
-    total_amount = db.query(func.coalesce(func.sum(Transaction.amount), 0)).scalar()
-    avg_amount = db.query(func.coalesce(func.avg(Transaction.amount), 0)).scalar()
-    min_amount = db.query(func.coalesce(func.min(Transaction.amount), 0)).scalar()
-    max_amount = db.query(func.coalesce(func.max(Transaction.amount), 0)).scalar()
-
-    # Period-based amount metrics
-    amount_today = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(Transaction.transaction_date >= one_day_ago).scalar()
-    amount_week = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(Transaction.transaction_date >= one_week_ago).scalar()
-    amount_month = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(Transaction.transaction_date >= one_month_ago).scalar()
-    amount_year = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(Transaction.transaction_date >= one_year_ago).scalar()
-
-    avg_amount_today = db.query(func.coalesce(func.avg(Transaction.amount), 0)).filter(Transaction.transaction_date >= one_day_ago).scalar()
-    avg_amount_week = db.query(func.coalesce(func.avg(Transaction.amount), 0)).filter(Transaction.transaction_date >= one_week_ago).scalar()
-    avg_amount_month = db.query(func.coalesce(func.avg(Transaction.amount), 0)).filter(Transaction.transaction_date >= one_month_ago).scalar()
-    avg_amount_year = db.query(func.coalesce(func.avg(Transaction.amount), 0)).filter(Transaction.transaction_date >= one_year_ago).scalar()
-
+    windows = {
+        "today": now - timedelta(days=1),
+        "last_week": now - timedelta(weeks=1),
+        "last_month": now - timedelta(days=30),
+        "last_year": now - timedelta(days=365),
+    }
+    in_window = [Transaction.transaction_date >= since for since in windows.values()]
+    row = db.query(
+        func.count(Transaction.transaction_id),
+        func.coalesce(func.sum(Transaction.amount), 0),
+        func.coalesce(func.avg(Transaction.amount), 0),
+        func.coalesce(func.min(Transaction.amount), 0),
+        func.coalesce(func.max(Transaction.amount), 0),
+        *(func.count(Transaction.transaction_id).filter(Transaction.status == s) for s in TransactionStatus),
+        *(func.count(Transaction.transaction_id).filter(condition) for condition in in_window),
+        *(func.coalesce(func.sum(Transaction.amount).filter(condition), 0) for condition in in_window),
+        *(func.coalesce(func.avg(Transaction.amount).filter(condition), 0) for condition in in_window),
+    ).one()
+    total_payments, total_amount, avg_amount, min_amount, max_amount = row[:5]
+    rest = list(row[5:])
+    by_status, rest = rest[:len(TransactionStatus)], rest[len(TransactionStatus):]
+    n = len(windows)
+    counts, amounts, averages = rest[:n], rest[n:2 * n], rest[2 * n:]
     return {
         "total_payments": total_payments,
-        "payments_today": count_day,
-        "payments_last_week": count_week,
-        "payments_last_month": count_month,
-        "payments_last_year": count_year,
-        "status_distribution": {status.value: count for status, count in by_status},
+        **{f"payments_{window}": count for window, count in zip(windows, counts)},
+        "status_distribution": {s.value: count for s, count in zip(TransactionStatus, by_status) if count},
         "total_amount": total_amount,
         "avg_amount": avg_amount,
         "min_amount": min_amount,
         "max_amount": max_amount,
-        "amount_today": amount_today,
-        "amount_last_week": amount_week,
-        "amount_last_month": amount_month,
-        "amount_last_year": amount_year,
-        "avg_amount_today": avg_amount_today,
-        "avg_amount_last_week": avg_amount_week,
-        "avg_amount_last_month": avg_amount_month,
-        "avg_amount_last_year": avg_amount_year,
+        **{f"amount_{window}": amount for window, amount in zip(windows, amounts)},
+        **{f"avg_amount_{window}": amount for window, amount in zip(windows, averages)},
     }
+
+@app.get("/metrics")
+async def get_payment_metrics(db: Session = Depends(get_db)):
+    return await metrics_cache.get("payments", lambda: run_db(compute_payment_metrics, db))
+
+@app.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
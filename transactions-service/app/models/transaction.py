@@ -1,5 +1,5 @@
 # Transaction model for transactions-service 
-from sqlalchemy import Column, Integer, Float, DateTime, Enum, String
+from sqlalchemy import Column, Integer, Float, DateTime, Enum, String, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from enum import Enum as PyEnum
 import datetime
@@ -15,8 +15,15 @@ class TransactionStatus(str, PyEnum):
 class Transaction(Base):
     __tablename__ = 'transactions'
     transaction_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    auction_id = Column(Integer, nullable=False)
-    buyer_id = Column(Integer, nullable=False)
+    auction_id = Column(Integer, nullable=False, index=True)
+    buyer_id = Column(Integer, nullable=False, index=True)
+    seller_id = Column(Integer, nullable=True, index=True)
     transaction_date = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
     status = Column(Enum(TransactionStatus), nullable=False)
-    amount = Column(Float, nullable=False)
\ No newline at end of file
+    amount = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # At most one live (not Failed) transaction per auction, whoever settles it
+        Index("uq_transactions_live_auction", auction_id, unique=True,
+              postgresql_where=text("status <> 'Failed'"), sqlite_where=text("status <> 'Failed'")),
+    )
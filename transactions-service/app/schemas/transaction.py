@@ -13,6 +13,7 @@ class TransactionStatus(str, Enum):
 class TransactionBase(BaseModel):
     auction_id: int
     buyer_id: int
+    seller_id: Optional[int] = None
     transaction_date: datetime
     status: TransactionStatus
     amount: float
@@ -27,4 +28,12 @@ class TransactionCreate(TransactionBase):
 class TransactionSchema(TransactionBase):
     transaction_id: int
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class TransactionBatchItem(BaseModel):
+    """One winner to charge in a POST /transactions/batch call."""
+    auction_id: int
+    buyer_id: int
+    seller_id: Optional[int] = None
+    amount: float
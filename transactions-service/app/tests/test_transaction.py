@@ -1,15 +1,52 @@
 from fastapi.testclient import TestClient
-from main import app
+from app.main import app
+from app.lifecycle import prepare_database
 
+prepare_database(reset=True)
 client = TestClient(app)
 
 def test_create_and_list_transaction():
-    pass
-    transaction = {"id": 1, "item_id": 101, "buyer_id": 501, "amount": 250.0, "status": "completed"}
-    response = client.post("/transactions/", json=transaction)
-    assert response.status_code == 200
-    assert response.json() == transaction
+    transaction = {
+        "auction_id": 101, "buyer_id": 501, "seller_id": 7, "amount": 250.0,
+        "transaction_date": "2024-01-01T00:00:00", "status": "Pending",
+    }
+    response = client.post("/transactions", json=transaction)
+    assert response.status_code == 201
+    assert (response.json()["auction_id"], response.json()["status"]) == (101, "Pending")
+    # One live transaction per auction
+    assert client.post("/transactions", json=transaction).status_code == 409
 
-    response = client.get("/transactions/")
+    response = client.get("/transactions", params={"limit": 100})
     assert response.status_code == 200
-    assert transaction in response.json()
+    listed = [t for t in response.json() if t["auction_id"] == 101]
+    assert [(t["buyer_id"], t["amount"]) for t in listed] == [(501, 250.0)]
+
+def test_transaction_batch_is_idempotent_per_auction():
+    import pytest
+    from sqlalchemy.exc import IntegrityError
+    from app.models.transaction import Transaction, TransactionStatus
+    from app.sqlalchemy_conn import SessionLocal
+    batch = [
+        {"auction_id": 201, "buyer_id": 1, "seller_id": 2, "amount": 10.0},
+        {"auction_id": 202, "buyer_id": 3, "seller_id": 2, "amount": 20.0},
+        {"auction_id": 201, "buyer_id": 1, "seller_id": 2, "amount": 10.0},
+    ]
+    first = client.post("/transactions/batch", json=batch)
+    assert first.status_code == 200
+    assert [t["auction_id"] for t in first.json()] == [201, 202]
+    # A settlement retry gets the same transactions back
+    again = client.post("/transactions/batch", json=batch).json()
+    assert [t["transaction_id"] for t in again] == [t["transaction_id"] for t in first.json()]
+    # A concurrent runner that skipped the check is stopped by the index
+    with SessionLocal() as db:
+        db.add(Transaction(auction_id=201, buyer_id=1, amount=10.0, status=TransactionStatus.Pending))
+        with pytest.raises(IntegrityError):
+            db.commit()
+        db.rollback()
+        db.query(Transaction).filter(Transaction.auction_id == 202).update({Transaction.status: TransactionStatus.Failed})
+        db.commit()
+    # A failed transaction does not block charging the winner again
+    retried = client.post("/transactions/batch", json=batch[1:2]).json()
+    assert retried[0]["transaction_id"] != first.json()[1]["transaction_id"]
+    assert retried[0]["status"] == "Pending"
+